@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Aggregate results from paper experiments.
-Reads summary.txt and experiment.log files from paper_results/ directories.
+Reads the per-node metrics files (log/metrics-node-*.json), or summary.txt
+for older runs, and experiment.log files from paper_results/ directories.
 Outputs CSV with aggregated metrics for analysis.
 """
 
@@ -11,6 +12,8 @@ import csv
 import re
 from pathlib import Path
 
+from parse_metrics import find_metrics_files, aggregate_metrics, summarize
+
 RESULTS_DIR = "paper_results"
 OUTPUT_CSV = "aggregated_results.csv"
 OUTPUT_SUMMARY = "experiment_summary.md"
@@ -110,10 +113,14 @@ def main():
                 print(f"Warning: Could not parse directory name: {item.name}")
                 continue
             
-            # Check for summary.txt
+            # Prefer the structured per-node metrics, then summary.txt
             summary_file = item / 'summary.txt'
             metrics = None
-            if summary_file.exists():
+            if find_metrics_files(item / 'log'):
+                agg = aggregate_metrics(item / 'log')
+                if agg:
+                    metrics = summarize(agg)
+            if metrics is None and summary_file.exists():
                 metrics = parse_summary_txt(summary_file)
             
             # Check for experiment.log
@@ -145,6 +152,10 @@ def main():
         'num_nodes', 'total_tx',
         'latency_mean', 'latency_std',
         'tps_mean', 'tps_std',
+        'local_batch_latency_p50_mean', 'local_batch_latency_p90_mean',
+        'local_batch_latency_p99_mean', 'local_batch_latency_p999_mean',
+        'wall_tps_mean', 'wall_bps_mean',
+        'cpu_time_mean', 'peak_rss_mean', 'peak_rss_max',
     ]
     
     with open(OUTPUT_CSV, 'w', newline='') as csvfile:
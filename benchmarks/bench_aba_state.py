@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-epoch vote state of the ADKG binary agreement used by
+MBA, on recorded traces of the messages each node receives.
+A trace is recorded by running N nodes of
+hash_mvba.adkg.binaryagreement in one process over a network that
+delivers in random order and repeats some messages, with split inputs so
+that several epochs run. Each node's inbound messages are then replayed
+through
+  sets      the former representation, defaultdicts of sets per epoch
+  bitmaps   hash_mvba.adkg.binaryagreement.EpochState
+doing the bookkeeping and threshold checks of one message, and through the
+whole binaryagreement with a no-op broadcast. It reports the time and the
+bytes allocated per message.
+Usage: python3 benchmarks/bench_aba_state.py [N ...] [--seed S] [--save PATH | --load PATH]
+"""
+
+import os, sys, pickle, random, statistics, time, tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gevent
+from gevent.event import Event
+from gevent.queue import Queue
+
+from hash_mvba.adkg.binaryagreement import CONF_INDEX, EpochState, binaryagreement
+
+def coin(r):
+    return (r * 7 + 3) % 2
+
+def record(N, seed, duplicates=0.02):
+    """Runs N nodes to a decision, returns the (sender, msg) list each node received."""
+    f = (N - 1) // 3
+    rng = random.Random(seed)
+    pending = []
+    inboxes = [Queue() for _ in range(N)]
+    traces = [[] for _ in range(N)]
+    decided = [None] * N
+    done = Event()
+
+    def node(i):
+        def broadcast(o):
+            for j in range(N):
+                pending.append((j, i, o))
+        def decide(v):
+            decided[i] = v
+            if all(d is not None for d in decided):
+                done.set()
+        inputs = Queue(1)
+        inputs.put(i % 2)
+        binaryagreement('ABA', i, N, f, coin, inputs.get, decide, broadcast, inboxes[i].get)
+
+    def network():
+        while pending:
+            k = rng.randrange(len(pending))
+            pending[k], pending[-1] = pending[-1], pending[k]
+            j, i, o = pending.pop()
+            traces[j].append((i, o))
+            inboxes[j].put((i, o))
+            if rng.random() < duplicates:
+                traces[j].append((i, o))
+                inboxes[j].put((i, o))
+            gevent.sleep(0)
+
+    nodes = [gevent.spawn(node, i) for i in range(N)]
+    gevent.sleep(0)
+    while not done.is_set():
+        gevent.spawn(network).join()
+        gevent.sleep(0)
+    gevent.killall(nodes)
+    assert len(set(decided)) == 1, decided
+    return f, traces
+
+def replay_sets(N, f, trace):
+    """The bookkeeping of the set-based representation for every message."""
+    est_values = defaultdict(lambda: [set(), set()])
+    aux_values = defaultdict(lambda: [set(), set()])
+    conf_values = defaultdict(lambda: {(0,): set(), (1,): set(), (0, 1): set()})
+    est_sent = defaultdict(lambda: [False, False])
+    bin_values = defaultdict(set)
+    for sender, (tag, r, v) in trace:
+        if tag == 'EST':
+            if sender in est_values[r][v]:
+                continue
+            est_values[r][v].add(sender)
+            if len(est_values[r][v]) >= f + 1 and not est_sent[r][v]:
+                est_sent[r][v] = True
+            if len(est_values[r][v]) >= 2 * f + 1:
+                bin_values[r].add(v)
+        elif tag == 'AUX':
+            if sender in aux_values[r][v]:
+                continue
+            aux_values[r][v].add(sender)
+            sum(len(aux_values[r][w]) for w in bin_values[r]) >= N - f
+        else:
+            if sender in conf_values[r][v]:
+                continue
+            conf_values[r][v].add(sender)
+            sum(len(senders) for conf, senders in conf_values[r].items()
+                if senders and set(conf).issubset(bin_values[r])) >= N - f
+
+def replay_bitmaps(N, f, trace):
+    """The same bookkeeping on EpochState."""
+    epochs = defaultdict(EpochState)
+    for sender, (tag, r, v) in trace:
+        epoch = epochs[r]
+        if tag == 'EST':
+            count = epoch.add_est(sender, v)
+            if not count:
+                continue
+            if count >= f + 1 and not epoch.est_sent[v]:
+                epoch.est_sent[v] = True
+            if count >= 2 * f + 1:
+                epoch.bin_values |= 1 << v
+        elif tag == 'AUX':
+            if epoch.add_aux(sender, v):
+                epoch.aux_ready(N - f)
+        else:
+            if epoch.add_conf(sender, CONF_INDEX[v]):
+                epoch.conf_ready(N - f)
+
+def replay_protocol(N, f, pid, trace):
+    """Feeds the trace to a whole binaryagreement instance, returns when it is consumed."""
+    messages = iter(trace)
+    consumed = Event()
+    def receive():
+        try:
+            return next(messages)
+        except StopIteration:
+            consumed.set()
+            Event().wait()
+    inputs = Queue(1)
+    inputs.put(pid % 2)
+    t = gevent.spawn(binaryagreement, 'ABA', pid, N, f, coin, inputs.get, lambda v: None,
+                     lambda o: None, receive)
+    consumed.wait()
+    t.kill()
+
+def measure(run, *args):
+    start = time.perf_counter()
+    run(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    run(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    args = sys.argv[1:]
+    seed, save, load = 1, None, None
+    for flag in ('--seed', '--save', '--load'):
+        if flag in args:
+            i = args.index(flag)
+            value = args[i + 1]
+            args = args[:i] + args[i + 2:]
+            if flag == '--seed':
+                seed = int(value)
+            elif flag == '--save':
+                save = value
+            else:
+                load = value
+
+    if load:
+        with open(load, 'rb') as fh:
+            recorded = pickle.load(fh)
+    else:
+        recorded = dict()
+        for N in [int(a) for a in args] or [16, 64, 201]:
+            start = time.perf_counter()
+            recorded[N] = record(N, seed)
+            print(f"recorded N={N} in {time.perf_counter() - start:.1f} s")
+        if save:
+            with open(save, 'wb') as fh:
+                pickle.dump(recorded, fh)
+
+    print(f"{'N':>5}{'msgs':>8}{'epochs':>8}{'variant':>10}{'ns/msg':>10}{'peak bytes':>12}")
+    for N, (f, traces) in recorded.items():
+        # the busiest receiver of the run
+        pid = max(range(N), key=lambda j: len(traces[j]))
+        trace = traces[pid]
+        epochs = len({msg[1] for _, msg in trace})
+        for label, run, extra in (('sets', replay_sets, ()), ('bitmaps', replay_bitmaps, ()),
+                                  ('protocol', replay_protocol, (pid,))):
+            samples = [measure(run, N, f, *extra, trace) if extra else measure(run, N, f, trace)
+                       for _ in range(5)]
+            elapsed = statistics.median(s[0] for s in samples)
+            peak = statistics.median(s[1] for s in samples)
+            print(f"{N:>5}{len(trace):>8}{epochs:>8}{label:>10}{elapsed / len(trace) * 1e9:>10.0f}{peak:>12.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark the two vector commitments of H-MVBA, Merkle branches against a
+flat hash list, and find the N from which Merkle is cheaper.
+For every N it measures the commitment work of one node in one instance:
+building its own commitment, pickling and unpickling the proofs of its N
+DIFFUSION and N VALUE messages (a hash list is not repeated in VALUE),
+verifying N DIFFUSION stripes under N different commitments and N VALUE
+stripes under the leader's. Stripes are
+32 bytes, so the hashing of real stripes, equal for both, stays out.
+The total adds the proof bytes sent at each bandwidth; the measured
+crossover is compared with crypto.commitment.crossover calibrated on
+this machine.
+Usage: python3 benchmarks/bench_commitment.py [N ...] [--reps R]
+"""
+
+import os, sys, hashlib, pickle, statistics, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto.commitment import get_scheme, crossover
+
+BANDWIDTHS = {'100Mbps': 12.5e6, '1Gbps': 125e6, '10Gbps': 1.25e9}
+
+def instance_work(name, N, values):
+    """Commitment work of node 0 for one instance, returns the bytes it sends."""
+    scheme = get_scheme(name)
+    cache = scheme.verifier_cache(N)
+    sent = 0
+    own_root, own_proofs = scheme.build(values[0])
+    for j in range(N):
+        # DIFFUSION to j with a proof, the VALUE broadcast with one unless
+        # it is shared and known from the leader's DIFFUSION
+        frame = pickle.dumps((own_root, own_proofs[j]))
+        sent += len(frame)
+        pickle.loads(frame)
+        frame = pickle.dumps((own_root, None if scheme.shared_proof else own_proofs[j]))
+        sent += len(frame)
+        pickle.loads(frame)
+    for stripes, root, proofs in values[1]:
+        # the DIFFUSION of every disperser, under its own commitment
+        root, proof = pickle.loads(pickle.dumps((root, proofs[0])))
+        assert cache.verify(stripes[0], root, proof, 0)
+    stripes, root, proofs = values[1][0]
+    for j in range(N):
+        # the VALUE stripes of the leader
+        root_j, proof_j = pickle.loads(pickle.dumps((root, None if scheme.shared_proof else proofs[j])))
+        assert cache.verify(stripes[j], root_j, proof_j, j)
+    return sent
+
+def calibrate():
+    """The parameters of crypto.commitment.estimate, measured on this machine."""
+    sha256 = hashlib.sha256
+    small, big = os.urandom(64), os.urandom(1 << 20)
+    start = time.perf_counter()
+    for _ in range(100000):
+        sha256(small).digest()
+    call = (time.perf_counter() - start) / 100000
+    start = time.perf_counter()
+    for _ in range(20):
+        sha256(big).digest()
+    rate = 20 * len(big) / (time.perf_counter() - start)
+
+    def roundtrip(proof, reps=20000):
+        start = time.perf_counter()
+        for _ in range(reps):
+            pickle.loads(pickle.dumps((small[:32], proof)))
+        return (time.perf_counter() - start) / reps
+    single = roundtrip(small[:32])
+    branch = roundtrip([os.urandom(32) for _ in range(8)])
+    return {'hash_rate': rate, 'hash_call': call,
+            # pickling, plus about as much again for checking the proof
+            'proof_cost': 2 * single, 'element_cost': 2 * (branch - single) / 8}
+
+def main():
+    args = sys.argv[1:]
+    reps = 5
+    if '--reps' in args:
+        i = args.index('--reps')
+        reps = int(args[i + 1])
+        args = args[:i] + args[i + 2:]
+    sizes = [int(a) for a in args] or [4, 8, 16, 32, 64, 128, 201, 256]
+
+    results = dict()
+    for N in sizes:
+        for name in ('merkle', 'hashlist'):
+            scheme = get_scheme(name)
+            values = []
+            for _ in range(N):
+                stripes = [os.urandom(32) for _ in range(N)]
+                root, proofs = scheme.build(stripes)
+                values.append((stripes, root, proofs))
+            own = [os.urandom(32) for _ in range(N)]
+            samples = []
+            for _ in range(reps):
+                start = time.perf_counter()
+                sent = instance_work(name, N, (own, values))
+                samples.append(time.perf_counter() - start)
+            results[N, name] = (statistics.median(samples), sent)
+
+    print(f"median of {reps} runs, commitment work of one node in one instance")
+    print(f"{'N':>5}{'scheme':>10}{'cpu (ms)':>10}{'bytes':>10}" + ''.join(f"{bw:>12}" for bw in BANDWIDTHS))
+    for N in sizes:
+        for name in ('merkle', 'hashlist'):
+            cpu, sent = results[N, name]
+            totals = ''.join(f"{(cpu + sent / bw) * 1000:>12.3f}" for bw in BANDWIDTHS.values())
+            print(f"{N:>5}{name:>10}{cpu * 1000:>10.3f}{sent:>10}{totals}")
+
+    rates = calibrate()
+    print(f"\nSHA-256 on this machine: {rates['hash_rate'] / 1e6:.0f} MB/s, {rates['hash_call'] * 1e6:.2f} us per call, "
+          f"{rates['proof_cost'] * 1e6:.2f} us per proof, {rates['element_cost'] * 1e6:.2f} us per digest in a proof")
+    print(f"{'bandwidth':>10}{'measured':>10}{'model':>8}   (smallest N where Merkle is cheaper)")
+    for label, bw in BANDWIDTHS.items():
+        measured = next((N for N in sizes if
+                         results[N, 'merkle'][0] + results[N, 'merkle'][1] / bw <
+                         results[N, 'hashlist'][0] + results[N, 'hashlist'][1] / bw), None)
+        print(f"{label:>10}{str(measured or '-'):>10}{crossover(bw, **rates):>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark the latency the threshold-coin election adds over the hash
+election, for H-MVBA and FIN. All nodes run in one process over a network
+that delivers every message after a fixed one-way delay; the threshold
+keys are dealt in memory with boldyreva.dealer(N, f+1). Reported is the
+time until every node output, with the hash election, with the threshold
+coin computed on the node greenlet (workers 0) and with the threshold coin
+in one worker process per node (workers 1), and the cost of the single
+pairing operations.
+Needs the charm pairing library.
+Usage: python3 benchmarks/bench_election.py [N ...] [--delay MS] [--reps R]
+"""
+
+import os, sys, importlib.util, statistics, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gevent
+from gevent.queue import Queue
+
+from hash_mvba.core.election import ElectionService, coin_message, _sign, _verify_share, _combine
+from hash_mvba.core.hmvba_protocol import run_hmvba
+from fin_mvba.core.fin_mvba_protocol import run_fin_mvba
+
+PROTOCOLS = {'hmvba': run_hmvba, 'fin': run_fin_mvba}
+
+def run(mvba, N, delay, keys, workers, sid):
+    f = (N - 1) // 3
+    inboxes = [Queue() for _ in range(N)]
+    outputs = [Queue(1) for _ in range(N)]
+    threads = []
+    services = [None] * N
+    if keys is not None:
+        PK, SKs = keys
+        services = [ElectionService(i, N, PK, SKs[i], workers=workers) for i in range(N)]
+
+    def make_send(i):
+        def send(j, o):
+            for k in (range(N) if j == -1 else (j,)):
+                gevent.spawn_later(delay, inboxes[k].put_nowait, (i, o))
+        return send
+
+    start = time.perf_counter()
+    nodes = []
+    for i in range(N):
+        value = Queue(1)
+        value.put_nowait(os.urandom(1000))
+        kwargs = {} if services[i] is None else {'election': services[i]}
+        nodes.append(gevent.spawn(PROTOCOLS[mvba], sid, i, 0, N, f, value, inboxes[i].get, make_send(i),
+                                  outputs[i], threads.append, **kwargs))
+    results = [outputs[i].get(timeout=120) for i in range(N)]
+    elapsed = time.perf_counter() - start
+    gevent.killall(threads + nodes)
+    for service in services:
+        if service is not None:
+            service.close()
+    assert len(set(results)) == 1
+    return elapsed
+
+def operation_costs(N, keys, reps=20):
+    """Milliseconds per sign, verify_share and combine of one coin."""
+    PK, SKs = keys
+    message = coin_message('bench', 0)
+    costs = {}
+    start = time.perf_counter()
+    shares = {i: _sign(PK, SKs[i], message) for i in range(PK.k)}
+    costs['sign'] = (time.perf_counter() - start) / PK.k
+    start = time.perf_counter()
+    for _ in range(reps):
+        assert _verify_share(PK, None, message, 0, shares[0])
+    costs['verify_share'] = (time.perf_counter() - start) / reps
+    start = time.perf_counter()
+    for _ in range(reps):
+        assert _combine(PK, None, message, shares) is not None
+    costs['combine'] = (time.perf_counter() - start) / reps
+    return {op: cost * 1000 for op, cost in costs.items()}
+
+def main():
+    if importlib.util.find_spec('charm') is None:
+        # crypto.threshsig.boldyreva exits the interpreter on import without it
+        print("the threshold coin needs the charm pairing library, which is not installed")
+        return
+    from crypto.threshsig import boldyreva
+
+    args = sys.argv[1:]
+    delay, reps = 0.02, 3
+    for flag in ('--delay', '--reps'):
+        if flag in args:
+            i = args.index(flag)
+            if flag == '--delay':
+                delay = float(args[i + 1]) / 1000
+            else:
+                reps = int(args[i + 1])
+            args = args[:i] + args[i + 2:]
+    sizes = [int(a) for a in args] or [4, 7, 16]
+
+    print(f"one-way delay {delay * 1000:.0f} ms, median of {reps} runs, seconds until every node output")
+    print(f"{'N':>4}{'protocol':>10}{'hash':>9}{'workers 0':>11}{'workers 1':>11}"
+          f"{'sign ms':>9}{'verify ms':>11}{'combine ms':>12}")
+    for N in sizes:
+        f = (N - 1) // 3
+        keys = boldyreva.dealer(N, f + 1)
+        costs = operation_costs(N, keys)
+        for mvba in PROTOCOLS:
+            row = []
+            for election_keys, workers in ((None, 0), (keys, 0), (keys, 1)):
+                samples = [run(mvba, N, delay, election_keys, workers, f'bench{N}-{r}') for r in range(reps)]
+                row.append(statistics.median(samples))
+            print(f"{N:>4}{mvba:>10}" + ''.join(f"{t:>{w}.3f}" for t, w in zip(row, (9, 11, 11)))
+                  + f"{costs['sign']:>9.2f}{costs['verify_share']:>11.2f}{costs['combine']:>12.2f}")
+
+if __name__ == '__main__':
+    main()
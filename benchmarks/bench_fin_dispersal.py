@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark FIN with its proposals sent whole against dispersed (AVID).
+N nodes run one instance in one process on B dummy transactions of 250
+bytes each. Every message is pickled once per send to count the bytes it
+puts on the wire, a broadcast N times. Reported are the bytes the busiest
+node sent, the time the instance took in this process, and the time the
+busiest node needs to upload its bytes at the given bandwidth, which is
+what bounds the instance on a real network.
+Usage: python3 benchmarks/bench_fin_dispersal.py [N ...] [--B TXS] [--bandwidth MBPS]
+"""
+
+import os, sys, pickle, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gevent
+from gevent.queue import Queue
+
+from fin_mvba.core.fin_mvba_protocol import run_fin_mvba
+
+def run(N, B, dispersal):
+    f = (N - 1) // 3
+    inboxes = [Queue() for _ in range(N)]
+    outputs = [Queue(1) for _ in range(N)]
+    sent = [0] * N
+    threads = []
+
+    def make_send(i):
+        def send(j, o):
+            receivers = range(N) if j == -1 else (j,)
+            sent[i] += len(pickle.dumps(o)) * len(receivers)
+            for k in receivers:
+                inboxes[k].put_nowait((i, o))
+        return send
+
+    start = time.perf_counter()
+    nodes = []
+    for i in range(N):
+        value = Queue(1)
+        value.put_nowait(os.urandom(250 * B))
+        nodes.append(gevent.spawn(run_fin_mvba, 'fin', i, 0, N, f, value, inboxes[i].get, make_send(i), outputs[i],
+                                  threads.append, dispersal=dispersal))
+    results = [outputs[i].get(timeout=600) for i in range(N)]
+    elapsed = time.perf_counter() - start
+    gevent.killall(threads + nodes)
+    assert len(set(results)) == 1
+    return max(sent), elapsed
+
+def main():
+    args = sys.argv[1:]
+    B, bandwidth = 1000, 100
+    for flag in ('--B', '--bandwidth'):
+        if flag in args:
+            i = args.index(flag)
+            if flag == '--B':
+                B = int(args[i + 1])
+            else:
+                bandwidth = float(args[i + 1])
+            args = args[:i] + args[i + 2:]
+    sizes = [int(a) for a in args] or [16, 31, 64]
+
+    print(f"B={B} TXs of 250 bytes per node, upload time of the busiest node at {bandwidth:.0f} Mbps")
+    print(f"{'N':>4}{'dispersal':>11}{'MB sent/node':>14}{'in-process s':>14}{'upload s':>10}")
+    for N in sizes:
+        for dispersal in ('full', 'avid'):
+            sent, elapsed = run(N, B, dispersal)
+            upload = sent * 8 / (bandwidth * 1e6)
+            print(f"{N:>4}{dispersal:>11}{sent / 1e6:>14.2f}{elapsed:>14.2f}{upload:>10.2f}")
+
+if __name__ == '__main__':
+    main()
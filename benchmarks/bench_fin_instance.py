@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Measure the scheduling cost of one FIN instance: N nodes run it in one
+process on B dummy transactions of 250 bytes each, over a network that
+hands every message to the receiver right away. Reported are the wall
+time until every node output, the greenlets spawned and the greenlet
+switches done by the hub, per node.
+Usage: python3 benchmarks/bench_fin_instance.py [N ...] [--B TXS] [--reps R] [--dispersal full|avid]
+"""
+
+import os, sys, statistics, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gevent import monkey
+monkey.patch_all(thread=False)
+
+import gevent
+import greenlet
+from gevent.queue import Queue
+
+from fin_mvba.core.fin_mvba_protocol import run_fin_mvba
+
+def run(N, B, dispersal, sid):
+    f = (N - 1) // 3
+    inboxes = [Queue() for _ in range(N)]
+    outputs = [Queue(1) for _ in range(N)]
+    threads = []
+
+    def make_send(i):
+        def send(j, o):
+            for k in (range(N) if j == -1 else (j,)):
+                inboxes[k].put_nowait((i, o))
+        return send
+
+    nodes = []
+    for i in range(N):
+        value = Queue(1)
+        value.put_nowait(os.urandom(250 * B))
+        nodes.append(gevent.spawn(run_fin_mvba, sid, i, 0, N, f, value, inboxes[i].get, make_send(i), outputs[i],
+                                  threads.append, dispersal=dispersal))
+    results = [outputs[i].get(timeout=600) for i in range(N)]
+    gevent.killall(threads + nodes)
+    assert len(set(results)) == 1
+
+def measure(N, B, dispersal, reps):
+    spawned = 0
+    switches = 0
+    elapsed = []
+
+    real_spawn = gevent.spawn
+
+    def counting_spawn(*args, **kwargs):
+        nonlocal spawned
+        spawned += 1
+        return real_spawn(*args, **kwargs)
+
+    def trace(event, args):
+        nonlocal switches
+        if event == 'switch':
+            switches += 1
+
+    gevent.spawn = counting_spawn
+    previous = greenlet.settrace(trace)
+    try:
+        for rep in range(reps):
+            start = time.perf_counter()
+            run(N, B, dispersal, f'bench{rep}')
+            elapsed.append(time.perf_counter() - start)
+    finally:
+        greenlet.settrace(previous)
+        gevent.spawn = real_spawn
+    return statistics.median(elapsed), spawned / reps / N, switches / reps / N
+
+def main():
+    args = sys.argv[1:]
+    B, reps, dispersal = 100, 3, 'full'
+    for flag in ('--B', '--reps', '--dispersal'):
+        if flag in args:
+            i = args.index(flag)
+            if flag == '--B':
+                B = int(args[i + 1])
+            elif flag == '--reps':
+                reps = int(args[i + 1])
+            else:
+                dispersal = args[i + 1]
+            args = args[:i] + args[i + 2:]
+    sizes = [int(a) for a in args] or [31, 61, 101]
+
+    print(f"B={B} TXs of 250 bytes per node, dispersal {dispersal}, median of {reps} runs")
+    print(f"{'N':>5}{'time (s)':>10}{'greenlets/node':>16}{'switches/node':>15}")
+    for N in sizes:
+        elapsed, spawned, switches = measure(N, B, dispersal, reps)
+        print(f"{N:>5}{elapsed:>10.2f}{spawned:>16.0f}{switches:>15.0f}")
+
+if __name__ == '__main__':
+    main()
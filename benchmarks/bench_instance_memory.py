@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Measure the memory one H-MVBA instance holds on to after it output.
+N nodes run one instance in one process on B dummy transactions of 250
+bytes each. Once every node output, the instance greenlets are left
+alive, as they are while later rounds run in the node, and the Python
+heap still allocated is compared with the heap at the peak. The
+BufferMeter of every node gives the payload bytes it counted.
+Usage: python3 benchmarks/bench_instance_memory.py [N ...] [--B TXS]
+"""
+
+import os, sys, gc, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gevent
+from gevent.queue import Queue
+
+from hash_mvba.core.buffermeter import BufferMeter
+from hash_mvba.core.hmvba_protocol import run_hmvba
+
+def run(N, B):
+    f = (N - 1) // 3
+    inboxes = [Queue() for _ in range(N)]
+    outputs = [Queue(1) for _ in range(N)]
+    meters = [BufferMeter() for _ in range(N)]
+    threads = []
+
+    def make_send(i):
+        def send(j, o):
+            for k in (range(N) if j == -1 else (j,)):
+                inboxes[k].put_nowait((i, o))
+        return send
+
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    nodes = []
+    for i in range(N):
+        value = Queue(1)
+        value.put_nowait(os.urandom(250 * B))
+        nodes.append(gevent.spawn(run_hmvba, 'mem', i, 0, N, f, value, inboxes[i].get, make_send(i), outputs[i],
+                                  threads.append, buffer_meter=meters[i]))
+    results = [outputs[i].get(timeout=120) for i in range(N)]
+    # let the instances reach their milestones, then measure what stays
+    gevent.sleep(0.1)
+    del results
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gevent.killall(threads + nodes)
+    return held - base, peak - base, max(m.peak for m in meters), max(m.held for m in meters)
+
+def main():
+    args = sys.argv[1:]
+    B = 2000
+    if '--B' in args:
+        i = args.index('--B')
+        B = int(args[i + 1])
+        args = args[:i] + args[i + 2:]
+    sizes = [int(a) for a in args] or [4, 16]
+
+    print(f"B={B} TXs of 250 bytes per node, all nodes in one process, MB of Python heap")
+    print(f"{'N':>4}{'peak heap':>12}{'held after output':>19}{'meter peak/node':>17}{'meter held/node':>17}")
+    for N in sizes:
+        held, peak, meter_peak, meter_held = run(N, B)
+        print(f"{N:>4}{peak / 1e6:>12.2f}{held / 1e6:>19.2f}{meter_peak / 1e6:>17.2f}{meter_held / 1e6:>17.2f}")
+
+if __name__ == '__main__':
+    main()
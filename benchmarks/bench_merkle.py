@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Merkle commitment of H-MVBA dispersal: merkleTree plus N
+getMerkleBranch calls against the flat-buffer MerkleTree that returns every
+branch at once. The cost of hashing the stripes alone is the lower bound.
+Usage: python3 benchmarks/bench_merkle.py [N ...] [--bytes PAYLOAD] [--reps R]
+"""
+
+import os, sys, hashlib, statistics, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto.zfec_encoding import encode, merkleTree, getMerkleBranch
+from crypto.merkle import merkle_build
+
+def legacy(stripes):
+    mt = merkleTree(stripes)
+    return mt[1], [getMerkleBranch(j, mt) for j in range(len(stripes))]
+
+def hash_stripes(stripes):
+    sha256 = hashlib.sha256
+    return [sha256(s).digest() for s in stripes]
+
+def timeit(func, arg, reps):
+    samples = []
+    for _ in range(reps):
+        start = time.perf_counter()
+        func(arg)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def main():
+    args = sys.argv[1:]
+    payload, reps = 250 * 1000, 20
+    for flag in ('--bytes', '--reps'):
+        if flag in args:
+            i = args.index(flag)
+            value = int(args[i + 1])
+            args = args[:i] + args[i + 2:]
+            if flag == '--bytes':
+                payload = value
+            else:
+                reps = value
+    sizes = [int(a) for a in args] or [61, 101, 201]
+
+    print(f"payload {payload} bytes, median of {reps} runs")
+    print(f"{'N':>5}{'hash only (ms)':>16}{'legacy (ms)':>14}{'flat (ms)':>12}{'speedup':>10}{'flat/hash':>11}")
+    for N in sizes:
+        f = (N - 1) // 3
+        stripes = encode(f + 1, N, os.urandom(payload))
+        assert legacy(stripes) == merkle_build(stripes)
+        t_hash = timeit(hash_stripes, stripes, reps)
+        t_legacy = timeit(legacy, stripes, reps)
+        t_flat = timeit(merkle_build, stripes, reps)
+        print(f"{N:>5}{t_hash * 1000:>16.3f}{t_legacy * 1000:>14.3f}{t_flat * 1000:>12.3f}"
+              f"{t_legacy / t_flat:>10.2f}{t_flat / t_hash:>11.2f}")
+
+if __name__ == '__main__':
+    main()
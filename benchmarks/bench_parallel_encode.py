@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark the dispersal of one proposal: erasure encoding plus hashing of
+the N stripes, inline on the hub against a CodingPool of 1..W threads.
+Besides the latency, a ticker greenlet measures the longest stall of the
+hub while the proposal is encoded, i.e. how long a pending ECHO/DONE
+would have waited.
+Usage: python3 benchmarks/bench_parallel_encode.py [N ...] [--B TXS] [--workers W] [--reps R]
+"""
+
+import os, sys, hashlib, statistics, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gevent
+
+from crypto.erasure_coding import encode
+from crypto.coding_pool import CodingPool
+
+def inline(K, N, m):
+    stripes = encode(K, N, m)
+    sha256 = hashlib.sha256
+    return stripes, [sha256(s).digest() for s in stripes]
+
+def measure(func, K, N, m, reps):
+    """Median latency of func, and the longest hub stall of a run with a
+    ticker greenlet that wakes up every millisecond."""
+    samples = []
+    for _ in range(reps):
+        start = time.perf_counter()
+        func(K, N, m)
+        samples.append(time.perf_counter() - start)
+    stall = [0.0]
+    def ticker():
+        last = time.perf_counter()
+        while True:
+            gevent.sleep(0.001)
+            now = time.perf_counter()
+            stall[0] = max(stall[0], now - last - 0.001)
+            last = now
+    t = gevent.spawn(ticker)
+    gevent.sleep(0.01)
+    func(K, N, m)
+    t.kill()
+    return statistics.median(samples), stall[0]
+
+def main():
+    args = sys.argv[1:]
+    B, reps, workers = 7000, 5, os.cpu_count() or 1
+    for flag in ('--B', '--reps', '--workers'):
+        if flag in args:
+            i = args.index(flag)
+            value = int(args[i + 1])
+            args = args[:i] + args[i + 2:]
+            if flag == '--B':
+                B = value
+            elif flag == '--reps':
+                reps = value
+            else:
+                workers = value
+    sizes = [int(a) for a in args] or [64, 201]
+    counts = sorted({1, 2, 4, workers} & set(range(1, workers + 1)))
+
+    m = os.urandom(250 * B)
+    print(f"payload {len(m)} bytes, {os.cpu_count()} cores, median of {reps} runs")
+    print(f"{'N':>5}{'mode':>12}{'latency (ms)':>14}{'hub stall (ms)':>16}{'speedup':>9}")
+    for N in sizes:
+        f = (N - 1) // 3
+        base, stall = measure(inline, f + 1, N, m, reps)
+        print(f"{N:>5}{'inline':>12}{base * 1000:>14.2f}{stall * 1000:>16.2f}{1:>9.2f}")
+        for w in counts:
+            pool = CodingPool(w)
+            assert pool.encode_and_hash(f + 1, N, m) == inline(f + 1, N, m)
+            latency, stall = measure(pool.encode_and_hash, f + 1, N, m, reps)
+            pool.close()
+            print(f"{N:>5}{f'{w} threads':>12}{latency * 1000:>14.2f}{stall * 1000:>16.2f}{base / latency:>9.2f}")
+
+if __name__ == '__main__':
+    main()
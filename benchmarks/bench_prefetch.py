@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark the retry latency of H-MVBA when the first elected leaders have
+crashed, with and without prefetching the VALUE stripes of the next leaders.
+All nodes run in one process over a network that delivers every message
+after a fixed one-way delay. The crashed nodes are the leaders of the
+first election rounds (the cheap election is a hash of the instance id,
+so they are known in advance), up to f of them, and they send nothing.
+Reported is the time until every correct node output, and the election
+round it output in.
+Usage: python3 benchmarks/bench_prefetch.py [N ...] [--delay MS] [--reps R]
+"""
+
+import os, sys, hashlib, statistics, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gevent
+from gevent.queue import Queue
+
+from hash_mvba.core.hmvba_protocol import run_hmvba
+from hash_mvba.core.phasetimer import PhaseTimer
+
+def first_leaders(sid, N, f):
+    """The distinct leaders of the first election rounds, at most f of them."""
+    prefix = f'{sid}:PMVBA:0'
+    leaders = []
+    for k in range(N):
+        leader = int.from_bytes(hashlib.sha256((prefix + str(k)).encode()).digest(), 'big') % (2 ** 10 - 1) % N
+        if leader in leaders:
+            continue
+        if len(leaders) == f:
+            break
+        leaders.append(leader)
+    return leaders
+
+def run(N, delay, prefetch, sid):
+    f = (N - 1) // 3
+    crashed = set(first_leaders(sid, N, f))
+    inboxes = [Queue() for _ in range(N)]
+    outputs = [Queue(1) for _ in range(N)]
+    timers = [PhaseTimer() for _ in range(N)]
+    threads = []
+
+    def make_send(i):
+        def send(j, o):
+            for k in (range(N) if j == -1 else (j,)):
+                gevent.spawn_later(delay, inboxes[k].put_nowait, (i, o))
+        return send
+
+    start = time.perf_counter()
+    nodes = []
+    for i in range(N):
+        if i in crashed:
+            continue
+        value = Queue(1)
+        value.put_nowait(os.urandom(1000))
+        nodes.append(gevent.spawn(run_hmvba, sid, i, 0, N, f, value, inboxes[i].get, make_send(i), outputs[i],
+                                  threads.append, phase_timer=timers[i], prefetch=prefetch))
+    results = {i: outputs[i].get(timeout=60) for i in range(N) if i not in crashed}
+    elapsed = time.perf_counter() - start
+    gevent.killall(threads + nodes)
+    assert len(set(results.values())) == 1
+    rounds = max(span['round'] for span in timers[min(results)].spans if span['phase'] == 'mba')
+    return elapsed, rounds, len(crashed)
+
+def main():
+    args = sys.argv[1:]
+    delay, reps = 0.02, 3
+    for flag in ('--delay', '--reps'):
+        if flag in args:
+            i = args.index(flag)
+            if flag == '--delay':
+                delay = float(args[i + 1]) / 1000
+            else:
+                reps = int(args[i + 1])
+            args = args[:i] + args[i + 2:]
+    sizes = [int(a) for a in args] or [7, 10, 16]
+
+    print(f"one-way delay {delay * 1000:.0f} ms, median of {reps} runs, seconds until every correct node output")
+    print(f"{'N':>4}{'crashed':>9}{'round':>7}{'prefetch 0':>12}{'prefetch 1':>12}{'prefetch 2':>12}")
+    for N in sizes:
+        sid = f'bench{N}'
+        row = []
+        for prefetch in (0, 1, 2):
+            samples = [run(N, delay, prefetch, sid) for _ in range(reps)]
+            row.append(statistics.median(s[0] for s in samples))
+        _, rounds, crashed = samples[0]
+        print(f"{N:>4}{crashed:>9}{rounds:>7}" + ''.join(f"{t:>12.3f}" for t in row))
+
+if __name__ == '__main__':
+    main()
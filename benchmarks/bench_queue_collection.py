@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark the ECHO/DONE/FINISH quorum waits of run_hmvba with the
+greenlet-per-queue QueueCollectionThreads against the counter based
+QueueCollectionCounters.
+Usage: python3 benchmarks/bench_queue_collection.py [N ...] [--reps R]
+For every N (default 61 101 201) it reports the wall time of one instance's
+waits, the greenlets spawned and the greenlet switches done by the hub.
+"""
+
+import os, sys, random, statistics, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gevent import monkey
+monkey.patch_all(thread=False)
+
+import gevent
+import greenlet
+from gevent.queue import Queue
+
+from hash_mvba.core.QueueCollection import QueueCollectionThreads, QueueCollectionCounters, ObservedQueue
+
+IMPLEMENTATIONS = (
+    ('threads', QueueCollectionThreads, Queue),
+    ('counters', lambda queues, put_thread: QueueCollectionCounters(queues), ObservedQueue),
+)
+
+def run_instance(N, collection_type, queue_type, seed):
+    """The quorum waits of one run_hmvba instance, fed one message at a time."""
+    f = (N - 1) // 3
+    echo = [queue_type(1) for _ in range(N)]
+    done = [queue_type(1) for _ in range(N)]
+    finish = [queue_type(1) for _ in range(N)]
+    threads = []
+
+    def echo_quorum():
+        collection_type(echo, threads.append).wait(N - f)
+
+    def finish_quorum():
+        done_t = gevent.spawn(collection_type(done, threads.append).wait, N - f)
+        finish_t = gevent.spawn(collection_type(finish, threads.append).wait, f + 1)
+        gevent.joinall([done_t, finish_t], count=1)
+        collection_type(finish, threads.append).wait(N - f)
+
+    waiters = [gevent.spawn(echo_quorum), gevent.spawn(finish_quorum)]
+
+    rng = random.Random(seed)
+    messages = [(qs, j) for qs in (echo, done, finish) for j in range(N)]
+    rng.shuffle(messages)
+    for qs, j in messages:
+        qs[j].put_nowait((j, 1))
+        gevent.sleep(0)  # messages arrive one by one
+    gevent.joinall(waiters)
+    gevent.killall(threads)
+
+def measure(N, collection_type, queue_type, reps):
+    spawned = 0
+    switches = 0
+    elapsed = []
+
+    real_spawn = gevent.spawn
+
+    def counting_spawn(*args, **kwargs):
+        nonlocal spawned
+        spawned += 1
+        return real_spawn(*args, **kwargs)
+
+    def trace(event, args):
+        nonlocal switches
+        if event == 'switch':
+            switches += 1
+
+    gevent.spawn = counting_spawn
+    previous = greenlet.settrace(trace)
+    try:
+        for rep in range(reps):
+            start = time.perf_counter()
+            run_instance(N, collection_type, queue_type, seed=rep)
+            elapsed.append(time.perf_counter() - start)
+    finally:
+        greenlet.settrace(previous)
+        gevent.spawn = real_spawn
+    return statistics.median(elapsed), spawned / reps, switches / reps
+
+def main():
+    args = sys.argv[1:]
+    reps = 5
+    if '--reps' in args:
+        i = args.index('--reps')
+        reps = int(args[i + 1])
+        args = args[:i] + args[i + 2:]
+    sizes = [int(a) for a in args] or [61, 101, 201]
+
+    print(f"{'N':>5}{'collection':>12}{'time (ms)':>12}{'greenlets':>12}{'switches':>12}")
+    for N in sizes:
+        for name, collection_type, queue_type in IMPLEMENTATIONS:
+            elapsed, spawned, switches = measure(N, collection_type, queue_type, reps)
+            print(f"{N:>5}{name:>12}{elapsed * 1000:>12.2f}{spawned:>12.0f}{switches:>12.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark the message throughput of the PISA reproposable binary agreement
+of FIN. N nodes run one RABA in one process, every message is handed to
+its receivers right away. With --inputs ones every node proposes 1; with
+mixed the nodes alternate between 1 and 0, and the nodes that proposed 0
+repropose 1 once half of the messages are out, as they do in FIN when the
+leader's broadcast delivers late. Reported are the messages handled per
+second and the rounds until every node decided, median of R runs one
+after another in the same process, and the peak of the Python heap in
+one more run.
+Usage: python3 benchmarks/bench_raba.py [N ...] [--inputs ones|mixed] [--reps R]
+"""
+
+import os, sys, hashlib, statistics, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gevent
+from gevent.event import Event
+from gevent.queue import Queue
+
+from fin_mvba.raba.pisa import reproposable_binaryagreement
+
+def coin(sid):
+    def _coin(r):
+        return hashlib.sha256(f'{sid}{r}coin'.encode()).digest()[0] % 2
+    return _coin
+
+def run(N, inputs, sid):
+    f = (N - 1) // 3
+    inboxes = [Queue() for _ in range(N)]
+    decided = [Queue(1) for _ in range(N)]
+    repropose = [Event() for _ in range(N)]
+    threads = []
+    delivered = 0
+    rounds = 0
+
+    def make_broadcast(i):
+        def broadcast(o):
+            nonlocal delivered, rounds
+            delivered += N
+            rounds = max(rounds, o[1] + 1)
+            for k in range(N):
+                inboxes[k].put_nowait((i, o))
+        return broadcast
+
+    nodes = []
+    for i in range(N):
+        vi = 1 if inputs == 'ones' or i % 2 == 0 else 0
+        node_input = Queue(1)
+        node_input.put_nowait(vi)
+        if vi == 1:
+            repropose[i].set()
+        nodes.append(gevent.spawn(reproposable_binaryagreement, sid, i, N, f, coin(sid), node_input.get,
+                                  decided[i].put_nowait, make_broadcast(i), inboxes[i].get,
+                                  repropose_event=repropose[i], put_thread=threads.append))
+
+    def repropose_later():
+        while delivered < N * N:
+            gevent.sleep(0)
+        for event in repropose:
+            event.set()
+    threads.append(gevent.spawn(repropose_later))
+
+    start = time.perf_counter()
+    results = [decided[i].get(timeout=600) for i in range(N)]
+    elapsed = time.perf_counter() - start
+    gevent.killall(threads + nodes)
+    assert len(set(results)) == 1
+    return delivered / elapsed, rounds
+
+def main():
+    args = sys.argv[1:]
+    inputs, reps = 'mixed', 3
+    for flag in ('--inputs', '--reps'):
+        if flag in args:
+            i = args.index(flag)
+            if flag == '--inputs':
+                inputs = args[i + 1]
+            else:
+                reps = int(args[i + 1])
+            args = args[:i] + args[i + 2:]
+    sizes = [int(a) for a in args] or [61, 201]
+
+    print(f"inputs {inputs}, median of {reps} runs")
+    print(f"{'N':>5}{'msgs/s':>12}{'rounds':>8}{'peak heap MB':>14}")
+    for N in sizes:
+        samples = [run(N, inputs, f'bench{N}-{rep}') for rep in range(reps)]
+        # one more run for the heap, tracing slows it down
+        tracemalloc.start()
+        run(N, inputs, f'bench{N}-heap')
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        throughput = statistics.median(s[0] for s in samples)
+        rounds = max(s[1] for s in samples)
+        print(f"{N:>5}{throughput:>12.0f}{rounds:>8}{peak / 1e6:>14.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark streamed against whole DIFFUSION of an H-MVBA stripe: the time
+from the first byte on the link until the receiver holds a verified stripe
+and can send its ECHO.
+The link is modelled by its bandwidth alone: every pickled frame arrives
+once all bytes before it have been sent, and the receiver handles each one
+as soon as it is in. A whole stripe is verified after its last byte; a
+streamed one is hashed chunk by chunk while the rest is still in flight,
+so only the branch check is left after the last chunk.
+Usage: python3 benchmarks/bench_streaming_diffusion.py [stripe_KB ...] [--chunk BYTES] [--reps R]
+"""
+
+import os, sys, pickle, statistics, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto.commitment import get_scheme
+from hash_mvba.core.stripestream import StripeAssembler, stream_messages
+
+BANDWIDTHS = {'10Mbps': 1.25e6, '100Mbps': 12.5e6, '1Gbps': 125e6}
+N = 16
+
+def deliver(frames, bandwidth, handle):
+    """Hands every frame to handle at its arrival time, returns when handle says done."""
+    start = time.perf_counter()
+    arrival = start
+    for frame in frames:
+        arrival += len(frame) / bandwidth
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if handle(pickle.loads(frame)):
+            return time.perf_counter() - start
+    raise AssertionError('stripe did not verify')
+
+def whole(commitment, stripe, branch, bandwidth, cache):
+    frames = [pickle.dumps(('DIFFUSION', (commitment, stripe, branch)))]
+    def handle(msg):
+        commitment, stripe, branch = msg[1]
+        return cache.verify(stripe, commitment, branch, 1)
+    return deliver(frames, bandwidth, handle)
+
+def streamed(commitment, stripe, branch, bandwidth, cache, chunk):
+    frames = [pickle.dumps(('STRIPE', m)) for m in stream_messages(commitment, stripe, branch, chunk)]
+    assembler = StripeAssembler(1, cache, chunk)
+    def handle(msg):
+        seq, payload = msg[1]
+        return assembler.feed(0, seq, payload) is not None
+    return deliver(frames, bandwidth, handle)
+
+def main():
+    args = sys.argv[1:]
+    reps, chunk = 5, 16384
+    for flag in ('--reps', '--chunk'):
+        if flag in args:
+            i = args.index(flag)
+            if flag == '--reps':
+                reps = int(args[i + 1])
+            else:
+                chunk = int(args[i + 1])
+            args = args[:i] + args[i + 2:]
+    sizes = [int(a) for a in args] or [64, 256, 1024, 4096]
+
+    scheme = get_scheme('merkle')
+    print(f"median of {reps} runs, time to a verified stripe in ms, chunks of {chunk} bytes")
+    print(f"{'stripe':>8}{'bandwidth':>10}{'whole':>10}{'streamed':>10}{'saved':>8}")
+    for kb in sizes:
+        stripes = [os.urandom(kb * 1024) for _ in range(N)]
+        commitment, branches = scheme.build(stripes)
+        for label, bw in BANDWIDTHS.items():
+            results = []
+            for run in (whole, streamed):
+                samples = []
+                for _ in range(reps):
+                    extra = (chunk,) if run is streamed else ()
+                    samples.append(run(commitment, stripes[1], branches[1], bw, scheme.verifier_cache(N), *extra))
+                results.append(statistics.median(samples))
+            saved = 1 - results[1] / results[0]
+            print(f"{str(kb) + 'KB':>8}{label:>10}{results[0] * 1000:>10.2f}{results[1] * 1000:>10.2f}{saved:>8.1%}")
+
+if __name__ == '__main__':
+    main()
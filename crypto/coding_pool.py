@@ -0,0 +1,134 @@
+"""Erasure encoding and stripe hashing of large payloads in worker threads.
+
+Encoding a full batch and hashing its ``N`` stripes takes milliseconds to
+seconds of CPU. Run on a greenlet, that time stalls the hub and every
+pending message of the process waits behind it. ``CodingPool`` moves the
+work to a pool of OS threads, and the calling greenlet yields until the
+stripes are ready.
+
+For column-wise codes (zfec) the systematic blocks are split into column
+segments whose parity blocks are encoded by different workers; the
+segments are then joined into the stripes by the workers that hash them.
+zfec and hashlib release the GIL, so the workers run on separate cores and
+the output is byte for byte the output of ``erasure_coding.encode``.
+Backends that keep the GIL encode in a pool of processes instead.
+
+Usage::
+
+    pool = CodingPool()
+    stripes, digests = pool.encode_and_hash(f + 1, N, v)
+    root, branches = merkle_build(digests=digests)
+"""
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from gevent.threadpool import ThreadPool
+
+from crypto import erasure_coding
+
+
+def _assemble(rows: Sequence[Sequence], digests: bool) -> Tuple[List[bytes], Optional[List[bytes]]]:
+    """Joins the column segments of every stripe in ``rows`` and hashes them."""
+    stripes = [row[0] if len(row) == 1 and isinstance(row[0], bytes) else b''.join(row) for row in rows]
+    if not digests:
+        return stripes, None
+    sha256 = hashlib.sha256
+    return stripes, [sha256(stripe).digest() for stripe in stripes]
+
+
+def _encode_in_process(name, K, N, m):
+    # worker processes start with the default backend
+    return erasure_coding.get_backend(name).encode(K, N, m)
+
+
+class CodingPool:
+    """A pool of workers for ``encode`` and the hashing of stripes.
+
+    Payloads shorter than ``min_size`` bytes are encoded inline, the hand
+    over to a thread costs more than it saves. A column segment is at least
+    ``min_segment`` bytes wide, so small stripes use fewer workers.
+    """
+
+    def __init__(self, workers: int = None, min_size: int = 64 * 1024, min_segment: int = 16 * 1024):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_size = min_size
+        self.min_segment = min_segment
+        self._threads = ThreadPool(self.workers)
+        self._processes = None
+
+    def _split(self, items: list, parts: int) -> List[list]:
+        parts = max(1, min(parts, len(items)))
+        bounds = [len(items) * k // parts for k in range(parts + 1)]
+        return [items[lo:hi] for lo, hi in zip(bounds, bounds[1:]) if hi > lo]
+
+    def _in_process(self, name, K, N, m):
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(self.workers)
+        future = self._processes.submit(_encode_in_process, name, K, N, bytes(m))
+        # wait in a thread, the hub keeps running
+        return self._threads.spawn(future.result).get()
+
+    def encode_and_hash(self, K: int, N: int, m, digests: bool = True) -> Tuple[List[bytes], Optional[List[bytes]]]:
+        """Erasure encodes ``m`` like ``erasure_coding.encode``.
+
+        :return: the ``N`` stripes and their SHA-256 digests (``None`` when
+            ``digests`` is false)
+        """
+        try:
+            m = m.encode()
+        except AttributeError:
+            pass
+        backend = erasure_coding.get_backend()
+        spawn = self._threads.spawn
+
+        if len(m) < self.min_size:
+            return _assemble([[stripe] for stripe in backend.encode(K, N, m)], digests)
+
+        if not backend.columnwise:
+            if backend.releases_gil:
+                stripes = spawn(backend.encode, K, N, m).get()
+            else:
+                stripes = self._in_process(backend.name, K, N, m)
+            jobs = [spawn(_assemble, [[stripe] for stripe in part], digests)
+                    for part in self._split(stripes, self.workers)]
+            return self._gather(jobs, digests)
+
+        blocks, _ = backend.systematic_blocks(K, m)
+        views = [memoryview(block) for block in blocks]
+        width = len(views[0])
+        segments = max(1, min(self.workers, width // self.min_segment))
+        bounds = [width * k // segments for k in range(segments + 1)]
+        parity_jobs = [spawn(backend.parity_blocks, K, N, [view[lo:hi] for view in views])
+                       for lo, hi in zip(bounds, bounds[1:])]
+        # copy and hash the systematic stripes while the parity is encoded
+        jobs = [spawn(_assemble, [[view] for view in part], digests)
+                for part in self._split(views, self.workers)]
+        parity_rows = list(zip(*[job.get() for job in parity_jobs]))
+        jobs += [spawn(_assemble, part, digests) for part in self._split(parity_rows, self.workers)]
+        return self._gather(jobs, digests)
+
+    @staticmethod
+    def _gather(jobs, digests):
+        stripes, hashes = [], []
+        for job in jobs:
+            part, part_hashes = job.get()
+            stripes += part
+            if digests:
+                hashes += part_hashes
+        return stripes, hashes if digests else None
+
+    def encode(self, K: int, N: int, m) -> List[bytes]:
+        return self.encode_and_hash(K, N, m, digests=False)[0]
+
+    def hash_stripes(self, stripes: Sequence[bytes]) -> List[bytes]:
+        jobs = [self._threads.spawn(_assemble, [[stripe] for stripe in part], True)
+                for part in self._split(list(stripes), self.workers)]
+        return self._gather(jobs, True)[1]
+
+    def close(self):
+        self._threads.kill()
+        if self._processes is not None:
+            self._processes.shutdown(wait=False)
+            self._processes = None
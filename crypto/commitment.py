@@ -0,0 +1,178 @@
+"""Vector commitments over the stripes of a dispersal.
+
+Two schemes share one interface, ``build(stripes, digests=None)`` returning
+the commitment and the proof of every stripe, and ``verifier_cache(N)``
+returning an object whose ``verify(val, commitment, proof, index)`` has the
+signature of ``merkleVerify`` without ``N``; ``verify_digest`` takes the
+SHA-256 of ``val`` instead:
+
+``merkle``
+    The Merkle tree of ``crypto.merkle``. A proof is the branch of
+    ``ceil(log2 N)`` digests; checking it takes about as many hashes, fewer
+    with the node cache.
+
+``hashlist``
+    The commitment is the SHA-256 of the ``N`` leaf digests joined into one
+    string, and the proof of every stripe is that string. A receiver hashes
+    the list once per commitment, after which a stripe costs one hash and a
+    slice comparison. Proofs grow linearly in ``N``, but as every stripe of
+    a commitment has the same proof (``shared_proof``) it is sent to each
+    receiver once: stripes under a commitment whose list the receiver
+    already verified carry ``None`` as their proof.
+
+``estimate`` models both for the per-node traffic and hashing of one H-MVBA
+instance; ``crossover`` finds the ``N`` from which Merkle is cheaper.
+"""
+import hashlib
+from typing import Dict, List, Sequence, Tuple, Union
+
+from crypto.merkle import DIGEST_SIZE, MerkleVerifierCache, merkle_build
+
+_sha256 = hashlib.sha256
+
+
+class MerkleCommitment:
+    name = 'merkle'
+    shared_proof = False
+
+    @staticmethod
+    def build(stripes: Sequence[bytes], digests: Sequence[bytes] = None) -> Tuple[bytes, List[List[bytes]]]:
+        return merkle_build(stripes, digests)
+
+    @staticmethod
+    def verifier_cache(N: int) -> MerkleVerifierCache:
+        return MerkleVerifierCache(N)
+
+    @staticmethod
+    def proof_size(N: int) -> int:
+        return DIGEST_SIZE * (N - 1).bit_length()
+
+
+class HashListVerifierCache:
+    """Verifies stripes against hash-list commitments, one list check per commitment.
+
+    Once the list of a commitment is known, stripes under it verify with
+    ``None`` as their proof.
+    """
+
+    def __init__(self, N: int):
+        self.N = N
+        self._lists: Dict[bytes, bytes] = dict()
+
+    def verify(self, val: Union[bytes, str], commitment: bytes, proof: bytes, index: int) -> bool:
+        if isinstance(val, str):
+            val = val.encode()
+        return self.verify_digest(_sha256(val).digest(), commitment, proof, index)
+
+    def verify_digest(self, digest: bytes, commitment: bytes, proof: bytes, index: int) -> bool:
+        if not 0 <= index < self.N:
+            return False
+        known = self._lists.get(commitment)
+        if known is None:
+            if not self.learn(commitment, proof):
+                return False
+            known = proof
+        elif proof is not None and proof is not known and proof != known:
+            return False
+        offset = index * DIGEST_SIZE
+        return digest == known[offset:offset + DIGEST_SIZE]
+
+    def knows(self, commitment: bytes) -> bool:
+        return commitment in self._lists
+
+    def learn(self, commitment: bytes, leaves: bytes) -> bool:
+        """Takes the list of ``commitment`` if it hashes to it."""
+        if commitment in self._lists:
+            return True
+        if not isinstance(leaves, bytes) or len(leaves) != self.N * DIGEST_SIZE \
+                or _sha256(leaves).digest() != commitment:
+            return False
+        self._lists[commitment] = leaves
+        return True
+
+
+class HashListCommitment:
+    name = 'hashlist'
+    shared_proof = True
+
+    @staticmethod
+    def build(stripes: Sequence[bytes], digests: Sequence[bytes] = None) -> Tuple[bytes, List[bytes]]:
+        if digests is None:
+            digests = [_sha256(s.encode() if isinstance(s, str) else s).digest() for s in stripes]
+        leaves = b''.join(digests)
+        # every receiver gets the same proof
+        return _sha256(leaves).digest(), [leaves] * len(digests)
+
+    @staticmethod
+    def verifier_cache(N: int) -> HashListVerifierCache:
+        return HashListVerifierCache(N)
+
+    @staticmethod
+    def proof_size(N: int) -> int:
+        return DIGEST_SIZE * N
+
+
+_schemes = {scheme.name: scheme for scheme in (MerkleCommitment, HashListCommitment)}
+
+
+def get_scheme(name: str):
+    try:
+        return _schemes[name]
+    except KeyError:
+        raise ValueError(f'unknown commitment scheme {name}, must be one of {list(_schemes)}')
+
+
+def estimate(name: str, N: int, bandwidth: float, hash_rate: float = 500e6, hash_call: float = 0.5e-6,
+             proof_cost: float = 2e-6, element_cost: float = 0.8e-6) -> Dict[str, float]:
+    """Estimated commitment overhead of one node in one H-MVBA instance.
+
+    A node sends ``N`` DIFFUSION messages with its own stripes and ``N``
+    VALUE messages with its stripe of the leader, each carrying the
+    commitment, and verifies the ``N`` stripes it receives for each.
+    DIFFUSION stripes carry a proof each and come under ``N`` different
+    commitments; VALUE stripes come under one, the leader's, and carry a
+    proof only if it is not shared, a hash list is known from the leader's
+    DIFFUSION. Hashing the stripes themselves costs the same for both
+    schemes and is left out.
+
+    :param bandwidth: bytes per second available to the node
+    :param hash_rate: SHA-256 throughput in bytes per second
+    :param hash_call: fixed cost of one SHA-256 call in seconds
+    :param proof_cost: seconds to (de)serialize and check one proof
+    :param element_cost: extra seconds per digest object in a proof, a
+        Merkle branch holds ``ceil(log2 N)`` of them and a hash list one
+    :return: ``bytes`` sent, ``hash_time``, ``cpu_time`` (hashing plus the
+        handling of proofs) and ``network_time`` in seconds, and ``total``
+    """
+    scheme = get_scheme(name)
+    proof = scheme.proof_size(N)
+    value_proof = 0 if scheme.shared_proof else proof
+    sent = N * (proof + DIGEST_SIZE) + N * (value_proof + DIGEST_SIZE)
+    depth = (N - 1).bit_length()
+    if name == 'merkle':
+        # build the inner nodes, check a branch per DIFFUSION stripe, and
+        # about two hashes per VALUE stripe once the cache is warm
+        calls = (1 << depth) + N * depth + 2 * N
+        hashed = 2 * DIGEST_SIZE * calls
+        elements = depth
+    else:
+        # hash the own list and one list per commitment received
+        calls = 1 + N + 1
+        hashed = (N + 1) * N * DIGEST_SIZE
+        elements = 1
+    hash_time = calls * hash_call + hashed / hash_rate
+    # the own proofs, and those of the DIFFUSION and VALUE stripes received
+    proofs = 2 * N if scheme.shared_proof else 3 * N
+    cpu_time = hash_time + proofs * (proof_cost + elements * element_cost)
+    network_time = sent / bandwidth
+    return {'bytes': sent, 'hash_time': hash_time, 'cpu_time': cpu_time, 'network_time': network_time,
+            'total': cpu_time + network_time}
+
+
+def crossover(bandwidth: float, max_N: int = 1024, **rates) -> int:
+    """The smallest ``N`` from which Merkle is estimated to be cheaper, or 0."""
+    for N in range(2, max_N + 1):
+        if estimate('merkle', N, bandwidth, **rates)['total'] < \
+                estimate('hashlist', N, bandwidth, **rates)['total']:
+            return N
+    return 0
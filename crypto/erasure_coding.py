@@ -0,0 +1,181 @@
+"""Erasure coding backends shared by the protocols.
+
+Protocols call ``encode(K, N, m)`` and ``decode(K, N, stripes)`` of this
+module, which forward to the selected backend. ``zfec`` is always available;
+``pyeclib`` (ISA-L Reed-Solomon) is used when it is installed and supports
+the code size. All nodes of a run must use the same backend, since the
+stripes of different backends are not interchangeable.
+
+Usage::
+
+    from crypto import erasure_coding
+    name, timings = erasure_coding.autotune(f + 1, N, 250 * B)
+    erasure_coding.set_backend(name)
+"""
+import os
+import time
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from crypto import zfec_encoding
+
+
+class ErasureBackend:
+    name = ''
+    # the C library runs without the GIL, so threads encode in parallel
+    releases_gil = False
+    # a column-wise code exposes ``systematic_blocks`` and ``parity_blocks``
+    # and encodes any range of columns independently of the others
+    columnwise = False
+
+    def available(self) -> bool:
+        return True
+
+    def supports(self, K: int, N: int) -> bool:
+        return True
+
+    def encode(self, K: int, N: int, m) -> List[bytes]:
+        raise NotImplementedError
+
+    def decode(self, K: int, N: int, stripes: List[Optional[bytes]]) -> bytes:
+        raise NotImplementedError
+
+
+class ZfecBackend(ErasureBackend):
+    name = 'zfec'
+    releases_gil = True
+    columnwise = True
+
+    def supports(self, K, N):
+        return 1 <= K <= N <= 256
+
+    def systematic_blocks(self, K, m):
+        return zfec_encoding.systematic_blocks(K, m)
+
+    def parity_blocks(self, K, N, blocks):
+        return zfec_encoding.parity_blocks(K, N, blocks)
+
+    def encode(self, K, N, m):
+        return zfec_encoding.encode(K, N, m)
+
+    def decode(self, K, N, stripes):
+        return zfec_encoding.decode(K, N, stripes)
+
+
+class PyeclibBackend(ErasureBackend):
+    """``pyeclib`` with ISA-L Vandermonde Reed-Solomon.
+
+    Fragments carry a pyeclib header, so any ``K`` of them decode without
+    their indices.
+    """
+    name = 'pyeclib'
+    EC_TYPE = 'isa_l_rs_vand'
+
+    def available(self):
+        try:
+            import pyeclib.ec_iface  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _driver(K, N):
+        from pyeclib.ec_iface import ECDriver
+        return ECDriver(k=K, m=N - K, ec_type=PyeclibBackend.EC_TYPE)
+
+    def supports(self, K, N):
+        if not self.available() or N <= K:
+            return False
+        try:
+            self._driver(K, N)
+        except Exception:
+            return False
+        return True
+
+    def encode(self, K, N, m):
+        try:
+            m = m.encode()
+        except AttributeError:
+            pass
+        return list(self._driver(K, N).encode(m))
+
+    def decode(self, K, N, stripes):
+        assert len(stripes) == N
+        blocks = [block for block in stripes if block is not None][:K]
+        if len(blocks) < K:
+            raise ValueError("Too few to recover")
+        try:
+            return self._driver(K, N).decode(blocks)
+        except Exception as e:
+            raise ValueError(str(e))
+
+
+_backends: Dict[str, ErasureBackend] = dict()
+
+
+def register_backend(backend: ErasureBackend):
+    _backends[backend.name] = backend
+
+
+register_backend(ZfecBackend())
+register_backend(PyeclibBackend())
+
+_current: ErasureBackend = _backends['zfec']
+
+
+def get_backend(name: str = None) -> ErasureBackend:
+    if name is None:
+        return _current
+    try:
+        return _backends[name]
+    except KeyError:
+        raise ValueError(f'unknown erasure coding backend {name}, must be one of {list(_backends)}')
+
+
+def set_backend(name: str):
+    global _current
+    backend = get_backend(name)
+    if not backend.available():
+        raise ValueError(f'erasure coding backend {name} is not installed')
+    _current = backend
+
+
+def available_backends(K: int, N: int) -> List[str]:
+    return [name for name, backend in _backends.items() if backend.available() and backend.supports(K, N)]
+
+
+def encode(K, N, m):
+    return _current.encode(K, N, m)
+
+
+def decode(K, N, stripes):
+    return _current.decode(K, N, stripes)
+
+
+def autotune(K: int, N: int, payload_size: int, reps: int = 3,
+             clock: Callable[[], float] = time.perf_counter) -> Tuple[str, Dict[str, float]]:
+    """Picks the fastest backend for ``(K, N)`` codes of ``payload_size`` bytes.
+
+    Every available backend encodes a random payload and decodes it from the
+    last ``K`` stripes, which forces an actual reconstruction. The best of
+    ``reps`` runs counts.
+
+    :return: the name of the fastest backend and the seconds each one took
+    """
+    payload = os.urandom(payload_size)
+    timings = dict()
+    for name in available_backends(K, N):
+        backend = _backends[name]
+        best = None
+        for _ in range(reps):
+            start = clock()
+            stripes = backend.encode(K, N, payload)
+            erased = [None] * (N - K) + list(stripes[N - K:])
+            m = backend.decode(K, N, erased)
+            elapsed = clock() - start
+            best = elapsed if best is None else min(best, elapsed)
+        assert m == payload, f'{name} failed to decode'
+        timings[name] = best
+    fastest = min(timings, key=timings.get)
+    return fastest, timings
@@ -0,0 +1,174 @@
+import hashlib
+from typing import List, Sequence, Tuple, Union
+
+DIGEST_SIZE = 32
+
+_sha256 = hashlib.sha256
+
+
+class MerkleTree:
+    """A Merkle tree over ``N`` leaves, built level by level in one pass.
+
+    Builds the same tree as ``crypto.zfec_encoding.merkleTree``: SHA-256
+    leaves padded up to a power of two with empty leaves ``b''``, and
+    ``node(i) == hash(node(2i) + node(2i+1))`` with the root at ``node(1)``.
+    Roots and branches are therefore interchangeable with ``merkleTree``,
+    ``getMerkleBranch`` and ``merkleVerify``.
+
+    Above the leaves every level is joined into one flat buffer of 32-byte
+    digests, so the two children of a node are contiguous and each parent
+    is a single SHA-256 call over a memoryview slice. ``branches`` gathers
+    the siblings of all leaves level by level instead of walking the tree
+    once per leaf.
+
+    Usage::
+
+        tree = MerkleTree(stripes)
+        root, branches = tree.root, tree.branches()
+    """
+
+    __slots__ = ('N', 'bottomrow', 'levels')
+
+    def __init__(self, leaves: Sequence[Union[bytes, str]] = None, digests: Sequence[bytes] = None):
+        """Builds the tree of ``leaves``, or of leaves whose SHA-256
+        ``digests`` were computed elsewhere."""
+        if digests is None:
+            digests = [_sha256(leaf.encode() if isinstance(leaf, str) else leaf).digest() for leaf in leaves]
+        N = len(digests)
+        assert N >= 1
+        bottomrow = 1 << (N - 1).bit_length()
+        self.N = N
+        self.bottomrow = bottomrow
+
+        sha256 = _sha256
+        level = list(digests) + [b''] * (bottomrow - N)
+        # levels[0] are the leaves, levels[-1] is [root]
+        self.levels: List[List[bytes]] = [level]
+        if bottomrow > 1:
+            # empty leaves have no digest, so the first level concatenates
+            it = iter(level)
+            level = [sha256(left + right).digest() for left, right in zip(it, it)]
+            self.levels.append(level)
+        while len(level) > 1:
+            flat = memoryview(b''.join(level))
+            level = [sha256(flat[i:i + 2 * DIGEST_SIZE]).digest() for i in range(0, len(flat), 2 * DIGEST_SIZE)]
+            self.levels.append(level)
+
+    @property
+    def root(self) -> bytes:
+        return self.levels[-1][0]
+
+    def node(self, i: int) -> bytes:
+        """The node at index ``i`` of the ``merkleTree`` list layout."""
+        height = self.bottomrow.bit_length() - i.bit_length()
+        return self.levels[height][i - (self.bottomrow >> height)]
+
+    def branch(self, index: int) -> List[bytes]:
+        """The authentication path of leaf ``index``, leaf to root."""
+        assert 0 <= index < self.N
+        return [level[(index >> k) ^ 1] for k, level in enumerate(self.levels[:-1])]
+
+    def branches(self) -> List[List[bytes]]:
+        """The authentication paths of all leaves at once."""
+        indices = range(self.N)
+        siblings = [[level[(j >> k) ^ 1] for j in indices] for k, level in enumerate(self.levels[:-1])]
+        if not siblings:
+            return [[]]
+        return list(map(list, zip(*siblings)))
+
+    def to_list(self) -> List[bytes]:
+        """The tree in the list layout of ``merkleTree``."""
+        mt = [b'']
+        for level in reversed(self.levels):
+            mt.extend(level)
+        return mt
+
+
+def merkle_build(leaves: Sequence[Union[bytes, str]] = None,
+                 digests: Sequence[bytes] = None) -> Tuple[bytes, List[List[bytes]]]:
+    """Builds the tree of ``leaves`` (or of the leaf ``digests``) and returns
+    its root with every branch."""
+    tree = MerkleTree(leaves, digests)
+    return tree.root, tree.branches()
+
+
+class MerkleVerifier:
+    """Verifies branches against one root, remembering authenticated nodes.
+
+    Accepts exactly the branches ``merkleVerify`` accepts for the same root.
+    Once a branch checks out, every node on its path and every sibling it
+    carried is known to be part of the tree. A later branch stops hashing as
+    soon as it reaches a known node and only compares against it, so each
+    additional leaf costs about one hash plus the siblings not seen yet.
+    """
+
+    __slots__ = ('N', 'root', 'bottomrow', 'depth', '_nodes')
+
+    def __init__(self, N: int, root: bytes):
+        assert N >= 1
+        self.N = N
+        self.root = root
+        self.bottomrow = 1 << (N - 1).bit_length()
+        self.depth = self.bottomrow.bit_length() - 1
+        self._nodes = dict()  # tree index -> authenticated digest
+
+    def verify(self, val: Union[bytes, str], branch: Sequence[bytes], index: int) -> bool:
+        if isinstance(val, str):
+            val = val.encode()
+        return self.verify_digest(_sha256(val).digest(), branch, index)
+
+    def verify_digest(self, digest: bytes, branch: Sequence[bytes], index: int) -> bool:
+        """``verify`` for a leaf whose SHA-256 ``digest`` is already known."""
+        if not 0 <= index < self.N or len(branch) != self.depth:
+            return False
+        nodes = self._nodes
+        sha256 = _sha256
+        t = index + self.bottomrow
+        cur = digest
+        seen = []
+        for level, br in enumerate(branch):
+            known = nodes.get(t)
+            if known is not None:
+                if known != cur:
+                    return False
+                # known nodes are stored with their siblings, the rest of
+                # the branch must match them without hashing
+                for br in branch[level:]:
+                    if nodes.get(t ^ 1) != br:
+                        return False
+                    t >>= 1
+                break
+            seen.append((t, cur))
+            seen.append((t ^ 1, br))
+            cur = sha256(br + cur if t & 1 else cur + br).digest()
+            t >>= 1
+        else:
+            if cur != self.root:
+                return False
+        nodes.update(seen)
+        return True
+
+
+class MerkleVerifierCache:
+    """One ``MerkleVerifier`` per root, for the lifetime of a protocol instance.
+
+    ``verify(val, roothash, branch, index)`` takes the arguments of
+    ``merkleVerify`` without ``N``.
+    """
+
+    def __init__(self, N: int):
+        self.N = N
+        self._verifiers = dict()
+
+    def verifier(self, roothash: bytes) -> MerkleVerifier:
+        try:
+            return self._verifiers[roothash]
+        except KeyError:
+            verifier = self._verifiers[roothash] = MerkleVerifier(self.N, roothash)
+            return verifier
+
+    def verify(self, val: Union[bytes, str], roothash: bytes, branch: Sequence[bytes], index: int) -> bool:
+        return self.verifier(roothash).verify(val, branch, index)
+
+    def verify_digest(self, digest: bytes, roothash: bytes, branch: Sequence[bytes], index: int) -> bool:
+        return self.verifier(roothash).verify_digest(digest, branch, index)
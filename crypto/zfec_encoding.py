@@ -1,6 +1,17 @@
 import zfec
 import hashlib
 import math
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _encoder(K, N):
+    return zfec.Encoder(K, N)
+
+
+@lru_cache(maxsize=None)
+def _decoder(K, N):
+    return zfec.Decoder(K, N)
 
 
 #####################
@@ -17,20 +28,47 @@ def encode(K, N, m):
     :return list: Erasure codes resulting from encoding ``m`` into
         ``N`` blocks using ``zfec`` lib.
 
+    The code is systematic: the first ``K`` blocks are ``m`` itself, padded
+    to a multiple of ``K`` bytes. They are cut from a memoryview of ``m``
+    and only zfec computes the ``N - K`` parity blocks, so the payload is
+    copied once, into the stripes.
+    """
+    blocks, full = systematic_blocks(K, m)
+    parity = parity_blocks(K, N, blocks)
+    stripes = [bytes(b) for b in blocks[:full]] + blocks[full:] + parity
+    return stripes
+
+
+def systematic_blocks(K, m):
+    """Cuts ``m`` into the ``K`` systematic blocks of ``encode``.
+
+    :return: the blocks and the number ``full`` of leading blocks that are
+        memoryviews of ``m``; the others are ``bytes`` holding the padding
     """
     try:
         m = m.encode()
     except AttributeError:
         pass
-    encoder = zfec.Encoder(K, N)
     assert K <= 256  # TODO: Record this assumption!
     # pad m to a multiple of K bytes
     padlen = K - (len(m) % K)
-    m += padlen * chr(K-padlen).encode()
-    step = len(m)//K
-    blocks = [m[i*step: (i+1)*step] for i in range(K)]
-    stripes = encoder.encode(blocks)
-    return stripes
+    step = (len(m) + padlen) // K
+    view = memoryview(m)
+    # only the last blocks hold padding
+    full = len(m) // step
+    blocks = [view[i*step: (i+1)*step] for i in range(full)]
+    tail = bytes(view[full*step:]) + padlen * bytes((K - padlen,))
+    blocks += [tail[i*step: (i+1)*step] for i in range(K - full)]
+    return blocks, full
+
+
+def parity_blocks(K, N, blocks):
+    """The ``N - K`` parity blocks of the systematic ``blocks``.
+
+    The code works column by column, so the parity of a range of columns
+    of ``blocks`` is the same range of the full parity blocks.
+    """
+    return _encoder(K, N).encode(blocks, list(range(K, N)))
 
 
 def decode(K, N, stripes):
@@ -41,23 +79,31 @@ def decode(K, N, stripes):
         at least :math:`K` elements are strings
         all string elements are the same length
 
+    When the first ``K`` (systematic) stripes are present they are the
+    padded message and no decoding is needed.
     """
     assert len(stripes) == N
-    blocks = []
-    blocknums = []
-    for i, block in enumerate(stripes):
-        if block is None:
-            continue
-        blocks.append(block)
-        blocknums.append(i)
-        if len(blocks) == K:
-            break
+    if all(stripes[i] is not None for i in range(K)):
+        rec = stripes[:K]
     else:
-        raise ValueError("Too few to recover")
-    decoder = zfec.Decoder(K, N)
-    rec = decoder.decode(blocks, blocknums)
+        blocks = []
+        blocknums = []
+        for i, block in enumerate(stripes):
+            if block is None:
+                continue
+            blocks.append(block)
+            blocknums.append(i)
+            if len(blocks) == K:
+                break
+        else:
+            raise ValueError("Too few to recover")
+        rec = _decoder(K, N).decode(blocks, blocknums)
+    padlen = K - rec[-1][-1]
+    last = rec[-1]
+    if padlen <= len(last):
+        # strip the padding off the last block before joining
+        return b''.join([*rec[:-1], last[:len(last) - padlen]])
     m = b''.join(rec)
-    padlen = K - m[-1]
     m = m[:-padlen]
     return m
 
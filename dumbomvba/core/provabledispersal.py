@@ -2,7 +2,7 @@ import time
 from collections import defaultdict
 
 from crypto.threshsig.boldyreva import serialize, deserialize1
-from crypto.zfec_encoding import encode, decode
+from crypto.erasure_coding import encode, decode
 from honeybadgerbft.core.reliablebroadcast import merkleTree, getMerkleBranch, merkleVerify
 from gevent import monkey
 
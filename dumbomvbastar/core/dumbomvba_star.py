@@ -16,6 +16,7 @@ from gevent.queue import Queue
 from gevent.lock import BoundedSemaphore
 
 from crypto.ecdsa.ecdsa import ecdsa_vrfy
+from crypto.merkle import MerkleVerifierCache
 # from dumbomvbastar.core.provabledispersal import provabledispersalbroadcast
 from dumbomvbastar.core.provabledispersal_star import provabledispersalbroadcast
 from dumbomvbastar.core.recast import recastsubprotocol
@@ -85,6 +86,8 @@ def smvbastar(
     assert PK.l == N
 
     pd = [None for n in range(N)]
+    # STORE branches checked by PD are reused by the recast of the same root
+    merkle_cache = MerkleVerifierCache(N)
 
     store = [Queue(1) for _ in range(N)]
     lock = [Queue(1) for _ in range(N)]
@@ -136,7 +139,8 @@ def smvbastar(
             pd_outputs[j].put_nowait,
             pd_recvs[j].get,
             make_pd_send(j),
-            logger=logger
+            logger=logger,
+            merkle_cache=merkle_cache
         )
         # pd_leader_outputs[j] = pd[j].get
 
@@ -312,7 +316,8 @@ def smvbastar(
             make_rc_send(r),
             store[l].get,
             lock[l].get,
-            logger=logger
+            logger=logger,
+            merkle_cache=merkle_cache
         )
         rc_out = rc.get()
         # if logger: logger.debug((pid, "returns in ", sid))
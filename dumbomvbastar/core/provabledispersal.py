@@ -5,7 +5,7 @@ import pickle
 import time
 from collections import defaultdict
 from crypto.ecdsa.ecdsa import ecdsa_vrfy, ecdsa_sign
-from crypto.zfec_encoding import encode, decode
+from crypto.erasure_coding import encode, decode
 from honeybadgerbft.core.reliablebroadcast import merkleTree, getMerkleBranch, merkleVerify
 from gevent import monkey
 monkey.patch_all(thread=False)
@@ -5,8 +5,9 @@ import pickle
 import time
 from collections import defaultdict
 from crypto.ecdsa.ecdsa import ecdsa_vrfy, ecdsa_sign
-from crypto.zfec_encoding import encode, decode
+from crypto.erasure_coding import encode, decode
 from honeybadgerbft.core.reliablebroadcast import merkleTree, getMerkleBranch, merkleVerify
+from crypto.merkle import MerkleVerifierCache
 from gevent import monkey
 monkey.patch_all(thread=False)
 from gevent.event import Event
@@ -22,7 +23,8 @@ def provabledispersalbroadcast(
         input, output,
         receive, send,
         logger: logging.Logger=None,
-        stop: Event=Event()
+        stop: Event=Event(),
+        merkle_cache: MerkleVerifierCache=None
     ):
     """Reliable broadcast
 
@@ -56,6 +58,8 @@ def provabledispersalbroadcast(
                 sent after receiving :math:`N-f` ``ECHO`` messages
                 or after receiving :math:`f+1` ``READY`` messages
 
+    :param merkle_cache: ``MerkleVerifierCache`` shared with the recast of
+        the same instance, so that tree nodes are authenticated once
     """
     # if logger: logger.debug("pd start pid:", pid, "leder:",leader)
     assert N >= 3 * f + 1
@@ -63,6 +67,9 @@ def provabledispersalbroadcast(
     assert 0 <= leader < N
     assert 0 <= pid < N
 
+    if merkle_cache is None:
+        merkle_cache = MerkleVerifierCache(N)
+
     K = f + 1 # Need this many to reconstruct. (# noqa: E221)
     # EchoThreshold = N - f  # Wait for this many ECHO to send READY. (# noqa: E221)
     # ReadyThreshold = f + 1  # Wait for this many READY to amplify READY. (# noqa: E221)
@@ -122,7 +129,7 @@ def provabledispersalbroadcast(
                 continue
             try:
                 assert not stop.ready()
-                assert merkleVerify(N, stripe, roothash, branch, pid)
+                assert merkle_cache.verify(stripe, roothash, branch, pid)
             except Exception as e:
                 if logger: logger.error(("Failed to validate STORE message:", e))
                 continue
@@ -7,16 +7,21 @@ from collections import defaultdict
 import gevent
 from gevent import monkey
 from crypto.ecdsa.ecdsa import ecdsa_vrfy, ecdsa_sign
-from crypto.zfec_encoding import encode, decode
+from crypto.erasure_coding import encode, decode
 from honeybadgerbft.core.reliablebroadcast import merkleTree, getMerkleBranch, merkleVerify
+from crypto.merkle import MerkleVerifierCache
 import logging
 
 
-def recastsubprotocol(pid, sid, N, f,  PK2s, SK2, receive, send, getstore, getlock, logger: logging.Logger=None):
+def recastsubprotocol(pid, sid, N, f,  PK2s, SK2, receive, send, getstore, getlock, logger: logging.Logger=None,
+                      merkle_cache: MerkleVerifierCache=None):
 
     assert N >= 3 * f + 1
     assert f >= 0
     assert 0 <= pid < N
+
+    if merkle_cache is None:
+        merkle_cache = MerkleVerifierCache(N)
     
     K = f + 1
 
@@ -107,7 +112,7 @@ def recastsubprotocol(pid, sid, N, f,  PK2s, SK2, receive, send, getstore, getlo
                 if logger: logger.warning(("not the first time receive rcstore from node ", sender))
                 continue
             try:
-                assert merkleVerify(N, stripe, roothash, branch, sender)
+                assert merkle_cache.verify(stripe, roothash, branch, sender)
             except Exception as e:
                 if logger: logger.error(("Failed to validate STORE message:", e))
                 continue
@@ -7,9 +7,12 @@ from collections import namedtuple, defaultdict
 from enum import Enum
 import random
 import traceback
-from typing import Tuple, List, Callable, Dict, Any
+from typing import Tuple, List, Callable, Dict, Any, Optional
 
 from fin_mvba.raba.pisa import reproposable_binaryagreement
+from crypto.erasure_coding import encode, decode
+from crypto.coding_pool import CodingPool
+from crypto.commitment import get_scheme
 
 import hashlib
 
@@ -39,60 +42,47 @@ try:
 except ImportError:
     import pickle
 
-simple_qc = False
-
-if simple_qc:
-    from hash_mvba.core.QueueCollection import QueueCollection
-else:
-    from hash_mvba.core.QueueCollection import QueueCollectionThreads as QueueCollection
+from fin_mvba.core.wrbc import WeakRBC
+from hash_mvba.core.election import ElectionService, hash_election
 
 NULL = b'0'
 
 TIMEOUT = 0.00001
 
-from gevent.lock import BoundedSemaphore
-from collections import defaultdict
-
-
-class ThreadSafeWrapper:
-    def __init__(self, obj):
-        self.__dict__['_obj'] = obj
-        self.__dict__['_lock'] = BoundedSemaphore(value=1)
-
-    def __getattr__(self, name):
-        with self.__dict__['_lock']:
-            return getattr(self.__dict__['_obj'], name)
 
-    def __setattr__(self, name, value):
-        with self.__dict__['_lock']:
-            setattr(self.__dict__['_obj'], name, value)
+def disperse(N, f, value, coding_pool: CodingPool = None, commitment_scheme: str = 'merkle'):
+    """The ``(f + 1, N)`` erasure code of ``value`` and its commitment.
 
-    def __delattr__(self, name):
-        with self.__dict__['_lock']:
-            delattr(self.__dict__['_obj'], name)
-
-    def __getitem__(self, key):
-        with self.__dict__['_lock']:
-            return self.__dict__['_obj'][key]
+    :return: the commitment, the stripes and the proof of every stripe
+    """
+    if coding_pool is None:
+        stripes = encode(f + 1, N, value)
+        digests = None
+    else:
+        stripes, digests = coding_pool.encode_and_hash(f + 1, N, value)
+    commitment, proofs = get_scheme(commitment_scheme).build(stripes, digests)
+    return commitment, stripes, proofs
 
-    def __setitem__(self, key, value):
-        with self.__dict__['_lock']:
-            self.__dict__['_obj'][key] = value
 
-    def __delitem__(self, key):
-        with self.__dict__['_lock']:
-            del self.__dict__['_obj'][key]
+def retrieve(N, f, commitment: bytes, stripes: List[Optional[bytes]], predicate: Callable = lambda x: True,
+             commitment_scheme: str = 'merkle') -> Optional[bytes]:
+    """Decodes a dispersed value from ``f + 1`` of its stripes.
 
-    def __contains__(self, *args, **kwargs):  # real signature unknown
-        """ True if the dictionary has the specified key, else False. """
-        with self.__dict__['_lock']:
-            return self.__dict__['_obj'].__contains__(*args, **kwargs)
+    The value is encoded again and must give the same commitment, so a
+    sender that dispersed stripes of no single value is caught whichever
+    stripes are used: every correct node decodes the same value or ``None``.
 
-    def __call__(self, *args, **kwargs):
-        with self.__dict__['_lock']:
-            return self.__dict__['_obj'](*args, **kwargs)
+    :return: the value, or ``None`` if it does not match the commitment or
+        the predicate
+    """
+    try:
+        value = decode(f + 1, N, stripes)
+    except (ValueError, IndexError):
+        return None
+    if disperse(N, f, value, commitment_scheme=commitment_scheme)[0] != commitment:
+        return None
+    return value if predicate(value) else None
 
-    # Add other methods as needed
 
 
 def run_fin_mvba(
@@ -103,12 +93,33 @@ def run_fin_mvba(
         put_thread: Callable = lambda x: None,
         predicate: Callable = lambda x: True,
         logger: logging.Logger = None,
-        thread_safe: bool = True
+        check_state: bool = False,
+        election: ElectionService = None,
+        dispersal: str = 'full',
+        commitment_scheme: str = 'merkle',
+        coding_pool: CodingPool = None
 ):
     """
     Run FIN MVBA protocol
 
+    The N weak RBCs run as one ``WeakRBC`` state machine, fed inline by
+    the receiver loop. The per-sender state lives in ``SenderTable``s,
+    which are used from one hub without locks; ``check_state`` asserts that.
+
+    Leaders are elected with the hash of the instance and the round,
+    unless an ``ElectionService`` is given as ``election``: then with a
+    threshold coin, see ``hash_mvba.core.election``.
+
+    With ``dispersal='avid'`` the weak RBC of every proposal disperses it
+    instead of sending it whole: the sender erasure codes it into
+    ``(f + 1, N)`` stripes, SEND carries one stripe and its proof to each
+    node, ECHO and READY carry the commitment, and only the value of the
+    elected leader is retrieved, by broadcasting the stripes of it in
+    VALUE. ``commitment_scheme`` selects the commitment, see
+    ``crypto.commitment``; ``coding_pool`` encodes the own proposal.
     """
+    assert dispersal in ('full', 'avid'), dispersal
+    avid = dispersal == 'avid'
     # logger = None
 
     if logger: logger.info(f'{pid} start mvba!')
@@ -116,6 +127,9 @@ def run_fin_mvba(
     spawn_time = time.time()
 
     fin_mvba_prefix = f'{sid}:FINMVBA:{str(r)}'
+    if election is not None:
+        # sign the coin shares of the first rounds while the broadcasts run
+        election.precompute(fin_mvba_prefix, range(election.lookahead))
     send_threads = Queue()
 
     class BroadcastTag(Enum):
@@ -129,9 +143,6 @@ def run_fin_mvba(
     broadcast_receiver_queues = namedtuple(
         'broadcast_receiver_queues',
         (
-            'SEND',
-            'ECHO',
-            'READY',
             'VALUE',
             'ELECTION',
             'RABA',
@@ -141,6 +152,12 @@ def run_fin_mvba(
         recv_msg = recv_func()
         sender, (tag_value, j, msg) = recv_msg
 
+        handler = wrbc_handlers.get(tag_value)
+        if handler is not None:
+            # the weak RBCs are handled inline
+            handler(sender, j, msg)
+            return
+
         if tag_value not in BroadcastTag._value2member_map_:
             unhandled_queue.put_nowait(recv_msg)
             print('Unknown tag: {}! Must be one of {}.'.format(
@@ -174,9 +191,6 @@ def run_fin_mvba(
     # ready_recvs: List[Queue] = [Queue(1) for _ in range(N)]
     # value_recvs: List[Queue] = [Queue() for _ in range(N)]
 
-    send_recvs: List[Queue] = [Queue() for _ in range(N)]
-    echo_recvs: List[Queue] = [Queue() for _ in range(N)]
-    ready_recvs: List[Queue] = [Queue() for _ in range(N)]
     value_recvs: List[Queue] = [Queue() for _ in range(N)]
     election_recv: Queue = Queue()
 
@@ -186,14 +200,58 @@ def run_fin_mvba(
     # sub-protocol messages are unhandled
     unhandled_recvs = Queue()
 
-    T_list = ThreadSafeWrapper([None for _ in range(N)]) if thread_safe else [None for _ in range(N)]
-    ready_sent = [Event() for _ in range(N)]
-    wr_deliver_dict = ThreadSafeWrapper(dict()) if thread_safe else dict()
+    vc_cache = get_scheme(commitment_scheme).verifier_cache(N)
+    # avid: the value retrieved of every elected leader, None if its dispersal was bad
+    retrieved = dict()
+
+    def accept_send(j: int, _vj) -> Optional[bytes]:
+        """The digest to ECHO for the SEND of ``j``, computed once."""
+        if avid:
+            # the value is checked against the predicate once retrieved
+            try:
+                commitment_j, stripe_j, proof_j = _vj
+            except (TypeError, ValueError):
+                return None
+            if not vc_cache.verify(stripe_j, commitment_j, proof_j, pid):
+                if logger: logger.warning(f'bad stripe of {j}')
+                return None
+            return commitment_j
+        if not predicate(_vj):
+            # do noting when predicate is static
+            if logger: logger.warning(f'SEND of {j} fails the predicate')
+            return None
+        return _hash(_vj)
+
+    def broadcast_echo_hash(_instance_id: int, _hash):
+        broadcast(
+            (
+                BroadcastTag.ECHO.value,
+                _instance_id,
+                (_instance_id, _hash)
+            )
+        )
+
+    def broadcast_ready(_instance_id: int, _hash):
+        broadcast(
+            (
+                BroadcastTag.READY.value,
+                _instance_id,
+                (_instance_id, _hash)
+            )
+        )
+
+    # all N weak RBCs in one state machine, fed by the receiver loop
+    wrbc = WeakRBC(N, f, accept_send, broadcast_echo_hash, broadcast_ready, debug=check_state)
+    wrbc_handlers = {
+        BroadcastTag.SEND.value: wrbc.on_send,
+        BroadcastTag.ECHO.value: wrbc.on_echo,
+        BroadcastTag.READY.value: wrbc.on_ready,
+    }
+    # the proposal of every sender, or with avid the own stripe of it as (commitment, stripe, proof)
+    T_list = wrbc.values
+    wr_deliver_dict = wrbc.delivered
 
     recv_queues = broadcast_receiver_queues(
-        SEND=send_recvs,
-        ECHO=echo_recvs,
-        READY=ready_recvs,
         VALUE=value_recvs,
         ELECTION=election_recv,
         RABA=raba_recvs
@@ -215,133 +273,55 @@ def run_fin_mvba(
             )
         )
 
-    # broadcast_send_vi(vi)
-    _t = gevent.spawn(broadcast_send_vi, vi)
-    send_threads.put_nowait(_t)
-
-
-
-    def upon_receiving_send(instance_id: int, _recv_func: Callable, _T_list: List):
-        def broadcast_echo_hash(_instance_id: int, _hash):
-            broadcast(
+    def disperse_vi(_vi):
+        commitment, stripes, proofs = disperse(N, f, _vi, coding_pool, commitment_scheme)
+        for j in range(N):
+            send(
+                j,
                 (
-                    BroadcastTag.ECHO.value,
-                    _instance_id,
-                    (_instance_id, _hash)
+                    BroadcastTag.SEND.value,
+                    pid,
+                    (commitment, stripes[j], proofs[j])
                 )
             )
 
-        _sender_j, _vj = _recv_func()
-        assert _sender_j == instance_id
-        if predicate(_vj):
-            if _T_list[_sender_j] not in (None, NULL):
-                if logger: logger.warning('')
-                return
-            _T_list[_sender_j] = _vj
-            _vj_hash = _hash(_vj)
-            _t = gevent.spawn(broadcast_echo_hash, instance_id, _vj_hash)
-            send_threads.put_nowait(_t)
-        else:
-            # do noting when predicate is static
-            if logger: logger.warning('')
-
-    for i in range(N):
-        # upon_receiving_send_from_j(send_recv, T_list)
-        _t = gevent.spawn(upon_receiving_send, i, send_recvs[i].get, T_list)
-        put_thread(_t)
+    # broadcast_send_vi(vi)
+    _t = gevent.spawn(disperse_vi if avid else broadcast_send_vi, vi)
+    send_threads.put_nowait(_t)
 
-    def broadcast_ready(_instance_id: int, _hash):
-        broadcast(
-            (
-                BroadcastTag.READY.value,
-                _instance_id,
-                (_instance_id, _hash)
-            )
-        )
 
-    def upon_receiving_N_f_matching_echo(instance_id: int, _recv_func: Callable, _ready_sent: Event):
-        counting = defaultdict(set)
-        received_from = set()
-        while True:
-            _sender, (
-                _instance_id,
-                _h
-            ) = _recv_func()
-            assert instance_id == _instance_id
-            if _sender in received_from:
-                if logger: logger.warning('')
-            if _sender in counting[_h]:
-                if logger: logger.warning('')
-            received_from.add(_sender)
-            counting[_h].add(_sender)
-            if len(counting[_h]) >= N - f:
-                break
 
-        if _h is None:
-            logger.warning('')
-        if not _ready_sent.ready():
-            _ready_sent.set()
-            _t = gevent.spawn(broadcast_ready, instance_id, _h)
+    def retrieve_value(k: int, commitment_k: bytes, own, _value_recv: Queue) -> Optional[bytes]:
+        """The value dispersed by ``k`` under ``commitment_k``, from the stripes broadcast in VALUE."""
+        if k in retrieved:
+            return retrieved[k]
+        if own not in (None, NULL):
+            # broadcast VALUE(own stripe of k)
+            _, stripe, proof = own
+            _t = gevent.spawn(broadcast, (BroadcastTag.VALUE.value, k, (k, (stripe, proof))))
             send_threads.put_nowait(_t)
-        else:
-            if logger: logger.warning(f'wrbc{instance_id} sends ready because of receiving f+1 matching ready first')
-
-    for i in range(N):
-        _t = gevent.spawn(upon_receiving_N_f_matching_echo, i, echo_recvs[i].get, ready_sent[i])
-        put_thread(_t)
-
-    def upon_receiving_matching_ready(instance_id: int, _recv_func: Callable, _deliver_list: Dict, _ready_sent: Event,
-                                      _T_list: List):
-        counting = defaultdict(set)
-        received_from = set()
-        f_1_matching = Event()
-        while True:
-            _sender, (
-                _instance_id,
-                _h
-            ) = _recv_func()
-            if logger: logger.debug(f'ready {_sender}, {_instance_id}, {_h}')
-            assert instance_id == _instance_id
-            if _sender in received_from:
-                if logger: logger.warning('')
-            if _sender in counting[_h]:
-                if logger: logger.warning('')
-            received_from.add(_sender)
-            counting[_h].add(_sender)
-            if logger: logger.debug(f'ready counting {counting}')
-            if len(counting[_h]) >= f + 1 and not f_1_matching.ready():
-                f_1_matching.set()
-                if _h is None:
-                    logger.warning('')
-                if not _ready_sent.ready():
-                    _ready_sent.set()
-                    _t = gevent.spawn(broadcast_ready, instance_id, _h)
-                    send_threads.put_nowait(_t)
-                else:
-                    if logger: logger.warning(
-                        f'wrbc{_instance_id} sends ready because of receiving n-f matching echo first')
-            if len(counting[_h]) >= N - f:
-                if logger: logger.debug('receive more than (N-f) ready messages')
-                if _T_list[_instance_id] in (None, NULL) or _hash(_T_list[_instance_id]) != _h:
-                    _T_list[_instance_id] = NULL
-                    if logger: logger.warning(f'wrbc{_instance_id} hash mismatch')
-                if _instance_id in _deliver_list:
-                    if logger: logger.warning('???')
-                if logger: logger.warning(f'put hash {_h} inst {_instance_id} in deliver list')
-                _deliver_list[_instance_id] = _h
-                break
-
-    deliver_threads = list()
-
-    for i in range(N):
-        _t = gevent.spawn(upon_receiving_matching_ready, i, ready_recvs[i].get, wr_deliver_dict, ready_sent[i], T_list)
-        put_thread(_t)
-        deliver_threads.append(_t)
-
-    def election_phase(_deliver_threads: List[gevent.Greenlet], _wr_deliver_dict: Dict, _raba_recvs: defaultdict[Any, Queue],
+        stripes = [None] * N
+        count = 0
+        while count < f + 1:
+            _sender, msg = _value_recv.get()
+            try:
+                _k, (stripe, proof) = msg
+            except (TypeError, ValueError):
+                _k = None
+            if _k != k:
+                if logger: logger.warning(f'malformed VALUE of {k} from {_sender}')
+                continue
+            if stripes[_sender] is not None or not vc_cache.verify(stripe, commitment_k, proof, _sender):
+                continue
+            stripes[_sender] = stripe
+            count += 1
+        retrieved[k] = retrieve(N, f, commitment_k, stripes, predicate, commitment_scheme)
+        return retrieved[k]
+
+    def election_phase(_delivered_events: List[Event], _wr_deliver_dict: Dict, _raba_recvs: defaultdict[Any, Queue],
                        _value_recvs: List[Queue], _T_list: List, _stop_event: Event):
         if logger: logger.debug(f'wrbc phase starts')
-        gevent.joinall(_deliver_threads, count=N - f)
+        wrbc.quorum.wait()
         if logger: logger.debug(f'wrbc phase ends')
 
         # if logger: logger.debug(f'{len(_wr_deliver_dict)}')
@@ -352,16 +332,23 @@ def run_fin_mvba(
 
         if logger: logger.debug(f'elect phase starts')
 
-        # cheap election
-        def elect(_election_round: int):
-            seed = int.from_bytes(_hash(fin_mvba_prefix + str(_election_round)), byteorder='big') % (2 ** 10 - 1)
-            return seed % N
+        if election is None:
+            # cheap election
+            elect = hash_election(fin_mvba_prefix, N)
+        else:
+            def election_broadcast(o):
+                broadcast((BroadcastTag.ELECTION.value, pid, o))
+            elect = election.instance(fin_mvba_prefix, election_broadcast, election_recv.get, put_thread)
 
         # cheap coin
         def raba_coin(_coin_round: int):
             seed = int.from_bytes(_hash(fin_mvba_prefix + str(_coin_round) + 'coin'), byteorder='big') % (2 ** 10 - 1)
             return int(seed % 2)
 
+        # set on output, stops the RABAs of every round; a RABA that decided
+        # keeps running until then, nodes still in its round need its messages
+        stop_raba_event = Event()
+
         election_round = 0
         while True:
             k = elect(election_round)
@@ -404,7 +391,7 @@ def run_fin_mvba(
                 # raba-propose(0)
                 raba_input_queue.put_nowait(0)
                 def repropose():
-                    _deliver_threads[k].join()
+                    _delivered_events[k].wait()
                     if logger: logger.info(f'repropose in round {election_round}')
                     repropose_event.set()
                 _t = gevent.spawn(repropose)
@@ -412,27 +399,37 @@ def run_fin_mvba(
 
             raba_output = raba_output_queue.get()
 
-            stop_raba_event = Event()
-
-            def kill_raba(_stop_raba_event: Event):
+            def kill_raba(_stop_raba_event: Event, _raba_thread: gevent.Greenlet):
                 _stop_raba_event.wait()
-                raba_thread.kill()
-            gevent.spawn(kill_raba, stop_raba_event)
+                _raba_thread.kill()
+            _t = gevent.spawn(kill_raba, stop_raba_event, raba_thread)
+            put_thread(_t)
 
             if logger: logger.debug(f'raba output {raba_output}')
 
             if raba_output == 1:
                 if k not in _wr_deliver_dict:
                     if logger: logger.debug(f'waiting wrbc {k}')
-                    if not _deliver_threads[k].dead:
-                        _deliver_threads[k].join()
-                    else:
-                        if logger: logger.debug(f'wrbc {k} was dead')
+                    _delivered_events[k].wait()
                     if logger: logger.debug(f'stop waiting wrbc {k}')
                 if k not in _wr_deliver_dict:
                     if logger: logger.error(f'k {k} has not delivered, deliver list: {_wr_deliver_dict} T_list {_T_list}')
                 _h_k = _wr_deliver_dict[k]
                 if logger: logger.debug(f'elect {k} T[k] = {_T_list[k]}')
+                if avid:
+                    value_k = retrieve_value(k, _h_k, _T_list[k], _value_recvs[k])
+                    if value_k is None:
+                        # k dispersed no valid value, every correct node finds that out
+                        if logger: logger.warning(f'dispersal of {k} is bad')
+                        election_round += 1
+                        continue
+                    _stop_event.set()
+                    stop_raba_event.set()
+                    if logger: logger.debug(f'decide')
+                    output_queue.put_nowait(value_k)
+                    if election is not None:
+                        election.discard(fin_mvba_prefix)
+                    break
                 if _T_list[k] not in (None, NULL):
                     if logger: logger.debug(f'send VALUE')
                     # broadcast VALUE(T_i[k])
@@ -450,11 +447,15 @@ def run_fin_mvba(
 
                 else:
                     while True:
-                        _sender, (
-                            _k, _v_k
-                        ) = _value_recvs[k].get()
+                        _sender, msg = _value_recvs[k].get()
                         if logger: logger.debug(f'receive VALUE')
-                        assert _k == k
+                        try:
+                            _k, _v_k = msg
+                        except (TypeError, ValueError):
+                            _k = _v_k = None
+                        if _k != k or not isinstance(_v_k, (str, bytes)):
+                            if logger: logger.warning(f'malformed VALUE of {k} from {_sender}')
+                            continue
                         if _hash(_v_k) == _h_k:
                             _T_list[k] = _v_k
                             break
@@ -462,14 +463,16 @@ def run_fin_mvba(
                 stop_raba_event.set()
                 if logger: logger.debug(f'decide')
                 output_queue.put_nowait(_T_list[k])
+                if election is not None:
+                    election.discard(fin_mvba_prefix)
                 break
 
             election_round += 1
 
     stop_event = Event()
 
-    # election_phase(deliver_threads, wr_deliver_dict, raba_recvs, value_recvs, T_list)
-    _t = gevent.spawn(election_phase, deliver_threads, wr_deliver_dict, raba_recvs, value_recvs, T_list, stop_event)
+    # election_phase(delivered_events, wr_deliver_dict, raba_recvs, value_recvs, T_list)
+    _t = gevent.spawn(election_phase, wrbc.delivered_events, wr_deliver_dict, raba_recvs, value_recvs, T_list, stop_event)
     put_thread(_t)
 
     spawn_time = time.time() - spawn_time
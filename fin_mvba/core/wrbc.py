@@ -0,0 +1,133 @@
+from typing import Any, Callable, List, Optional
+
+from gevent.event import Event
+
+from hash_mvba.core.senderstate import SenderTable
+
+
+class _Instance:
+    __slots__ = ('digest', 'echoed', 'echo_counts', 'readied', 'ready_counts', 'ready_sent')
+
+    def __init__(self):
+        # digest of the SEND taken, None until then
+        self.digest: Optional[bytes] = None
+        # bitmaps of the nodes whose ECHO / READY was counted
+        self.echoed = 0
+        self.echo_counts = dict()
+        self.readied = 0
+        self.ready_counts = dict()
+        self.ready_sent = False
+
+
+class WeakRBC:
+    """The ``N`` weak reliable broadcasts of one FIN instance, as one state machine.
+
+    The receiver loop hands every SEND, ECHO and READY to ``on_send``,
+    ``on_echo`` and ``on_ready``, which update the state of the broadcast
+    in place and send whatever follows from the message. No greenlet
+    blocks per broadcast; waiters use the events:
+
+    - ``delivered_events[j]`` is set when broadcast ``j`` delivered, its
+      digest is then ``delivered[j]``;
+    - ``quorum`` is set once ``N - f`` broadcasts delivered.
+
+    ``accept(j, msg)`` checks the SEND of ``j`` and returns the digest to
+    ECHO, or ``None`` to drop it; it is called once per broadcast, so the
+    value is hashed once. ``values[j]`` is the SEND taken, or ``None``
+    if its digest is not the delivered one. Every node counts once per
+    broadcast and message type, later messages of a node are dropped.
+
+    Usage::
+
+        wrbc = WeakRBC(N, f, accept, echo, ready)
+        ...  # in the receiver loop
+        wrbc.on_echo(sender, j, msg)
+        ...
+        wrbc.quorum.wait()
+    """
+
+    def __init__(self, N: int, f: int, accept: Callable[[int, Any], Optional[bytes]],
+                 echo: Callable[[int, bytes], None], ready: Callable[[int, bytes], None], debug: bool = None):
+        self.N = N
+        self.f = f
+        self.accept = accept
+        self.echo = echo
+        self.ready = ready
+        self.values = SenderTable(N, default=None, debug=debug)
+        self.delivered = SenderTable(N, debug=debug)
+        self.delivered_events: List[Event] = [Event() for _ in range(N)]
+        self.quorum = Event()
+        self._instances: List[_Instance] = [_Instance() for _ in range(N)]
+
+    def on_send(self, sender: int, j: int, msg):
+        if sender != j or not 0 <= j < self.N:
+            return
+        instance = self._instances[j]
+        if instance.digest is not None:
+            return
+        digest = self.accept(j, msg)
+        if digest is None:
+            return
+        instance.digest = digest
+        if j in self.delivered:
+            # a late SEND only helps if it matches
+            if digest == self.delivered[j]:
+                self.values[j] = msg
+            return
+        self.values[j] = msg
+        self.echo(j, digest)
+
+    def on_echo(self, sender: int, j: int, msg):
+        if not 0 <= j < self.N or not 0 <= sender < self.N:
+            return
+        h = self._digest(j, msg)
+        if h is None:
+            return
+        instance = self._instances[j]
+        bit = 1 << sender
+        if instance.echoed & bit:
+            return
+        instance.echoed |= bit
+        count = instance.echo_counts[h] = instance.echo_counts.get(h, 0) + 1
+        if count == self.N - self.f:
+            self._send_ready(j, instance, h)
+
+    def on_ready(self, sender: int, j: int, msg):
+        if not 0 <= j < self.N or not 0 <= sender < self.N:
+            return
+        h = self._digest(j, msg)
+        if h is None:
+            return
+        instance = self._instances[j]
+        bit = 1 << sender
+        if instance.readied & bit:
+            return
+        instance.readied |= bit
+        count = instance.ready_counts[h] = instance.ready_counts.get(h, 0) + 1
+        if count == self.f + 1:
+            self._send_ready(j, instance, h)
+        if count == self.N - self.f and j not in self.delivered:
+            self._deliver(j, instance, h)
+
+    @staticmethod
+    def _digest(j: int, msg) -> Optional[bytes]:
+        """The digest of an ECHO or READY ``(j, digest)``, ``None`` if it is malformed."""
+        try:
+            _j, h = msg
+        except (TypeError, ValueError):
+            return None
+        return h if _j == j and isinstance(h, bytes) else None
+
+    def _send_ready(self, j: int, instance: _Instance, h: bytes):
+        if not instance.ready_sent:
+            instance.ready_sent = True
+            self.ready(j, h)
+
+    def _deliver(self, j: int, instance: _Instance, h: bytes):
+        if instance.digest != h:
+            # the value taken, if any, is not the one delivered
+            self.values[j] = None
+        self.delivered[j] = h
+        self.delivered_events[j].set()
+        if len(self.delivered) == self.N - self.f:
+            self.quorum.set()
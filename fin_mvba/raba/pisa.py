@@ -2,17 +2,165 @@ import math
 import os
 import queue
 import traceback
+from collections import defaultdict, deque
 from enum import Enum
-from typing import Callable, Dict
+from typing import Callable, Dict, List, Optional
 
 import gevent
 from gevent.queue import Queue
 from gevent.event import Event
-from collections import defaultdict
 import logging
 
 from honeybadgerbft.exceptions import RedundantMessageError, AbandonedNodeError
 
+# index of the c of a BVAL(v, c) in RoundState.maj
+MAJ_INDEX = {0: 0, 1: 1, None: 2}
+# index of an AUX(v1, v2) in RoundState.aux, the other pairs are invalid
+AUX_INDEX = {(0, 0): 0, (1, 1): 1, (None, 0): 2, (None, 1): 3}
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _popcount(x: int) -> int:
+        return bin(x).count('1')
+
+
+class RoundState:
+    """The votes and flags of one PISA round, as bitmaps over the ``N`` senders.
+
+    Bit ``j`` of ``est[v]`` is set once node ``j`` sent a ``BVAL`` with
+    value ``v``, of ``maj[MAJ_INDEX[c]]`` once it sent one with majority
+    ``c``, of ``aux[AUX_INDEX[(v1, v2)]]`` once it sent that ``AUX`` and of
+    ``bin[b]`` once ``b`` entered ``bin_values`` on its message. Bit
+    ``v * 3 + MAJ_INDEX[c]`` of ``bval_sent`` is set once ``BVAL(v, c)``
+    was sent. ``est_value`` and ``maj_value`` are the estimate the round
+    starts with, valid once ``has_est``.
+    """
+
+    __slots__ = ('est', 'est_count', 'maj', 'bin', 'aux', 'delta', 'est_handled', 'bval_sent', 'aux_sent',
+                 'stop1', 'stop2', 'aux_stop', 'coin', 'est_value', 'maj_value', 'has_est')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.est = [0, 0]
+        self.est_count = [0, 0]
+        self.maj = [0, 0, 0]
+        self.bin = [0, 0]
+        self.aux = [0, 0, 0, 0]
+        self.delta = [False, False]
+        self.est_handled = [False, False]
+        self.bval_sent = 0
+        self.aux_sent = False
+        # f + 1 and N - f BVAL thresholds reached, per value
+        self.stop1 = [False, False]
+        self.stop2 = [False, False]
+        self.aux_stop = False
+        self.coin = None
+        self.est_value = None
+        self.maj_value = None
+        self.has_est = False
+
+    def add_est(self, sender: int, v: int) -> int:
+        """:return: the number of senders of a ``BVAL`` with value ``v``"""
+        bit = 1 << sender
+        if not self.est[v] & bit:
+            self.est[v] |= bit
+            self.est_count[v] += 1
+        return self.est_count[v]
+
+    def set_est(self, est, maj):
+        self.est_value = est
+        self.maj_value = maj
+        self.has_est = True
+
+    def aux_values(self):
+        """The senders of the ``AUX`` messages that count, by ``v1`` and by ``v2``.
+
+        An ``AUX(b, b)`` counts once ``b`` is in ``bin_values``, an
+        ``AUX(None, b)`` always.
+
+        :return: the bitmaps ``(v1 = 0, v1 = 1, v1 = None), (v2 = 0, v2 = 1)``
+        """
+        aux = self.aux
+        a00 = aux[0] if self.bin[0] else 0
+        a11 = aux[1] if self.bin[1] else 0
+        return (a00, a11, aux[2] | aux[3]), (a00 | aux[2], a11 | aux[3])
+
+
+class RABAState:
+    """The state of one reproposable binary agreement: its rounds, future messages and events.
+
+    ``round(r)`` hands out the ``RoundState`` of round ``r``; the slots of
+    earlier runs are reset and reused, so a recycled state allocates
+    nothing for the rounds it saw before. ``reset`` makes the state ready
+    for the next agreement.
+    """
+
+    __slots__ = ('rounds', 'used', 'future', 'round_increment', 'decided')
+
+    def __init__(self):
+        self.rounds: List[RoundState] = []
+        # rounds handed out since the last reset
+        self.used = 0
+        # messages of rounds not started yet, by round
+        self.future: Dict[int, deque] = defaultdict(deque)
+        self.round_increment = Event()
+        self.decided = Event()
+
+    def round(self, r: int) -> RoundState:
+        if r >= self.used:
+            rounds = self.rounds
+            for i in range(self.used, r + 1):
+                if i < len(rounds):
+                    rounds[i].reset()
+                else:
+                    rounds.append(RoundState())
+            self.used = r + 1
+        return self.rounds[r]
+
+    def reset(self):
+        self.used = 0
+        self.future.clear()
+        self.round_increment.clear()
+        self.decided.clear()
+
+
+class RABAStatePool:
+    """Recycles the ``RABAState`` of finished agreements for the next ones.
+
+    Every election round of FIN runs a RABA; the state of one that was
+    killed goes back to the pool and the RABA of a later election round
+    starts from it. Like ``SenderTable`` a pool is used from one hub only.
+    """
+
+    def __init__(self, max_size: int = 16):
+        self.max_size = max_size
+        self._free: List[RABAState] = []
+
+    def acquire(self) -> RABAState:
+        return self._free.pop() if self._free else RABAState()
+
+    def release(self, state: RABAState):
+        if len(self._free) < self.max_size:
+            # drops the messages buffered for later rounds
+            state.reset()
+            self._free.append(state)
+
+
+state_pool = RABAStatePool()
+
+
+def _quorum_value(senders_0: int, senders_1: int) -> Optional[int]:
+    """The only value sent by some node, ``None`` if both or neither were."""
+    if senders_0 and not senders_1:
+        return 0
+    if senders_1 and not senders_0:
+        return 1
+    return None
+
+
 def reproposable_binaryagreement(sid, pid, N, f,
                                  coin: Callable,
                                  input_msg: Callable,
@@ -22,7 +170,8 @@ def reproposable_binaryagreement(sid, pid, N, f,
                                  repropose_event: Event = Event(),
                                  put_thread: Callable = lambda x: None,
                                  put_send_thread: Callable = lambda x: None,
-                                 logger: logging.Logger = None):
+                                 logger: logging.Logger = None,
+                                 pool: RABAStatePool = None):
     """Binary consensus from [MMR14]. It takes an input ``vi`` and will
     finally write the decided value into ``decide`` channel.
 
@@ -37,12 +186,15 @@ def reproposable_binaryagreement(sid, pid, N, f,
     :param receive: receive channel
     :param put_thread: ``put_thread(t)`` is called to put a spawned thread ``t`` in a caller's queue
     :param logger: a logger passed by caller
+    :param pool: where the ``RABAState`` comes from and goes back to once
+        the agreement is killed, the module's ``state_pool`` by default
     """
 
     _bcast = broadcast
+    debug = logger is not None and logger.isEnabledFor(logging.DEBUG)
 
     def broadcast(msg):
-        if logger: logger.debug(
+        if debug: logger.debug(
             f"[{sid}:{pid}] broadcast {msg}",
             extra={"nodeid": pid, "epoch": msg[1]},
         )
@@ -54,113 +206,59 @@ def reproposable_binaryagreement(sid, pid, N, f,
         BVAL = f'{ba_prefix}/BVAL'
         AUX = f'{ba_prefix}/AUX'
 
-    # Messages received are routed to either a shared coin, the broadcast, or AUX
-    bval_est_values = defaultdict(lambda: {
-        0: set(),
-        1: set(),
-    })
-
-    aux_msgs = defaultdict(set)
-    round_msgs = defaultdict(Queue)
-
-    delta_values = defaultdict(lambda: {
-        0: False,
-        1: False,
-    })
-
-    coin_values = defaultdict(lambda: None)
-
-    next_est_values = dict()
-    next_maj_values = dict()
-
-    bval_sent = defaultdict(
-        lambda: {
-            (0, 0): False,
-            (0, 1): False,
-            (1, 0): False,
-            (1, 1): False,
-            (0, None): False,
-            (1, None): False
-        }
-    )
-
-    bval_est_handled = defaultdict(lambda: {
-        0: False,
-        1: False,
-    })
-
-    aux_sent = defaultdict(lambda: False)
-
-    bin_values = defaultdict(lambda: {
-        0: set(),
-        1: set(),
-    })
-
-    maj_values = defaultdict(lambda: {
-        0: set(),
-        1: set(),
-        None: set()
-    })
-
-    bval_stops_1 = defaultdict(lambda: {
-        0: Event(),
-        1: Event(),
-    })
-    bval_stops_2 = defaultdict(lambda: {
-        0: Event(),
-        1: Event(),
-    })
-    aux_stops = defaultdict(Event)
-
-    # This event is triggered whenever bin_values or aux_values changes
-    # bv_signal = Event()
-    # bval_signal = Event()
-    round_increment_signal = Event()
-    already_decided_signal = Event()
-
-    def V1(counter_dict: Dict, _b_value):
-        counter_dict = counter_dict.copy()
-        if _b_value not in counter_dict:
+    BVAL = BroadcastTag.BVAL.value
+    AUX = BroadcastTag.AUX.value
+
+    if pool is None:
+        pool = state_pool
+    state = pool.acquire()
+    rounds = state.round
+    quorum = math.ceil((N + f + 1) / 2)
+
+    def start_value(rs: RoundState, r: int):
+        if not rs.has_est:
+            if logger: logger.error(f'round {r} has no estimate')
+            raise KeyError(r)
+        return rs.maj_value
+
+    def send_bval(r: int, rs: RoundState, v: int, c):
+        flag = 1 << (v * 3 + MAJ_INDEX[c])
+        if not rs.bval_sent & flag:
+            rs.bval_sent |= flag
+            broadcast(
+                (BVAL, r, v, c)
+            )
+
+    def send_aux(r: int, rs: RoundState, v1, v2):
+        if not rs.aux_sent:
+            rs.aux_sent = True
+            broadcast(
+                (AUX, r, v1, v2)
+            )
+
+    def add_bin(r: int, rs: RoundState, b: int, sender: int):
+        bit = 1 << sender
+        if rs.bin[b] & bit:
             if logger: logger.warning('')
-            return False
-        for key in counter_dict:
-            if _b_value != key and len(counter_dict[key]) != 0:
-                return False
-        if len(counter_dict[_b_value]) == 0:
-            if logger: logger.warning('V1 warning')
-        return True
-
-    def quorum_value(counter_dict: Dict):
-        counter_dict = counter_dict.copy()
-        q = None
-        for key in counter_dict:
-            if key is None:
-                continue
-            if len(counter_dict[key]) != 0:
-                if q is None:
-                    q = key
-                else:
-                    return None
-        return q
+        else:
+            rs.bin[b] |= bit
+            if debug: logger.debug(f'bin_values r{r} b{b} add {sender}')
+
+    def set_decided(b: int, r: int):
+        if logger: logger.info(f'decide {b} in round {r}')
+        if not state.decided.ready():
+            if logger: logger.info(f'decide!!!')
+            decide(b)
+            state.decided.set()
+        else:
+            if logger: logger.warning('oops, attempt to re-decide')
 
-    def V2(counter_dict: Dict, _b_value):
-        counter_dict = counter_dict.copy()
-        if _b_value not in counter_dict:
-            return None
-        for key in counter_dict:
-            if key is None:
-                continue
-            if _b_value != key and len(counter_dict[key]) != 0:
-                return None
-        return len(counter_dict[_b_value])
-
-    def majority(counter_dict: Dict):
-        total_size = 0
-        for s in counter_dict.values():
-            total_size += len(s)
-        if len(counter_dict[0]) >= math.ceil((total_size + 1) / 2):
+    def majority(v1_values) -> Optional[int]:
+        counts = [_popcount(senders) for senders in v1_values]
+        half = math.ceil((sum(counts) + 1) / 2)
+        if counts[0] >= half:
             return 0
-        if len(counter_dict[1]) >= math.ceil((total_size + 1) / 2):
+        if counts[1] >= half:
             return 1
         return None
 
@@ -170,344 +268,182 @@ def reproposable_binaryagreement(sid, pid, N, f,
         assert v in (0, 1)
         assert c in (0, 1, None)
 
-        # maj_values[recv_round_num][c].add(_sender)
-        bval_est_values[recv_round_num][v].add(_sender)
-        try:
-            maj_r = next_maj_values[recv_round_num]
-        except KeyError as e:
-            if logger: logger.error(traceback.format_exc())
-            raise e
-
-        if not bval_stops_1[recv_round_num][v].ready() and len(bval_est_values[recv_round_num][v]) == f + 1:
-            bval_stops_1[recv_round_num][v].set()
-
-            if not bval_sent[recv_round_num][(v, maj_r)]:
-                bval_sent[recv_round_num][(v, maj_r)] = True
-                broadcast(
-                    (BroadcastTag.BVAL.value, recv_round_num, v, maj_r)
-                )
+        rs = rounds(recv_round_num)
+        count = rs.add_est(_sender, v)
+        maj_r = start_value(rs, recv_round_num)
 
+        if not rs.stop1[v] and count == f + 1:
+            rs.stop1[v] = True
+            send_bval(recv_round_num, rs, v, maj_r)
             if v == 1:
-                b = v
-                if _sender in bin_values[recv_round_num][b]:
-                    if logger: logger.warning('')
-                else:
-                    bin_values[recv_round_num][b].add(_sender)
-                    if logger: logger.debug(f'bin_values r{recv_round_num} b{b} {bin_values[recv_round_num][b]}')
-                if not aux_sent[recv_round_num]:
-                    aux_sent[recv_round_num] = True
-                    broadcast(
-                        (BroadcastTag.AUX.value, recv_round_num, 1, 1)
-                    )
-        if not bval_stops_2[recv_round_num][v].ready() and len(bval_est_values[recv_round_num][v]) == N - f:
-            bval_stops_2[recv_round_num][v].set()
-            b = v
-            if _sender in bin_values[recv_round_num][b]:
-                if logger: logger.warning('')
-            else:
-                bin_values[recv_round_num][b].add(_sender)
-                if logger: logger.debug(f'bin_values r{recv_round_num} b{b} {bin_values[recv_round_num][b]}')
-            if not aux_sent[recv_round_num]:
-                aux_sent[recv_round_num] = True
-                broadcast(
-                    (BroadcastTag.AUX.value, recv_round_num, b, b)
-                )
+                add_bin(recv_round_num, rs, 1, _sender)
+                send_aux(recv_round_num, rs, 1, 1)
+        if not rs.stop2[v] and count == N - f:
+            rs.stop2[v] = True
+            add_bin(recv_round_num, rs, v, _sender)
+            send_aux(recv_round_num, rs, v, v)
 
     def handle_bval(_sender, _msg):
         tag, recv_round_num, v, c = _msg
         assert v in (0, 1)
         assert c in (0, 1, None)
-        maj_values[recv_round_num][c].add(_sender)
-        bval_est_values[recv_round_num][v].add(_sender)
-
-        try:
-            maj_r = next_maj_values[recv_round_num]
-        except KeyError as e:
-            if logger: logger.error(traceback.format_exc())
-            raise e
-
-
-        if not bval_stops_1[recv_round_num][v].ready() and len(bval_est_values[recv_round_num][v]) == f + 1:
-            bval_stops_1[recv_round_num][v].set()
-            if not bval_sent[recv_round_num][(v, maj_r)]:
-                bval_sent[recv_round_num][(v, maj_r)] = True
-                broadcast(
-                    (BroadcastTag.BVAL.value, recv_round_num, v, maj_r)
-                )
-            return
 
+        rs = rounds(recv_round_num)
+        rs.maj[MAJ_INDEX[c]] |= 1 << _sender
+        count = rs.add_est(_sender, v)
+        maj_r = start_value(rs, recv_round_num)
+
+        if not rs.stop1[v] and count == f + 1:
+            rs.stop1[v] = True
+            send_bval(recv_round_num, rs, v, maj_r)
+            return
 
         b = None
-        if not bval_est_handled[recv_round_num][0] and len(bval_est_values[recv_round_num][0]) == N - f:
+        if not rs.est_handled[0] and rs.est_count[0] == N - f:
             b = 0
-            bval_est_handled[recv_round_num][0] = True
-        elif not bval_est_handled[recv_round_num][1] and len(bval_est_values[recv_round_num][1]) == N - f:
+            rs.est_handled[0] = True
+        elif not rs.est_handled[1] and rs.est_count[1] == N - f:
             b = 1
-            bval_est_handled[recv_round_num][1] = True
+            rs.est_handled[1] = True
 
-        if logger: logger.debug(f'{b}')
         if b is None:
             return
 
-        if not bval_stops_2[recv_round_num][v].ready():
-            bval_stops_2[recv_round_num][v].set()
-
-        if _sender in bin_values[recv_round_num][b]:
-            if logger: logger.warning('')
-        else:
-            bin_values[recv_round_num][b].add(_sender)
-            if logger: logger.debug(f'bin_values r{recv_round_num} b{b} {bin_values[recv_round_num][b]}')
-
-        if logger: logger.debug('')
+        rs.stop2[v] = True
+        add_bin(recv_round_num, rs, b, _sender)
 
         if recv_round_num == 0:
-            delta_values[recv_round_num][b] = True
+            rs.delta[b] = True
         else:
-            if coin_values[recv_round_num - 1] is not None:
-                s_r_1 = coin_values[recv_round_num - 1]
-            else:
+            s_r_1 = rounds(recv_round_num - 1).coin
+            if s_r_1 is None:
                 if logger: logger.warning('')
                 s_r_1 = coin(recv_round_num - 1)
-            only_b_in_majs = V1(maj_values[recv_round_num], b)
-            not_b_is_not_in_majs = len(maj_values[recv_round_num][1 - b]) == 0
-            if logger: logger.debug(f'only_b_in_majs {only_b_in_majs} not_b_is_not_in_majs {not_b_is_not_in_majs}')
-            if logger: logger.debug(f'maj_values[r {recv_round_num}] {maj_values[recv_round_num]}')
-            delta_values[recv_round_num][b] = (((b == 1 - s_r_1) and only_b_in_majs)
-                                               or ((b == s_r_1) and not_b_is_not_in_majs))
-        if logger: logger.debug(f'delta_r[b {b}] {delta_values[recv_round_num][b]}')
-
-        if not aux_sent[recv_round_num]:
-            if delta_values[recv_round_num][b]:
-                if logger: logger.debug('')
-                broadcast(
-                    (BroadcastTag.AUX.value, recv_round_num, b, b)
-                )
-            else:
-                if logger: logger.debug('')
-                broadcast(
-                    (BroadcastTag.AUX.value, recv_round_num, None, b)
-                )
-            aux_sent[recv_round_num] = True
+            not_b_is_not_in_majs = rs.maj[1 - b] == 0
+            only_b_in_majs = not_b_is_not_in_majs and rs.maj[2] == 0
+            if debug: logger.debug(f'only_b_in_majs {only_b_in_majs} not_b_is_not_in_majs {not_b_is_not_in_majs}')
+            rs.delta[b] = (((b == 1 - s_r_1) and only_b_in_majs)
+                           or ((b == s_r_1) and not_b_is_not_in_majs))
+        if debug: logger.debug(f'delta_r[b {b}] {rs.delta[b]}')
+
+        if not rs.aux_sent:
+            send_aux(recv_round_num, rs, b if rs.delta[b] else None, b)
         else:
             if logger: logger.error(f'attempt to send aux twice in round {recv_round_num}')
 
-        if logger: logger.debug('')
-
-    def pisa_handle_aux(_sender, _msg):
+    def count_aux(_sender, _msg):
+        """Adds an AUX, :return: its round state and the AUX values once N - f count, else ``None``"""
         tag, recv_round_num, v1, v2 = _msg
 
         assert v1 in (0, 1, None)
         assert v2 in (0, 1, None)
 
         # ignore invalid AUX message
-        if v2 is None:
-            if logger: logger.warning('')
-            return
-        if (v1 == 0 and v2 == 1) or (v1 == 1 and v2 == 0):
-            if logger: logger.warning('')
-            return
-
-        aux_msgs[recv_round_num].add((_sender, v1, v2))
-        local_aux_v1_values = {
-            0: set(),
-            1: set(),
-            None: set(),
-        }
-
-        local_aux_v2_values = {
-            0: set(),
-            1: set(),
-        }
-
-        for (_sender, v1, v2) in aux_msgs[recv_round_num]:
-            if v1 is not None:
-                # ignore aux message if v1 or v2 is not in bin_values (hence not in the subset)
-                if len(bin_values[recv_round_num][v1]) == 0 or len(bin_values[recv_round_num][v2]) == 0:
-                    if logger: logger.warning(f'ignore {(v1, v2)} since bin_values {bin_values[recv_round_num]}')
-                    continue
-
-                # discard message if \delta_r(\not v1) == 1
-                if delta_values[recv_round_num][1 - v1]:
-                    if logger: logger.warning('strange ignore')
-                    # return
+        if (v1, v2) not in AUX_INDEX:
+            if logger: logger.warning(f'invalid AUX {(v1, v2)} from {_sender}')
+            return None
 
-            local_aux_v1_values[v1].add(_sender)
-            local_aux_v2_values[v2].add(_sender)
+        rs = rounds(recv_round_num)
+        rs.aux[AUX_INDEX[(v1, v2)]] |= 1 << _sender
+        v1_values, v2_values = rs.aux_values()
 
-        total_size = 0
-        for _v2 in (0, 1):
-            total_size += len(local_aux_v2_values[_v2])
+        total_size = _popcount(v2_values[0]) + _popcount(v2_values[1])
+        if debug: logger.debug(f'total size {total_size}')
+        if total_size < N - f:
+            return None
 
-        if logger: logger.debug(f'total size {total_size}')
+        if rs.aux_stop:
+            if debug: logger.debug(f'repeat handle aux')
+            return None
+        rs.aux_stop = True
 
-        if total_size < N - f:
-            return
+        if debug: logger.debug(f'coin a in round {recv_round_num}')
+        if rs.coin is None:
+            rs.coin = coin(recv_round_num)
+        return rs, v1_values, v2_values
 
-        if aux_stops[recv_round_num].ready():
-            if logger: logger.debug(f'repeat handle aux')
+    def pisa_handle_aux(_sender, _msg):
+        recv_round_num = _msg[1]
+        counted = count_aux(_sender, _msg)
+        if counted is None:
             return
-        else:
-            aux_stops[recv_round_num].set()
-
-        if logger: logger.debug(f'coin a in round {recv_round_num}')
-        if coin_values[recv_round_num] is None:
-            coin_values[recv_round_num] = coin(recv_round_num)
+        rs, v1_values, v2_values = counted
 
-        quorum_b = quorum_value(local_aux_v1_values)
-        quorum_maj = quorum_value(local_aux_v2_values)
+        quorum_b = _quorum_value(v1_values[0], v1_values[1])
+        quorum_maj = _quorum_value(v2_values[0], v2_values[1])
 
-        if logger: logger.debug(f'quorum_b {quorum_b} quorum_maj {quorum_maj}')
+        if debug: logger.debug(f'quorum_b {quorum_b} quorum_maj {quorum_maj}')
 
-        if quorum_b is not None and V2(local_aux_v1_values, quorum_b) >= math.ceil((N + f + 1) / 2):
-            next_est_values[recv_round_num + 1] = quorum_b
-            next_maj_values[recv_round_num + 1] = quorum_b
+        next_rs = rounds(recv_round_num + 1)
+        if quorum_b is not None and _popcount(v1_values[quorum_b]) >= quorum:
+            next_rs.set_est(quorum_b, quorum_b)
             if quorum_b == 1:
-                if logger: logger.info(f'decide {quorum_b} in round {recv_round_num}')
-                if not already_decided_signal.ready():
-                    if logger: logger.info(f'decide!!!')
-                    decide(quorum_b)
-                    already_decided_signal.set()
-                else:
-                    if logger: logger.warning('oops, attempt to re-decide')
+                set_decided(quorum_b, recv_round_num)
             # increment round
-            round_increment_signal.set()
+            state.round_increment.set()
             return
 
-        if (recv_round_num + 1) not in next_est_values:
-            next_est_values[recv_round_num + 1] = 1
-            next_maj_values[recv_round_num + 1] = 1
+        if not next_rs.has_est:
+            next_rs.set_est(1, 1)
             # increment round
-            round_increment_signal.set()
+            state.round_increment.set()
             return
 
     def handle_aux(_sender, _msg):
-        tag, recv_round_num, v1, v2 = _msg
-
-        assert v1 in (0, 1, None)
-        assert v2 in (0, 1, None)
-
-        # ignore invalid AUX message
-        if v2 is None:
-            if logger: logger.warning('')
-            return
-        if (v1 == 0 and v2 == 1) or (v1 == 1 and v2 == 0):
-            if logger: logger.warning('')
-            return
-
-        aux_msgs[recv_round_num].add((_sender, v1, v2))
-        local_aux_v1_values = {
-            0: set(),
-            1: set(),
-            None: set(),
-        }
-
-        local_aux_v2_values = {
-            0: set(),
-            1: set(),
-        }
-
-        for (_sender, v1, v2) in aux_msgs[recv_round_num]:
-            if v1 is not None:
-                # ignore aux message if v1 or v2 is not in bin_values (hence not in the subset)
-                if len(bin_values[recv_round_num][v1]) == 0 or len(bin_values[recv_round_num][v2]) == 0:
-                    if logger: logger.warning(f'ignore {(v1, v2)} since bin_values {bin_values[recv_round_num]}')
-                    continue
-
-                # discard message if \delta_r(\not v1) == 1
-                if delta_values[recv_round_num][1 - v1]:
-                    if logger: logger.warning('strange ignore')
-                    # return
-
-            local_aux_v1_values[v1].add(_sender)
-            local_aux_v2_values[v2].add(_sender)
-
-        total_size = 0
-        for _v2 in (0, 1):
-            total_size += len(local_aux_v2_values[_v2])
-
-        if total_size < N - f:
+        recv_round_num = _msg[1]
+        counted = count_aux(_sender, _msg)
+        if counted is None:
             return
+        rs, v1_values, v2_values = counted
 
-        if aux_stops[recv_round_num].ready():
-            if logger: logger.debug(f'repeat handle aux')
-            return
-        else:
-            aux_stops[recv_round_num].set()
-
-        if logger: logger.debug(f'coin a in round {recv_round_num}')
-        if coin_values[recv_round_num] is None:
-            coin_values[recv_round_num] = coin(recv_round_num)
+        s_r = rs.coin
+        quorum_b = _quorum_value(v1_values[0], v1_values[1])
+        quorum_maj = _quorum_value(v2_values[0], v2_values[1])
 
-        if logger: logger.debug(f'coin b in round {recv_round_num}')
-        s_r = coin_values[recv_round_num]
-        if logger: logger.debug(f'coin c in round {recv_round_num}')
+        if debug: logger.debug(f'quorum_b {quorum_b} quorum_maj {quorum_maj}')
 
-        quorum_b = quorum_value(local_aux_v1_values)
-        quorum_maj = quorum_value(local_aux_v2_values)
-
-        if logger: logger.debug(f'quorum_b {quorum_b} quorum_maj {quorum_maj}')
-
-        if quorum_b is not None and V2(local_aux_v1_values, quorum_b) >= math.ceil((N + f + 1) / 2):
-            next_est_values[recv_round_num + 1] = quorum_b
-            next_maj_values[recv_round_num + 1] = quorum_b
+        next_rs = rounds(recv_round_num + 1)
+        quorum_b_count = None if quorum_b is None else _popcount(v1_values[quorum_b])
+        if quorum_b is not None and quorum_b_count >= quorum:
+            next_rs.set_est(quorum_b, quorum_b)
             if quorum_b == s_r:
-                if logger: logger.info(f'decide {quorum_b} in round {recv_round_num}')
-                if not already_decided_signal.ready():
-                    if logger: logger.info(f'decide!!!')
-                    decide(quorum_b)
-                    already_decided_signal.set()
-                else:
-                    if logger: logger.warning('oops, attempt to re-decide')
+                set_decided(quorum_b, recv_round_num)
             # increment round
-            round_increment_signal.set()
+            state.round_increment.set()
             return
 
         if recv_round_num > 0:
-            if (V1(local_aux_v1_values, None)
-                    or (quorum_b is not None and V2(local_aux_v1_values, quorum_b) < math.ceil(
-                        (N + f + 1) / 2))):
-                s_r_1 = coin_values[recv_round_num - 1]
-                result = V2(local_aux_v2_values, quorum_maj)
-                if logger: logger.debug(f'quorum_maj {quorum_maj} result {result}, s_r {s_r} s_r-1 {s_r_1}')
-                if result is not None and result >= math.ceil((N + f + 1) / 2):
-                    next_est_values[recv_round_num + 1] = quorum_maj
-                    next_maj_values[recv_round_num + 1] = quorum_maj
+            if (not v1_values[0] and not v1_values[1]) or (quorum_b is not None and quorum_b_count < quorum):
+                s_r_1 = rounds(recv_round_num - 1).coin
+                result = None if quorum_maj is None else _popcount(v2_values[quorum_maj])
+                if debug: logger.debug(f'quorum_maj {quorum_maj} result {result}, s_r {s_r} s_r-1 {s_r_1}')
+                if result is not None and result >= quorum:
+                    next_rs.set_est(quorum_maj, quorum_maj)
                     if quorum_maj == s_r_1 and quorum_maj == s_r:
-                        if logger: logger.info(f'decide {quorum_maj} in round {recv_round_num}')
-                        if not already_decided_signal.ready():
-                            if logger: logger.info(f'decide!!!')
-                            decide(quorum_maj)
-                            already_decided_signal.set()
-                        else:
-                            if logger: logger.warning('oops, attempt to re-decide')
+                        set_decided(quorum_maj, recv_round_num)
                         return
-                elif len(local_aux_v2_values[0]) > 0 and len(
-                        local_aux_v2_values[1]) > 0 and quorum_maj == s_r_1:
-                    next_est_values[recv_round_num + 1] = quorum_maj
-                    next_maj_values[recv_round_num + 1] = quorum_maj
+                elif v2_values[0] and v2_values[1] and quorum_maj == s_r_1:
+                    next_rs.set_est(quorum_maj, quorum_maj)
 
                 # increment round
-                round_increment_signal.set()
+                state.round_increment.set()
                 return
 
-        if (recv_round_num + 1) not in next_est_values:
-            next_est_values[recv_round_num + 1] = s_r
-            if recv_round_num == 0:
-                next_maj_values[recv_round_num + 1] = s_r
-            else:
-                next_maj_values[recv_round_num + 1] = majority(local_aux_v1_values)
+        if not next_rs.has_est:
+            next_rs.set_est(s_r, s_r if recv_round_num == 0 else majority(v1_values))
             # increment round
-            round_increment_signal.set()
+            state.round_increment.set()
             return
 
     def _recv(_shared_round_num):
         while True:  # not finished[pid]:
             _round_num = _shared_round_num[0]
-            if not round_msgs[_round_num].empty():
-                (sender, msg) = round_msgs[_round_num].get()
+            pending = state.future.get(_round_num)
+            if pending:
+                (sender, msg) = pending.popleft()
             else:
                 (sender, msg) = receive()
-            if logger: logger.debug(
+            if debug: logger.debug(
                 f"[{sid}:{pid}] receive {msg} from node {sender}",
                 extra={"nodeid": pid, "epoch": msg[1]},
             )
@@ -515,19 +451,22 @@ def reproposable_binaryagreement(sid, pid, N, f,
 
             tag = msg[0]
             recv_round_num = msg[1]
+            if not isinstance(recv_round_num, int) or recv_round_num < 0:
+                if logger: logger.warning(f'invalid round {recv_round_num} from {sender}')
+                continue
 
             if recv_round_num > _round_num:
-                round_msgs[recv_round_num].put_nowait((sender, msg))
+                state.future[recv_round_num].append((sender, msg))
                 continue
 
-            if tag == BroadcastTag.BVAL.value:
+            if tag == BVAL:
                 if recv_round_num == 0:
                     pisa_handle_bval(sender, msg)
                 else:
                     handle_bval(sender, msg)
                 continue
 
-            elif tag == BroadcastTag.AUX.value:
+            elif tag == AUX:
                 if recv_round_num == 0:
                     pisa_handle_aux(sender, msg)
                 else:
@@ -536,21 +475,22 @@ def reproposable_binaryagreement(sid, pid, N, f,
 
     def repropose(_repropose_event: Event):
         _repropose_event.wait()
-        if not bval_sent[0][(1, None)]:
-            bval_sent[0][(1, None)] = True
-            if logger: logger.debug(
+        rs = rounds(0)
+        flag = 1 << (1 * 3 + MAJ_INDEX[None])
+        if not rs.bval_sent & flag:
+            rs.bval_sent |= flag
+            if debug: logger.debug(
                 f"[{sid}:{pid}] repropose",
                 extra={"nodeid": pid},
             )
             _bcast(
-                (BroadcastTag.BVAL.value, 0, 1, None)
+                (BVAL, 0, 1, None)
             )
 
     # Block waiting for the input
     vi = input_msg()
     assert vi in (0, 1)
-    next_est_values[0] = vi
-    next_maj_values[0] = None
+    rounds(0).set_est(vi, None)
     round_num = 0
     shared_round_num = [0]
 
@@ -559,43 +499,31 @@ def reproposable_binaryagreement(sid, pid, N, f,
     put_thread(_thread_recv)
 
     _repropose_thread = gevent.spawn(repropose, repropose_event)
-    put_thread(_thread_recv)
+    put_thread(_repropose_thread)
 
     try:
         while True:  # Unbounded number of rounds
-            try:
-                est = next_est_values[round_num]
-                maj = next_maj_values[round_num]
-            except KeyError as e:
-                if logger: logger.error(traceback.format_exc())
-                raise e
-
-            if logger: logger.debug(
+            rs = rounds(round_num)
+            est = rs.est_value
+            maj = start_value(rs, round_num)
+
+            if debug: logger.debug(
                 f"[{sid}:{pid}] Starting with est = {est} in round {round_num}", extra={"nodeid": pid, "epoch": round_num}
             )
 
             # bin_values[r] is empty by default
 
             # broadcast bval(r, est, maj)
-            if not bval_sent[round_num][(est, maj)]:
-                bval_sent[round_num][(est, maj)] = True
-                broadcast(
-                    (BroadcastTag.BVAL.value, round_num, est, maj)
-                )
+            send_bval(round_num, rs, est, maj)
 
             # pisa
             if round_num == 0:
                 if est == 1:
-                    bin_values[round_num][1].add(pid)
-                    if logger: logger.debug(f'bin_values r{round_num} b{1} {bin_values[round_num][1]}')
-                    if not aux_sent[round_num]:
-                        aux_sent[round_num] = True
-                        broadcast(
-                            (BroadcastTag.AUX.value, round_num, 1, 1)
-                        )
+                    add_bin(round_num, rs, 1, pid)
+                    send_aux(round_num, rs, 1, 1)
 
-            round_increment_signal.wait()
-            round_increment_signal.clear()
+            state.round_increment.wait()
+            state.round_increment.clear()
 
             # if already_decided_signal.ready():
             #     break
@@ -603,5 +531,16 @@ def reproposable_binaryagreement(sid, pid, N, f,
             round_num += 1
             shared_round_num[0] += 1
     finally:
-        _thread_recv.kill()
-
+        # nothing may touch the state once it is back in the pool, release it
+        # when both greenlets are dead; the kill of this greenlet may come
+        # again, so do not block here
+        alive = [2]
+
+        def release(_):
+            alive[0] -= 1
+            if alive[0] == 0:
+                pool.release(state)
+
+        for _t in (_thread_recv, _repropose_thread):
+            _t.link(release)
+            _t.kill(block=False)
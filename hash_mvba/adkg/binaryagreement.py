@@ -8,7 +8,88 @@ from gevent.event import Event
 from collections import defaultdict
 import logging
 
-from honeybadgerbft.exceptions import RedundantMessageError, AbandonedNodeError
+from honeybadgerbft.exceptions import AbandonedNodeError
+
+# index of a CONF value in EpochState.conf, and the CONF value of a bin_values bitmap
+CONF_INDEX = {(0,): 0, (1,): 1, (0, 1): 2}
+CONF_VALUES = ((), (0,), (1,), (0, 1))
+
+
+class EpochState:
+    """The votes of one ABA epoch, as bitmaps over the ``N`` senders.
+
+    Bit ``j`` of ``est[v]`` is set once node ``j`` sent ``EST v``, and
+    likewise for ``aux[v]`` and ``conf[CONF_INDEX[values]]``; the number of
+    bits set is kept next to each bitmap, so a message and a threshold check
+    are O(1) whatever ``N``. ``bin_values`` holds bit ``v`` once ``v`` is in
+    the set of the same name. An ``add_*`` of a sender already counted
+    returns 0 and changes nothing.
+    """
+
+    __slots__ = ('est', 'est_count', 'est_sent', 'aux', 'aux_count',
+                 'conf', 'conf_count', 'conf_sent', 'bin_values')
+
+    def __init__(self):
+        self.est = [0, 0]
+        self.est_count = [0, 0]
+        self.est_sent = [False, False]
+        self.aux = [0, 0]
+        self.aux_count = [0, 0]
+        self.conf = [0, 0, 0]
+        self.conf_count = [0, 0, 0]
+        self.conf_sent = [False, False, False]
+        self.bin_values = 0
+
+    def add_est(self, sender: int, v: int) -> int:
+        """:return: the number of ``EST v`` senders, 0 if ``sender`` was counted already"""
+        bit = 1 << sender
+        if self.est[v] & bit:
+            return 0
+        self.est[v] |= bit
+        self.est_count[v] += 1
+        return self.est_count[v]
+
+    def add_aux(self, sender: int, v: int) -> int:
+        bit = 1 << sender
+        if self.aux[v] & bit:
+            return 0
+        self.aux[v] |= bit
+        self.aux_count[v] += 1
+        return self.aux_count[v]
+
+    def add_conf(self, sender: int, index: int) -> int:
+        bit = 1 << sender
+        if self.conf[index] & bit:
+            return 0
+        self.conf[index] |= bit
+        self.conf_count[index] += 1
+        return self.conf_count[index]
+
+    def bin_set(self) -> set:
+        return set(CONF_VALUES[self.bin_values])
+
+    def aux_ready(self, quorum: int):
+        """The values of the AUX phase once ``quorum`` AUX votes are in ``bin_values``, else ``None``."""
+        bin_values, count = self.bin_values, self.aux_count
+        if bin_values & 2 and count[1] >= quorum:
+            return {1}
+        if bin_values & 1 and count[0] >= quorum:
+            return {0}
+        if (count[0] if bin_values & 1 else 0) + (count[1] if bin_values & 2 else 0) >= quorum:
+            return {0, 1}
+        return None
+
+    def conf_ready(self, quorum: int):
+        """The values of the CONF phase once ``quorum`` CONF votes are subsets of ``bin_values``, else ``None``."""
+        bin_values, count = self.bin_values, self.conf_count
+        if bin_values & 2 and count[1] >= quorum:
+            return {1}
+        if bin_values & 1 and count[0] >= quorum:
+            return {0}
+        if (count[0] if bin_values & 1 else 0) + (count[1] if bin_values & 2 else 0) + \
+                (count[2] if bin_values == 3 else 0) >= quorum:
+            return {0, 1}
+        return None
 
 def binaryagreement(
         sid, pid, N, f,
@@ -37,78 +118,25 @@ def binaryagreement(
     :param logger: a logger passed by caller
     """
 
-    def handle_conf_messages(*, sender, message, conf_values, pid, bv_signal):
-        _, r, v = message
-        assert v in ((0,), (1,), (0, 1))
-        if sender in conf_values[r][v]:
-            if logger: logger.warning(
-                f"[{pid}] Redundant CONF received {message} by {sender}",
-                extra={"nodeid": pid, "epoch": r},
-            )
-            # FIXME: Raise for now to simplify things & be consistent
-            # with how other TAGs are handled. Will replace the raise
-            # with a continue statement as part of
-            # https://github.com/initc3/HoneyBadgerBFT-Python/issues/10
-            raise RedundantMessageError("Redundant CONF received {}".format(message))
-
-        conf_values[r][v].add(sender)
-        if logger: logger.debug(
-            f"[{pid}] add v = {v} to conf_value[{r}] = {conf_values[r]}",
-            extra={"nodeid": pid, "epoch": r},
-        )
+    debug = logger is not None and logger.isEnabledFor(logging.DEBUG)
 
-        bv_signal.set()
-
-    def wait_for_conf_values(
-            *,
-            pid,
-            n,
-            f,
-            epoch,
-            conf_sent,
-            bin_values,
-            values,
-            conf_values,
-            bv_signal,
-            broadcast,
-    ):
-        conf_sent[epoch][tuple(values)] = True
-        if logger: logger.debug(
-            f"[{pid}] broadcast {('CONF', epoch, tuple(values))}",
-            extra={"nodeid": pid, "epoch": epoch},
+    def wait_for_conf_values(*, epoch: EpochState, r, values):
+        epoch.conf_sent[CONF_INDEX[tuple(values)]] = True
+        conf = CONF_VALUES[epoch.bin_values]
+        if debug: logger.debug(
+            f"[{pid}] broadcast {('CONF', r, conf)}",
+            extra={"nodeid": pid, "epoch": r},
         )
-        broadcast(("CONF", epoch, tuple(bin_values[epoch])))
+        broadcast(("CONF", r, conf))
         while True:
-            if logger: logger.debug(
-                f"[{pid}] looping ... conf_values[epoch] is: {conf_values[epoch]}",
-                extra={"nodeid": pid, "epoch": epoch},
-            )
-            if 1 in bin_values[epoch] and len(conf_values[epoch][(1,)]) >= n - f:
-                return set((1,))
-            if 0 in bin_values[epoch] and len(conf_values[epoch][(0,)]) >= n - f:
-                return set((0,))
-            if (
-                    sum(
-                        len(senders)
-                        for conf_value, senders in conf_values[epoch].items()
-                        if senders and set(conf_value).issubset(bin_values[epoch])
-                    )
-                    >= n - f
-            ):
-                return set((0, 1))
-
+            values = epoch.conf_ready(N - f)
+            if values is not None:
+                return values
             bv_signal.clear()
             bv_signal.wait()
 
-
-
     # Messages received are routed to either a shared coin, the broadcast, or AUX
-    est_values = defaultdict(lambda: [set(), set()])
-    aux_values = defaultdict(lambda: [set(), set()])
-    conf_values = defaultdict(lambda: {(0,): set(), (1,): set(), (0, 1): set()})
-    est_sent = defaultdict(lambda: [False, False])
-    conf_sent = defaultdict(lambda: {(0,): False, (1,): False, (0, 1): False})
-    bin_values = defaultdict(set)
+    epochs = defaultdict(EpochState)
 
     # This event is triggered whenever bin_values or aux_values changes
     bv_signal = Event()
@@ -116,82 +144,62 @@ def binaryagreement(
     def _recv():
         while True:  # not finished[pid]:
             (sender, msg) = receive()
-            if logger: logger.debug(
+            if debug: logger.debug(
                 f"[{pid}] receive {msg} from node {sender}",
                 extra={"nodeid": pid, "epoch": msg[1]},
             )
             assert sender in range(N)
-            if msg[0] == "EST":
+            tag, r, v = msg
+            if tag == "EST":
                 # BV_Broadcast message
-                _, r, v = msg
                 assert v in (0, 1)
-                if sender in est_values[r][v]:
-                    # FIXME: raise or continue? For now will raise just
-                    # because it appeared first, but maybe the protocol simply
-                    # needs to continue.
-                    print(f"[{pid}] Redundant EST received by {sender}", msg)
+                epoch = epochs[r]
+                count = epoch.add_est(sender, v)
+                if not count:
                     if logger: logger.warning(
                         f"[{pid}] Redundant EST message received by {sender}: {msg}",
-                        extra={"nodeid": pid, "epoch": msg[1]},
+                        extra={"nodeid": pid, "epoch": r},
                     )
-                    raise RedundantMessageError("Redundant EST received {}".format(msg))
-                    # continue
+                    continue
 
-                est_values[r][v].add(sender)
                 # Relay after reaching first threshold
-                if len(est_values[r][v]) >= f + 1 and not est_sent[r][v]:
-                    est_sent[r][v] = True
+                if count >= f + 1 and not epoch.est_sent[v]:
+                    epoch.est_sent[v] = True
                     broadcast(("EST", r, v))
-                    if logger: logger.debug(
+                    if debug: logger.debug(
                         f"[{pid}] broadcast {('EST', r, v)}",
                         extra={"nodeid": pid, "epoch": r},
                     )
 
                 # Output after reaching second threshold
-                if len(est_values[r][v]) >= 2 * f + 1:
-                    if logger: logger.debug(
-                        f"[{pid}] add v = {v} to bin_value[{r}] = {bin_values[r]}",
-                        extra={"nodeid": pid, "epoch": r},
-                    )
-                    bin_values[r].add(v)
-                    if logger: logger.debug(
-                        f"[{pid}] bin_values[{r}] is now: {bin_values[r]}",
+                if count >= 2 * f + 1 and not epoch.bin_values & (1 << v):
+                    epoch.bin_values |= 1 << v
+                    if debug: logger.debug(
+                        f"[{pid}] bin_values[{r}] is now: {epoch.bin_set()}",
                         extra={"nodeid": pid, "epoch": r},
                     )
                     bv_signal.set()
 
-            elif msg[0] == "AUX":
+            elif tag == "AUX":
                 # Aux message
-                _, r, v = msg
                 assert v in (0, 1)
-                if sender in aux_values[r][v]:
-                    # FIXME: raise or continue? For now will raise just
-                    # because it appeared first, but maybe the protocol simply
-                    # needs to continue.
-                    print("Redundant AUX received", msg)
-                    raise RedundantMessageError("Redundant AUX received {}".format(msg))
-
-                if logger: logger.debug(
-                    f"[{pid}] add sender = {sender} to aux_value[{r}][{v}] = \
-                        {aux_values[r][v]}",
-                    extra={"nodeid": pid, "epoch": r},
-                )
-                aux_values[r][v].add(sender)
-                if logger: logger.debug(
-                    f"[{pid}] aux_value[{r}][{v}] is now: {aux_values[r][v]}",
-                    extra={"nodeid": pid, "epoch": r},
-                )
-
+                if not epochs[r].add_aux(sender, v):
+                    if logger: logger.warning(
+                        f"[{pid}] Redundant AUX message received by {sender}: {msg}",
+                        extra={"nodeid": pid, "epoch": r},
+                    )
+                    continue
                 bv_signal.set()
 
-            elif msg[0] == "CONF":
-                handle_conf_messages(
-                    sender=sender,
-                    message=msg,
-                    conf_values=conf_values,
-                    pid=pid,
-                    bv_signal=bv_signal,
-                )
+            elif tag == "CONF":
+                assert v in CONF_INDEX
+                if not epochs[r].add_conf(sender, CONF_INDEX[v]):
+                    if logger: logger.warning(
+                        f"[{pid}] Redundant CONF message received by {sender}: {msg}",
+                        extra={"nodeid": pid, "epoch": r},
+                    )
+                    continue
+                bv_signal.set()
 
     # Run the receive loop in the background
     _thread_recv = gevent.spawn(_recv)
@@ -205,91 +213,63 @@ def binaryagreement(
         r = 0
         already_decided = None
         while True:  # Unbounded number of rounds
-            if logger: logger.debug(
+            if debug: logger.debug(
                 f"[{pid}] Starting with est = {est}", extra={"nodeid": pid, "epoch": r}
             )
+            epoch = epochs[r]
 
-            if not est_sent[r][est]:
-                est_sent[r][est] = True
+            if not epoch.est_sent[est]:
+                epoch.est_sent[est] = True
                 broadcast(("EST", r, est))
 
-            while len(bin_values[r]) == 0:
+            while not epoch.bin_values:
                 # Block until a value is output
                 bv_signal.clear()
                 bv_signal.wait()
 
-            w = next(iter(bin_values[r]))  # take an element
-            if logger: logger.debug(
+            w = 0 if epoch.bin_values & 1 else 1  # take an element
+            if debug: logger.debug(
                 f"[{pid}] broadcast {('AUX', r, w)}", extra={"nodeid": pid, "epoch": r}
             )
             broadcast(("AUX", r, w))
 
-            values = None
-            if logger: logger.debug(
+            if debug: logger.debug(
                 f"block until at least N-f ({N - f}) AUX values are received",
                 extra={"nodeid": pid, "epoch": r},
             )
             while True:
-                if logger: logger.debug(
-                    f"[{pid}] bin_values[{r}]: {bin_values[r]}",
-                    extra={"nodeid": pid, "epoch": r},
-                )
-                if logger: logger.debug(
-                    f"[{pid}] aux_values[{r}]: {aux_values[r]}",
-                    extra={"nodeid": pid, "epoch": r},
-                )
                 # Block until at least N-f AUX values are received
-                if 1 in bin_values[r] and len(aux_values[r][1]) >= N - f:
-                    values = set((1,))
-                    # print('[sid:%s] [pid:%d] VALUES 1 %d' % (sid, pid, r))
-                    break
-                if 0 in bin_values[r] and len(aux_values[r][0]) >= N - f:
-                    values = set((0,))
-                    # print('[sid:%s] [pid:%d] VALUES 0 %d' % (sid, pid, r))
-                    break
-                if sum(len(aux_values[r][v]) for v in bin_values[r]) >= N - f:
-                    values = set((0, 1))
-                    # print('[sid:%s] [pid:%d] VALUES BOTH %d' % (sid, pid, r))
+                values = epoch.aux_ready(N - f)
+                if values is not None:
                     break
                 bv_signal.clear()
                 bv_signal.wait()
 
-            if logger: logger.debug(
+            if debug: logger.debug(
                 f"[{pid}] Completed AUX phase with values = {values}",
                 extra={"nodeid": pid, "epoch": r},
             )
 
             # CONF phase
-            if logger: logger.debug(
+            if debug: logger.debug(
                 f"[{pid}] block until at least N-f ({N - f}) CONF values\
                 are received",
                 extra={"nodeid": pid, "epoch": r},
             )
-            if not conf_sent[r][tuple(values)]:
-                values = wait_for_conf_values(
-                    pid=pid,
-                    n=N,
-                    f=f,
-                    epoch=r,
-                    conf_sent=conf_sent,
-                    bin_values=bin_values,
-                    values=values,
-                    conf_values=conf_values,
-                    bv_signal=bv_signal,
-                    broadcast=broadcast,
-                )
-            if logger: logger.debug(
+            if not epoch.conf_sent[CONF_INDEX[tuple(values)]]:
+                values = wait_for_conf_values(epoch=epoch, r=r, values=values)
+            if debug: logger.debug(
                 f"[{pid}] Completed CONF phase with values = {values}",
                 extra={"nodeid": pid, "epoch": r},
             )
 
-            if logger: logger.debug(
+            if debug: logger.debug(
                 f"[{pid}] Block until receiving the common coin value",
                 extra={"nodeid": pid, "epoch": r},
             )
             # Block until receiving the common coin value
             s = coin(r)
-            if logger: logger.debug(
+            if debug: logger.debug(
                 f"[{pid}] Received coin with value = {s}",
                 extra={"nodeid": pid, "epoch": r},
             )
@@ -300,7 +280,7 @@ def binaryagreement(
                 )
             except AbandonedNodeError:
                 # print('[sid:%s] [pid:%d] QUITTING in round %d' % (sid,pid,r))
-                if logger: logger.debug(f"[{pid}] QUIT!", extra={"nodeid": pid, "epoch": r})
+                if debug: logger.debug(f"[{pid}] QUIT!", extra={"nodeid": pid, "epoch": r})
                 return
 
             r += 1
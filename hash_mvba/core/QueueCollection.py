@@ -1,8 +1,8 @@
 from collections import defaultdict
-from typing import List
+from typing import Callable, Dict, List, Set
 
 from gevent import monkey
-from gevent.event import Event
+from gevent.event import AsyncResult, Event
 
 monkey.patch_all(thread=False)
 
@@ -19,7 +19,7 @@ NULL = b'0'
 class QueueCollection:
     TIMEOUT = 0
 
-    def __init__(self, queues):
+    def __init__(self, queues, put_thread: Callable = lambda x: None):
         self.queues: List[Queue] = queues.copy()
         self.N = len(self.queues)
         self._get_queue = Queue()
@@ -30,7 +30,9 @@ class QueueCollection:
 
         self._get_threads = []
         for i in range(len(self.queues)):
-            self._get_threads.append(gevent.spawn(_get_watcher, self.queues[i], self._get_queue))
+            _t = gevent.spawn(_get_watcher, self.queues[i], self._get_queue)
+            put_thread(_t)
+            self._get_threads.append(_t)
 
 
     def get(self):
@@ -142,8 +144,9 @@ class QueueCollection:
 
 
 class QueueCollectionThreads:
-    def __init__(self, queues):
+    def __init__(self, queues, put_thread: Callable = lambda x: None):
         self.queues = queues.copy()
+        self.put_thread = put_thread
         self._get_queue = Queue()
         def _get_watcher(watched_queue: Queue, target_queue: Queue):
             # Watcher function to check if the queue is non-empty
@@ -152,7 +155,17 @@ class QueueCollectionThreads:
 
         self._get_threads = []
         for i in range(len(self.queues)):
-            self._get_threads.append(gevent.spawn(_get_watcher, self.queues[i], self._get_queue))
+            _t = gevent.spawn(_get_watcher, self.queues[i], self._get_queue)
+            put_thread(_t)
+            self._get_threads.append(_t)
+
+    def _spawn_watchers(self, watcher: Callable, queues: List[Queue], events: List[Event]):
+        threads = []
+        for i in range(len(queues)):
+            _t = gevent.spawn(watcher, queues[i], events[i])
+            self.put_thread(_t)
+            threads.append(_t)
+        return threads
 
 
     def get(self):
@@ -203,15 +216,17 @@ class QueueCollectionThreads:
                 print('watcher!?')
                 print(e)
 
-        threads = []
-        for i in range(len(self.queues)):
-            threads.append(gevent.spawn(watcher, self.queues[i], events[i]))
-
-        # Wait for at least k of the events to be set
-        gevent.joinall(events, count=k)
-        gevent.killall(threads)
+        threads = self._spawn_watchers(watcher, self.queues, events)
+        watchers = threads.copy()
+        try:
+            # Wait for at least k of the events to be set
+            gevent.joinall(events, count=k)
+            gevent.killall(threads)
 
-        return [i for i, event in enumerate(events) if event.is_set()]
+            return [i for i, event in enumerate(events) if event.is_set()]
+        finally:
+            # also reached when the waiting greenlet is killed
+            gevent.killall(watchers, block=False)
 
     def get_k_matching_value(self, k, allow_null=True):
         queues: List[Queue] = self.queues.copy()
@@ -225,46 +240,48 @@ class QueueCollectionThreads:
             e = queue.peek()  # blocking; avoid busy-waiting
             event.set()
 
-        threads = []
-        for i in range(len(queues)):
-            threads.append(gevent.spawn(watcher, queues[i], events[i]))
-
-        # at least k events is set!
-        gevent.joinall(events, count=k)
-
-        counter = dict()
-        finished_threads = list()
-        finished_events = list()
-
-        while len(finished_events) < len(queues):
-            gevent.joinall(events, count=1)
-            for i in range(len(threads) - 1, -1, -1):
-                if events[i].is_set():
-                    try:
-                        sender, received_value = queues[i].peek()
-                        counter.setdefault(received_value, set())
-                        counter[received_value].add(sender)
-                        finished_events.append(events.pop(i))
-                        finished_threads.append(threads.pop(i))
-                        queues.pop(i)
-                        if len(counter[received_value]) >= k:
-                            if allow_null:
-                                gevent.killall(finished_threads)
-                                gevent.killall(threads)
-                                return received_value
-                            elif received_value != NULL:
-                                gevent.killall(finished_threads)
-                                gevent.killall(threads)
-                                return received_value
-
-                    except Exception as e:
-                        print('watcher!?')
-                        print(e)
-            gevent.killall(finished_threads)
-            finished_threads.clear()
-
-        gevent.killall(threads)
-        return None
+        threads = self._spawn_watchers(watcher, queues, events)
+        watchers = threads.copy()
+        try:
+            # at least k events is set!
+            gevent.joinall(events, count=k)
+
+            counter = dict()
+            finished_threads = list()
+            finished_events = list()
+
+            while len(finished_events) < len(queues):
+                gevent.joinall(events, count=1)
+                for i in range(len(threads) - 1, -1, -1):
+                    if events[i].is_set():
+                        try:
+                            sender, received_value = queues[i].peek()
+                            counter.setdefault(received_value, set())
+                            counter[received_value].add(sender)
+                            finished_events.append(events.pop(i))
+                            finished_threads.append(threads.pop(i))
+                            queues.pop(i)
+                            if len(counter[received_value]) >= k:
+                                if allow_null:
+                                    gevent.killall(finished_threads)
+                                    gevent.killall(threads)
+                                    return received_value
+                                elif received_value != NULL:
+                                    gevent.killall(finished_threads)
+                                    gevent.killall(threads)
+                                    return received_value
+
+                        except Exception as e:
+                            print('watcher!?')
+                            print(e)
+                gevent.killall(finished_threads)
+                finished_threads.clear()
+
+            gevent.killall(threads)
+            return None
+        finally:
+            # also reached when the waiting greenlet is killed
+            gevent.killall(watchers, block=False)
 
 
     def get_value_at_least_k1_count_within_k2_count(self, k1, k2):
@@ -279,40 +296,42 @@ class QueueCollectionThreads:
             e = queue.peek()  # blocking; avoid busy-waiting
             event.set()
 
-        threads = []
-        for i in range(len(queues)):
-            threads.append(gevent.spawn(watcher, queues[i], events[i]))
-
-        # at least k1 events is set!
-        gevent.joinall(events, count=k1)
-
-        counter = dict()
-        finished_threads = list()
-        finished_events = list()
-
-        while len(finished_events) < k2:
-            gevent.joinall(events, count=1)
-            for i in range(len(threads) - 1, -1, -1):
-                if events[i].is_set():
-                    try:
-                        sender, received_value = queues[i].peek()
-                        counter.setdefault(received_value, set())
-                        counter[received_value].add(sender)
-                        finished_events.append(events.pop(i))
-                        finished_threads.append(threads.pop(i))
-                        queues.pop(i)
-                        if len(counter[received_value]) >= k1:
-                            gevent.killall(finished_threads)
-                            gevent.killall(threads)
-                            return received_value, sorted(counter[received_value])
-                    except Exception as e:
-                        print('watcher!?')
-                        print(e)
-            gevent.killall(finished_threads)
-            finished_threads.clear()
-
-        gevent.killall(threads)
-        return None, list()
+        threads = self._spawn_watchers(watcher, queues, events)
+        watchers = threads.copy()
+        try:
+            # at least k1 events is set!
+            gevent.joinall(events, count=k1)
+
+            counter = dict()
+            finished_threads = list()
+            finished_events = list()
+
+            while len(finished_events) < k2:
+                gevent.joinall(events, count=1)
+                for i in range(len(threads) - 1, -1, -1):
+                    if events[i].is_set():
+                        try:
+                            sender, received_value = queues[i].peek()
+                            counter.setdefault(received_value, set())
+                            counter[received_value].add(sender)
+                            finished_events.append(events.pop(i))
+                            finished_threads.append(threads.pop(i))
+                            queues.pop(i)
+                            if len(counter[received_value]) >= k1:
+                                gevent.killall(finished_threads)
+                                gevent.killall(threads)
+                                return received_value, sorted(counter[received_value])
+                        except Exception as e:
+                            print('watcher!?')
+                            print(e)
+                gevent.killall(finished_threads)
+                finished_threads.clear()
+
+            gevent.killall(threads)
+            return None, list()
+        finally:
+            # also reached when the waiting greenlet is killed
+            gevent.killall(watchers, block=False)
 
     def get_non_zero_value_at_least_k1_count_within_k2_count(self, k1, k2):
         queues = self.queues.copy()
@@ -326,37 +345,248 @@ class QueueCollectionThreads:
             e = queue.peek()  # blocking; avoid busy-waiting
             event.set()
 
-        threads = []
-        for i in range(len(queues)):
-            threads.append(gevent.spawn(watcher, queues[i], events[i]))
-
-        # at least k1 events is set!
-        gevent.joinall(events, count=k1)
-
-        counter = dict()
-        finished_threads = list()
-        finished_events = list()
-
-        while len(finished_events) < k2:
-            gevent.joinall(events, count=1)
-            for i in range(len(threads) - 1, -1, -1):
-                if events[i].is_set():
-                    try:
-                        sender, received_value = queues[i].peek()
-                        counter.setdefault(received_value, set())
-                        counter[received_value].add(sender)
-                        finished_events.append(events.pop(i))
-                        finished_threads.append(threads.pop(i))
-                        queues.pop(i)
-                        if received_value != NULL and len(counter[received_value]) >= k1:
-                            gevent.killall(finished_threads)
-                            gevent.killall(threads)
-                            return received_value, sorted(counter[received_value])
-                    except Exception as e:
-                        print('watcher!?')
-                        print(e)
-            gevent.killall(finished_threads)
-            finished_threads.clear()
-
-        gevent.killall(threads)
-        return None, list()
+        threads = self._spawn_watchers(watcher, queues, events)
+        watchers = threads.copy()
+        try:
+            # at least k1 events is set!
+            gevent.joinall(events, count=k1)
+
+            counter = dict()
+            finished_threads = list()
+            finished_events = list()
+
+            while len(finished_events) < k2:
+                gevent.joinall(events, count=1)
+                for i in range(len(threads) - 1, -1, -1):
+                    if events[i].is_set():
+                        try:
+                            sender, received_value = queues[i].peek()
+                            counter.setdefault(received_value, set())
+                            counter[received_value].add(sender)
+                            finished_events.append(events.pop(i))
+                            finished_threads.append(threads.pop(i))
+                            queues.pop(i)
+                            if received_value != NULL and len(counter[received_value]) >= k1:
+                                gevent.killall(finished_threads)
+                                gevent.killall(threads)
+                                return received_value, sorted(counter[received_value])
+                        except Exception as e:
+                            print('watcher!?')
+                            print(e)
+                gevent.killall(finished_threads)
+                finished_threads.clear()
+
+            gevent.killall(threads)
+            return None, list()
+        finally:
+            # also reached when the waiting greenlet is killed
+            gevent.killall(watchers, block=False)
+
+
+class QuorumTracker:
+    """Per-value sender sets of one message type, updated once per message.
+
+    Unlike ``QueueCollection`` nothing polls the queues: the receiver loop
+    calls ``add`` for every arriving message and each pending threshold query
+    is checked in O(1) against the value that was just added. Waiting blocks
+    on an ``AsyncResult`` and does not spin the hub.
+
+    Only the first message of every sender counts, as with the queue based
+    collections which only ever peek at the head of each queue.
+    """
+
+    def __init__(self, N: int):
+        self.N = N
+        self.values: Dict[int, object] = dict()  # sender -> first value
+        self.senders_of: Dict[object, Set[int]] = defaultdict(set)
+        self._waiters: List[_QuorumWaiter] = []
+
+    def add(self, sender: int, value) -> bool:
+        """Records the message of ``sender``; returns False for a duplicate.
+
+        A value that cannot be counted, i.e. is not hashable, is dropped
+        before any state changes and also returns False.
+        """
+        if sender in self.values:
+            return False
+        try:
+            hash(value)
+        except TypeError:
+            return False
+        self.values[sender] = value
+        senders = self.senders_of[value]
+        senders.add(sender)
+        if self._waiters:
+            for waiter in list(self._waiters):
+                if waiter.check(value, senders, len(self.values)):
+                    self._waiters.remove(waiter)
+        return True
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, sender):
+        return sender in self.values
+
+    def count(self, value) -> int:
+        return len(self.senders_of.get(value, ()))
+
+    def _wait(self, k1: int, k2: int, accept: Callable = lambda v: True, any_value: bool = False):
+        waiter = _QuorumWaiter(k1, k2, accept, any_value)
+        # catch up with the messages that arrived before the query
+        if not waiter.check_all(self.senders_of, len(self.values)):
+            self._waiters.append(waiter)
+        try:
+            return waiter.result.get()  # blocking
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def wait(self, k):
+        if not (0 < k <= self.N):
+            raise ValueError("Invalid value of k")
+        self._wait(k, self.N, any_value=True)
+        return list(self.values)
+
+    def wait_value(self, value, k):
+        if not (0 < k <= self.N):
+            raise ValueError("Invalid value of k")
+        return self._wait(k, self.N + 1, lambda v: v == value)[1]
+
+    def get_k_matching_value(self, k, allow_null=True):
+        if not (0 < k <= self.N):
+            raise ValueError("Invalid value of k")
+        accept = (lambda v: True) if allow_null else (lambda v: v != NULL)
+        return self._wait(k, self.N, accept)[0]
+
+    def get_value_at_least_k1_count_within_k2_count(self, k1, k2):
+        if not (0 < k1 <= k2 <= self.N):
+            raise ValueError("Invalid value of k1 or k2")
+        return self._wait(k1, k2)
+
+    def get_non_zero_value_at_least_k1_count_within_k2_count(self, k1, k2):
+        if not (0 < k1 <= k2 <= self.N):
+            raise ValueError("Invalid value of k1 or k2")
+        return self._wait(k1, k2, lambda v: v != NULL)
+
+
+class _QuorumWaiter:
+    """A pending "at least k1 senders of an accepted value within k2 senders" query.
+
+    Resolves to ``(value, sorted senders)`` once an accepted value has k1
+    senders, or to ``(None, [])`` once k2 senders have been seen without one.
+    With ``any_value`` the senders of all values count together.
+    """
+    __slots__ = ('k1', 'k2', 'accept', 'any_value', 'result')
+
+    def __init__(self, k1: int, k2: int, accept: Callable, any_value: bool):
+        self.k1 = k1
+        self.k2 = k2
+        self.accept = accept
+        self.any_value = any_value
+        self.result = AsyncResult()
+
+    def check(self, value, senders: Set[int], total: int) -> bool:
+        """Checks the query after ``value`` got a new sender; O(1)."""
+        if self.any_value:
+            return self._exhausted(total, self.k1)
+        if len(senders) >= self.k1 and self.accept(value):
+            self.result.set((value, sorted(senders)))
+            return True
+        return self._exhausted(total, self.k2)
+
+    def check_all(self, senders_of: Dict[object, Set[int]], total: int) -> bool:
+        """Checks the query against every value seen so far."""
+        if self.any_value:
+            return self._exhausted(total, self.k1)
+        for value, senders in senders_of.items():
+            if len(senders) >= self.k1 and self.accept(value):
+                self.result.set((value, sorted(senders)))
+                return True
+        return self._exhausted(total, self.k2)
+
+    def _exhausted(self, total: int, k: int) -> bool:
+        if total >= k:
+            self.result.set((None, list()))
+            return True
+        return False
+
+
+class ObservedQueue(Queue):
+    """A gevent ``Queue`` that calls its listeners with every item put into it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._listeners: List[Callable] = []
+
+    def rawlink(self, callback: Callable):
+        self._listeners.append(callback)
+
+    def unlink(self, callback: Callable):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        for callback in self._listeners:
+            callback(item)
+
+    def put_nowait(self, item):
+        self.put(item, False)
+
+
+class QueueCollectionCounters:
+    """Drop-in replacement of ``QueueCollectionThreads`` without watcher greenlets.
+
+    One callback is linked to every source ``ObservedQueue`` when the
+    collection is created and stays for the lifetime of the instance. It feeds
+    the head of each queue into a ``QuorumTracker``, so every threshold query
+    is answered from counters maintained as messages arrive, instead of
+    spawning, joining and killing N greenlets per call. Items already queued
+    when the collection is created are taken into account. As no greenlet is
+    spawned, there is no ``put_thread`` to hand them to.
+    """
+
+    def __init__(self, queues: List[ObservedQueue]):
+        self.queues = queues.copy()
+        self.N = len(self.queues)
+        self.tracker = QuorumTracker(self.N)
+        self._get_queue = Queue()
+        for i, q in enumerate(self.queues):
+            q.rawlink(self._make_callback(i))
+            if not q.empty():
+                self._on_item(i, q.peek_nowait())
+
+    def _make_callback(self, i: int):
+        def callback(item):
+            self._on_item(i, item)
+        return callback
+
+    def _on_item(self, i: int, item):
+        # runs inside ObservedQueue.put of the receiver, malformed items are dropped
+        if i in self.tracker:
+            return
+        try:
+            _, value = item
+        except (TypeError, ValueError):
+            return
+        if self.tracker.add(i, value):
+            self._get_queue.put_nowait(item)
+
+    def get(self):
+        return self._get_queue.get()
+
+    def wait(self, k):
+        return self.tracker.wait(k)
+
+    def wait_value(self, value, k):
+        return self.tracker.wait_value(value, k)
+
+    def get_k_matching_value(self, k, allow_null=True):
+        return self.tracker.get_k_matching_value(k, allow_null)
+
+    def get_value_at_least_k1_count_within_k2_count(self, k1, k2):
+        return self.tracker.get_value_at_least_k1_count_within_k2_count(k1, k2)
+
+    def get_non_zero_value_at_least_k1_count_within_k2_count(self, k1, k2):
+        return self.tracker.get_non_zero_value_at_least_k1_count_within_k2_count(k1, k2)
@@ -0,0 +1,48 @@
+from typing import Dict
+
+
+class BufferMeter:
+    """Bytes held in the large buffers of one protocol instance, and their peak.
+
+    Buffers are counted by kind, e.g. the own proposal, the DIFFUSION
+    stripes received or the VALUE stripes collected, so that a milestone
+    can release a whole kind at once. Only payload bytes are counted, not
+    the Python objects around them. ``run_hmvba`` releases the own proposal
+    once its dispersal is sent, partly assembled streams at abandon, and
+    the DIFFUSION and VALUE stripes once the instance outputs.
+
+    Usage::
+
+        meter = BufferMeter()
+        meter.add('proposal', len(value))
+        ...
+        meter.release_all('proposal')
+        meter.peak
+    """
+
+    __slots__ = ('held', 'peak', '_kinds')
+
+    def __init__(self):
+        self.held = 0
+        self.peak = 0
+        self._kinds: Dict[str, int] = dict()
+
+    def add(self, kind: str, nbytes: int):
+        self._kinds[kind] = self._kinds.get(kind, 0) + nbytes
+        self.held += nbytes
+        if self.held > self.peak:
+            self.peak = self.held
+
+    def release(self, kind: str, nbytes: int):
+        if kind not in self._kinds:
+            return
+        nbytes = min(nbytes, self._kinds[kind])
+        self._kinds[kind] -= nbytes
+        self.held -= nbytes
+
+    def release_all(self, kind: str):
+        self.held -= self._kinds.pop(kind, 0)
+
+    def snapshot(self) -> Dict[str, int]:
+        """:return: the bytes held per kind, in total and at the peak"""
+        return {**self._kinds, 'held': self.held, 'peak': self.peak}
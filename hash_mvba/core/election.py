@@ -0,0 +1,258 @@
+"""Leader election for the election rounds of H-MVBA and FIN.
+
+``hash_election(prefix, N)`` is the cheap election the protocols used so
+far: the leader of round ``k`` is a hash of the instance prefix and ``k``.
+It costs nothing, but anybody, an adaptive adversary included, knows every
+leader in advance.
+
+``ElectionService`` elects with a threshold coin instead (Boldyreva
+threshold BLS, the ``sPK``/``sSK`` keys of ``run_trusted_key_gen.py``). The
+leader of a round is unknown until ``PK.k`` nodes have released their
+coin shares for it. The service is created once per node:
+
+- Coin shares are signed ahead of time, for the first rounds of an instance
+  when it starts and for the next rounds whenever a round is elected, so
+  releasing a share costs no pairing work on the critical path.
+- Signing, combining and verifying run in a pool of worker processes, the
+  pairing library holds the GIL; the calling greenlet waits in a thread and
+  the hub keeps running.
+- The first ``PK.k`` shares of a round are combined without checking them
+  one by one; only if the combined signature does not verify are the shares
+  verified individually and the bad ones dropped.
+
+Prefetching the VALUE stripes of later rounds, as ``run_hmvba`` does with
+the hash election, would release coin shares of those rounds ahead of time
+and reveal their leaders; with an ``ElectionService`` it is off.
+
+Usage::
+
+    service = ElectionService(pid, N, PK, SK)
+    elect = service.instance(prefix, broadcast, election_recv.get, put_thread)
+    leader = elect(election_round)  # blocking
+"""
+import hashlib
+import os
+import pickle
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+
+import gevent
+from gevent.event import AsyncResult
+from gevent.threadpool import ThreadPool
+
+
+def hash_election(prefix: str, N: int) -> Callable[[int], int]:
+    """The cheap election: ``elect(k)`` hashes ``prefix`` and ``k``."""
+    def elect(election_round: int) -> int:
+        seed = int.from_bytes(hashlib.sha256((prefix + str(election_round)).encode()).digest(),
+                              byteorder='big') % (2 ** 10 - 1)
+        return seed % N
+    return elect
+
+
+def load_keys(pid: int, N: int, f: int, folder: str = None):
+    """The threshold signature keys ``(sPK, sSK)`` written by ``run_trusted_key_gen.py``."""
+    folder = folder or f'{os.getcwd()}/keys/keys-N{N}-f{f}'
+    with open(f'{folder}/sPK.key', 'rb') as fp:
+        PK = pickle.load(fp)
+    with open(f'{folder}/sSK-{pid}.key', 'rb') as fp:
+        SK = pickle.load(fp)
+    return PK, SK
+
+
+def coin_message(prefix: str, election_round: int) -> str:
+    return str((prefix, election_round))
+
+
+def _sign(PK, SK, message: str) -> bytes:
+    from crypto.threshsig.boldyreva import serialize
+    return serialize(SK.sign(PK.hash_message(message)))
+
+
+def _verify_share(PK, SK, message: str, i: int, share: bytes) -> bool:
+    from crypto.threshsig.boldyreva import deserialize1
+    try:
+        return PK.verify_share(deserialize1(share), i, PK.hash_message(message))
+    except Exception:
+        # a share that does not parse is as bad as one that does not verify
+        return False
+
+
+def _combine(PK, SK, message: str, shares: Dict[int, bytes]) -> Optional[bytes]:
+    """The threshold signature of ``shares``, or ``None`` if it does not verify."""
+    from crypto.threshsig.boldyreva import serialize, deserialize1
+    try:
+        signature = PK.combine_shares({i: deserialize1(share) for i, share in shares.items()})
+        PK.verify_signature(signature, PK.hash_message(message))
+    except Exception:
+        return None
+    return serialize(signature)
+
+
+_OPERATIONS = {'sign': _sign, 'verify_share': _verify_share, 'combine': _combine}
+
+# the keys of the node, in every worker process
+_worker_keys = None
+
+
+def _init_worker(PK, SK):
+    global _worker_keys
+    _worker_keys = (PK, SK)
+
+
+def _in_worker(operation: str, *args):
+    return _OPERATIONS[operation](*_worker_keys, *args)
+
+
+class ElectionService:
+    """Threshold-coin leader election for the instances of one node.
+
+    :param workers: worker processes for the pairing operations, 0 to run
+        them on the calling greenlet
+    :param lookahead: election rounds whose coin shares are signed ahead
+    """
+
+    def __init__(self, pid: int, N: int, PK, SK, workers: int = 1, lookahead: int = 2):
+        self.pid = pid
+        self.N = N
+        self.PK = PK
+        self.SK = SK
+        self.k = PK.k
+        self.lookahead = lookahead
+        self._processes = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(PK, SK)) \
+            if workers else None
+        self._threads = ThreadPool(workers) if workers else None
+        # (prefix, round) -> greenlet signing the own coin share
+        self._shares: Dict[tuple, gevent.Greenlet] = dict()
+
+    def _run(self, operation: str, *args):
+        if self._processes is None:
+            return _OPERATIONS[operation](self.PK, self.SK, *args)
+        future = self._processes.submit(_in_worker, operation, *args)
+        # wait in a thread, the hub keeps running
+        return self._threads.spawn(future.result).get()
+
+    def precompute(self, prefix: str, rounds: Iterable[int]):
+        """Starts signing the own coin shares of ``rounds`` of the instance ``prefix``."""
+        for election_round in rounds:
+            key = (prefix, election_round)
+            if key not in self._shares:
+                self._shares[key] = gevent.spawn(self._run, 'sign', coin_message(prefix, election_round))
+
+    def share(self, prefix: str, election_round: int) -> bytes:
+        """The own coin share of ``election_round``, signed ahead if it was precomputed."""
+        self.precompute(prefix, (election_round,))
+        return self._shares.pop((prefix, election_round)).get()
+
+    def verify_share(self, prefix: str, election_round: int, i: int, share: bytes) -> bool:
+        return self._run('verify_share', coin_message(prefix, election_round), i, share)
+
+    def combine(self, prefix: str, election_round: int, shares: Dict[int, bytes]) -> Optional[bytes]:
+        return self._run('combine', coin_message(prefix, election_round), shares)
+
+    def leader(self, signature: bytes) -> int:
+        return int.from_bytes(hashlib.sha256(signature).digest(), byteorder='big') % self.N
+
+    def instance(self, prefix: str, broadcast: Callable, receive: Callable,
+                 put_thread: Callable = lambda x: None) -> 'ThresholdElection':
+        """The election of one protocol instance; signs its first rounds right away."""
+        self.precompute(prefix, range(self.lookahead))
+        return ThresholdElection(self, prefix, broadcast, receive, put_thread)
+
+    def discard(self, prefix: str):
+        """Drops the shares signed ahead for the instance ``prefix``."""
+        for key in [key for key in self._shares if key[0] == prefix]:
+            self._shares.pop(key).kill(block=False)
+
+    def close(self):
+        for greenlet in self._shares.values():
+            greenlet.kill(block=False)
+        self._shares.clear()
+        if self._processes is not None:
+            self._processes.shutdown(wait=False)
+            self._threads.kill()
+
+
+class _CoinRound:
+    __slots__ = ('shares', 'bad', 'combining', 'leader')
+
+    def __init__(self):
+        self.shares: Dict[int, bytes] = dict()
+        self.bad = set()
+        self.combining = False
+        self.leader = AsyncResult()
+
+
+class ThresholdElection:
+    """The threshold-coin election of one instance, ``elect(k)`` blocks until round ``k`` is elected.
+
+    If the shares of a round verify one by one but do not combine, which
+    means the keys are broken, ``elect(k)`` raises ``RuntimeError``.
+
+    Coin shares arrive as ``(sender, (round, share))`` from ``receive``;
+    the own share goes out through ``broadcast`` as ``(round, share)``.
+    Shares of rounds ``N`` or more past the latest round elected here are
+    dropped, so the rounds held stay bounded whatever round a peer sends.
+    """
+
+    def __init__(self, service: ElectionService, prefix: str, broadcast: Callable, receive: Callable,
+                 put_thread: Callable = lambda x: None):
+        self.service = service
+        self.prefix = prefix
+        self.broadcast = broadcast
+        self.receive = receive
+        self.put_thread = put_thread
+        self.rounds = defaultdict(_CoinRound)
+        # the latest round elect was called for
+        self.current = 0
+        _t = gevent.spawn(self._recv)
+        put_thread(_t)
+
+    def __call__(self, election_round: int) -> int:
+        self.current = max(self.current, election_round)
+        self.service.precompute(self.prefix, range(election_round + 1, election_round + 1 + self.service.lookahead))
+        self.broadcast((election_round, self.service.share(self.prefix, election_round)))
+        return self.rounds[election_round].leader.get()
+
+    def _recv(self):
+        N = self.service.N
+        while True:
+            sender, msg = self.receive()
+            try:
+                election_round, share = msg
+            except (TypeError, ValueError):
+                continue
+            if not (isinstance(election_round, int) and 0 <= election_round < self.current + N
+                    and isinstance(share, bytes) and sender in range(N)):
+                continue
+            coin = self.rounds[election_round]
+            if coin.leader.ready() or sender in coin.shares or sender in coin.bad:
+                continue
+            coin.shares[sender] = share
+            if len(coin.shares) >= self.service.k and not coin.combining:
+                coin.combining = True
+                _t = gevent.spawn(self._combine, election_round, coin)
+                self.put_thread(_t)
+
+    def _combine(self, election_round: int, coin: _CoinRound):
+        k = self.service.k
+        while len(coin.shares) >= k:
+            chosen = dict(list(coin.shares.items())[:k])
+            signature = self.service.combine(self.prefix, election_round, chosen)
+            if signature is not None:
+                coin.leader.set(self.service.leader(signature))
+                return
+            # a bad share among them, find it
+            bad = [i for i, share in chosen.items()
+                   if not self.service.verify_share(self.prefix, election_round, i, share)]
+            if not bad:
+                # raised in the greenlet waiting in elect, not in this one
+                coin.leader.set_exception(RuntimeError(
+                    f'valid shares of {self.prefix} round {election_round} do not combine'))
+                return
+            for i in bad:
+                coin.bad.add(i)
+                del coin.shares[i]
+        # wait for more shares
+        coin.combining = False
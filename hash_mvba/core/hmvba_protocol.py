@@ -10,8 +10,14 @@ import traceback
 from typing import Tuple, List, Callable, Dict
 
 from hash_mvba.mba.mba_protocol import run_mba
-from crypto.zfec_encoding import encode, decode, merkleTree as merkle_tree, \
-    getMerkleBranch as get_merkle_branch, merkleVerify as verify_merkle_branch
+from hash_mvba.core.phasetimer import PhaseTimer
+from crypto.erasure_coding import encode, decode
+from crypto.coding_pool import CodingPool
+from crypto.commitment import get_scheme
+from hash_mvba.core.stripestore import StripeStore
+from hash_mvba.core.stripestream import StripeAssembler, max_stripe_length, stream_messages
+from hash_mvba.core.buffermeter import BufferMeter
+from hash_mvba.core.election import ElectionService, hash_election
 
 import hashlib
 
@@ -44,52 +50,85 @@ simple_qc = False
 if simple_qc:
     from hash_mvba.core.QueueCollection import QueueCollection
 else:
-    from hash_mvba.core.QueueCollection import QueueCollectionThreads as QueueCollection
+    from hash_mvba.core.QueueCollection import QueueCollectionCounters
 
-NULL = b'0'
-
-from gevent.lock import BoundedSemaphore
-from collections import defaultdict
-
-class ThreadSafeWrapper:
-    def __init__(self, obj):
-        self.__dict__['_obj'] = obj
-        self.__dict__['_lock'] = BoundedSemaphore(value=1)
-
-    def __getattr__(self, name):
-        with self.__dict__['_lock']:
-            return getattr(self.__dict__['_obj'], name)
+    def QueueCollection(queues, put_thread):
+        # the counters spawn no greenlets for put_thread
+        return QueueCollectionCounters(queues)
+from hash_mvba.core.QueueCollection import ObservedQueue
+from hash_mvba.core.senderstate import SenderTable
 
-    def __setattr__(self, name, value):
-        with self.__dict__['_lock']:
-            setattr(self.__dict__['_obj'], name, value)
-
-    def __delattr__(self, name):
-        with self.__dict__['_lock']:
-            delattr(self.__dict__['_obj'], name)
-
-    def __getitem__(self, key):
-        with self.__dict__['_lock']:
-            return self.__dict__['_obj'][key]
+NULL = b'0'
 
-    def __setitem__(self, key, value):
-        with self.__dict__['_lock']:
-            self.__dict__['_obj'][key] = value
 
-    def __delitem__(self, key):
-        with self.__dict__['_lock']:
-            del self.__dict__['_obj'][key]
+class PreparedProposal:
+    """The dispersal of a proposal, computed before its instance starts.
 
-    def __contains__(self, *args, **kwargs): # real signature unknown
-        """ True if the dictionary has the specified key, else False. """
-        with self.__dict__['_lock']:
-            return self.__dict__['_obj'].__contains__(*args, **kwargs)
+    ``frames[j]`` lists the messages for node ``j`` carrying its stripe
+    and branch: one DIFFUSION, or the head and chunks of a streamed stripe.
+    They are message tuples or already serialized by the ``frame`` callable
+    given to ``prepare_proposal``; either way they are handed to ``send``
+    as is.
+    """
 
-    def __call__(self, *args, **kwargs):
-        with self.__dict__['_lock']:
-            return self.__dict__['_obj'](*args, **kwargs)
+    __slots__ = ('sid', 'r', 'value', 'commitment', 'frames', 'nbytes')
+
+    def __init__(self, sid, r, value, commitment: bytes, frames: list, nbytes: int = 0):
+        self.sid = sid
+        self.r = r
+        self.value = value
+        self.commitment = commitment
+        self.frames = frames
+        # payload bytes held by the value and the frames
+        self.nbytes = nbytes
+
+
+def prepare_proposal(
+        sid, pid, r, N, f, value,
+        coding_pool: CodingPool = None,
+        frame: Callable = None,
+        commitment_scheme: str = 'merkle',
+        stream_chunk: int = 0
+) -> PreparedProposal:
+    """Erasure codes and commits ``value`` for the instance ``(sid, r)``.
+
+    Pass the result instead of the value as the input of ``run_hmvba``,
+    which then starts its dispersal by sending the frames. The node uses
+    this to prepare the proposal of round ``r + 1`` while round ``r`` runs.
+
+    Stripes longer than ``stream_chunk`` bytes (if not 0) are streamed in
+    chunks of that size, see ``hash_mvba.core.stripestream``.
+    """
+    # generate m, (f+1, n)-erasure code
+    if coding_pool is None:
+        stripes = encode(f + 1, N, value)
+        digests = None
+    else:
+        stripes, digests = coding_pool.encode_and_hash(f + 1, N, value)
+    assert len(stripes) == N, f'{len(stripes)} != {N}'
+
+    # the commitment and every opening in one pass
+    commitment, branches = get_scheme(commitment_scheme).build(stripes, digests)
+
+    # same tags as BroadcastTag.DIFFUSION and STRIPE of run_hmvba
+    tag = f'{sid}:PMVBA:{str(r)}/DIFFUSION'
+    stripe_tag = f'{sid}:PMVBA:{str(r)}/STRIPE'
+    frames = []
+    nbytes = len(value) + sum(len(stripe) for stripe in stripes)
+    for j in range(N):
+        if stream_chunk and len(stripes[j]) > stream_chunk:
+            messages = [(stripe_tag, pid, message)
+                        for message in stream_messages(commitment, stripes[j], branches[j], stream_chunk)]
+        else:
+            messages = [(tag, pid, (commitment, stripes[j], branches[j]))]
+        if frame is not None:
+            messages = [frame(message) for message in messages]
+        frames.append(messages)
+    if frame is not None:
+        # the serialized frames replace the stripes
+        nbytes = len(value) + sum(len(message) for messages in frames for message in messages)
+    return PreparedProposal(sid, r, value, commitment, frames, nbytes)
 
-    # Add other methods as needed
 
 # alg 1
 
@@ -101,7 +140,15 @@ def run_hmvba(
         put_thread: Callable = lambda x: None,
         predicate: Callable = lambda x: True,
         logger: logging.Logger = None,
-        thread_safe: bool = True
+        check_state: bool = False,
+        phase_timer: PhaseTimer = None,
+        coding_pool: CodingPool = None,
+        commitment_scheme: str = 'merkle',
+        stream_chunk: int = 0,
+        prefetch: int = 0,
+        buffer_meter: BufferMeter = None,
+        election: ElectionService = None,
+        max_proposal: int = 0
 ):
     """
     Run P-MVBA protocol
@@ -119,7 +166,31 @@ def run_hmvba(
     round_input_queue.put_nowait(tx_to_send)
     result = round_output_queue.get() # None or a result
 
+    Every node disperses its input as (f + 1, N) erasure coded stripes under
+    one vector commitment. Once N - f nodes finished their dispersal, the
+    leader of each election round is elected and an MBA decides whether
+    its stripes are collected from the VALUE messages, decoded and output.
+
+    :param _input: queue holding the value to propose, or a
+        ``PreparedProposal`` of this instance, see ``prepare_proposal``
+    :param check_state: assert that the ``SenderTable``s are used from one hub
+    :param phase_timer: collects the duration of every phase, see ``PhaseTimer``
+    :param coding_pool: encodes and hashes the own proposal in worker threads
+    :param commitment_scheme: ``'merkle'`` or ``'hashlist'``, the same on all
+        nodes, see ``crypto.commitment``
+    :param stream_chunk: stream the own stripes in chunks of this many bytes,
+        0 for off; the same on all nodes, see ``hash_mvba.core.stripestream``
+    :param prefetch: election rounds ahead whose VALUE stripes are collected
+        while the MBA of the current round runs; off with ``election``
+    :param buffer_meter: follows the bytes held by the buffers of the
+        instance, see ``BufferMeter``
+    :param election: an ``ElectionService`` electing with a threshold coin
+        instead of a hash, see ``hash_mvba.core.election``
+    :param max_proposal: the longest proposal in bytes, longer streamed
+        stripes are dropped; 0 for no bound
     """
+    if buffer_meter is None:
+        buffer_meter = BufferMeter()
     # logger = None
 
     # logger = logging.getLogger("consensus-node-" + str(pid))
@@ -128,10 +199,18 @@ def run_hmvba(
     spawn_time = time.time()
 
     pmvba_prefix = f'{sid}:PMVBA:{str(r)}'
+    if election is not None:
+        # sign the coin shares of the first rounds while the dispersal runs
+        election.precompute(pmvba_prefix, range(election.lookahead))
+        # prefetching would release the coin shares of later rounds early
+        prefetch = 0
     send_threads = Queue()
+    if phase_timer is None:
+        phase_timer = PhaseTimer(pmvba_prefix)
 
     class BroadcastTag(Enum):
         DIFFUSION = f'{pmvba_prefix}/DIFFUSION'
+        STRIPE = f'{pmvba_prefix}/STRIPE'
         ECHO = f'{pmvba_prefix}/ECHO'
         DONE = f'{pmvba_prefix}/DONE'
         FINISH = f'{pmvba_prefix}/FINISH'
@@ -143,6 +222,7 @@ def run_hmvba(
         'broadcast_receiver_queues',
         (
             'DIFFUSION',
+            'STRIPE',
             'ECHO',
             'DONE',
             'FINISH',
@@ -168,7 +248,7 @@ def run_hmvba(
 
         recv_queue: Queue | List[Queue] = recv_queues._asdict()[tag_name]
 
-        if tag_value not in (BroadcastTag.DIFFUSION.value, BroadcastTag.ELECTION.value):
+        if tag_value not in (BroadcastTag.DIFFUSION.value, BroadcastTag.STRIPE.value, BroadcastTag.ELECTION.value):
             recv_queue: Queue = recv_queue[j]
 
         try:
@@ -186,9 +266,10 @@ def run_hmvba(
         #     send(j, o)
 
     diffusion_recv = Queue()
-    echo_recvs: List[Queue] = [Queue(1) for _ in range(N)]
-    done_recvs: List[Queue] = [Queue(1) for _ in range(N)]
-    finish_recvs: List[Queue] = [Queue(1) for _ in range(N)]
+    stripe_recv = Queue()
+    echo_recvs: List[Queue] = [ObservedQueue(1) for _ in range(N)]
+    done_recvs: List[Queue] = [ObservedQueue(1) for _ in range(N)]
+    finish_recvs: List[Queue] = [ObservedQueue(1) for _ in range(N)]
     value_recvs: List[Queue] = [Queue() for _ in range(N)]
     election_recv = Queue()
     mba_recvs: List[Queue] = [Queue() for _ in range(N)]
@@ -197,6 +278,7 @@ def run_hmvba(
 
     recv_queues = broadcast_receiver_queues(
         DIFFUSION=diffusion_recv,
+        STRIPE=stripe_recv,
         ECHO=echo_recvs,
         DONE=done_recvs,
         FINISH=finish_recvs,
@@ -208,48 +290,45 @@ def run_hmvba(
     _t = gevent.spawn(broadcast_receiver_loop, recv, recv_queues, unhandled_recvs)
     put_thread(_t)
 
-    flag = Event()
     new_store_ready = Event()
 
-    store_dict = ThreadSafeWrapper(defaultdict(list)) if thread_safe else defaultdict(list)
+    # VALUE stripes by commitment, each value is decoded and validated once
+    stripe_store = StripeStore(N, f + 1, predicate, decode, meter=buffer_meter)
+    # VALUE stripes of a leader share its commitment, verify its proof once
+    scheme = get_scheme(commitment_scheme)
+    vc_cache = scheme.verifier_cache(N)
+    # commitment -> set once its shared proof is known, see send_shared_proof
+    shared_proof_known: Dict[bytes, Event] = dict()
 
     def upon_receiving_input(input_queue: Queue, predicate: Callable):
-        def send_diffusion_all(i, erase_code_i, commitment_i, tree_i, num_node):
-            for j in range(num_node):
+        def send_diffusion_all(frames):
+            for j, messages in enumerate(frames):
                 # open
-                pi_i_j = get_merkle_branch(j, tree_i)
-                erase_code_i_j = erase_code_i[j]
-                send(j,
-                     (BroadcastTag.DIFFUSION.value,
-                      i,
-                      (commitment_i, erase_code_i_j, pi_i_j)
-                      )
-                     )
+                for message in messages:
+                    send(j, message)
 
         while True:
             v = input_queue.get()
+            proposal = v if isinstance(v, PreparedProposal) else None
+            if proposal is not None:
+                assert (proposal.sid, proposal.r) == (sid, r), f'proposal of {proposal.sid}:{proposal.r}'
+                v = proposal.value
             if not predicate(v): continue
 
-            vc_time = time.time()
-            # generate m, (f+1, n)-erasure code
-            m = encode(f + 1, N, v)
-            assert len(m) == N, f'{len(m)} != {N}'
-
-            def vector_commitment(x) -> Tuple[bytes, List[bytes]]:
-                mt = merkle_tree(x)
-                root = mt[1]
-                return root, mt
+            dispersal = phase_timer.start('dispersal')
+            if proposal is None:
+                with phase_timer.span('encode'):
+                    proposal = prepare_proposal(sid, pid, r, N, f, v, coding_pool,
+                                                commitment_scheme=commitment_scheme, stream_chunk=stream_chunk)
+            buffer_meter.add('proposal', proposal.nbytes)
 
-            vc_i, mt_i = vector_commitment(m)
-            vc_time = time.time() - vc_time
-            if logger: logger.info(f'vc time:{vc_time}')
-
-            send_diffusion_all_time = time.time()
-            _t = gevent.spawn(send_diffusion_all, pid, m, vc_i, mt_i, N)
+            _t = gevent.spawn(send_diffusion_all, proposal.frames)
             send_threads.put_nowait(_t)
             _t.join() # do not kill sending thread
-            send_diffusion_all_time = time.time() - send_diffusion_all_time
-            if logger: logger.debug(f'send_diffusion_all time:{send_diffusion_all_time}')
+            phase_timer.stop(dispersal)
+            # the value and its stripes are not needed after the dispersal
+            del v, proposal
+            buffer_meter.release_all('proposal')
 
     # upon_receiving_input(input, predicate)
     _t = gevent.spawn(upon_receiving_input, _input, predicate)
@@ -278,10 +357,18 @@ def run_hmvba(
                 # break
             if sender in received_sender: continue
             received_sender.add(sender)
-            commitment_j, erase_code_j_i, pi_j_i = proof
-            if not verify_merkle_branch(N, erase_code_j_i, commitment_j, pi_j_i, i): continue
+            if proof[0] is _STREAMED:
+                # verified chunk by chunk by the assembler
+                _, commitment_j, erase_code_j_i, pi_j_i = proof
+            else:
+                commitment_j, erase_code_j_i, pi_j_i = proof
+                if not vc_cache.verify(erase_code_j_i, commitment_j, pi_j_i, i): continue
+            if commitment_j in shared_proof_known:
+                # VALUE stripes under it were waiting for its list
+                shared_proof_known[commitment_j].set()
             if not abandon_event.ready():
                 received_commitments[j] = (j, commitment_j, erase_code_j_i, pi_j_i)
+                buffer_meter.add('diffusion', len(erase_code_j_i))
                 def send_echo_j():
                     send(
                         j,
@@ -300,19 +387,36 @@ def run_hmvba(
         if logger: logger.debug(
             f'upon_receiving_first_diffusion_from_j 2 time:{upon_receiving_first_diffusion_from_j_time}')
 
-    S = ThreadSafeWrapper(dict()) if thread_safe else dict()
+    S = SenderTable(N, debug=check_state)
+
+    # markers that cannot arrive over the network
+    _STREAMED = object()
+    _SHARED_PROOF = object()
+
+    def upon_receiving_stripe_chunks(stripe_queue: Queue, assembler: StripeAssembler):
+        while True:
+            sender, (seq, payload) = stripe_queue.get()
+            if abandon.ready():
+                # stripes that complete now would be dropped anyway
+                assembler.clear()
+                continue
+            stripe = assembler.feed(sender, seq, payload)
+            if stripe is not None:
+                diffusion_recv.put_nowait((sender, (_STREAMED, *stripe)))
+
+    _t = gevent.spawn(upon_receiving_stripe_chunks, stripe_recv, StripeAssembler(
+        pid, vc_cache, stream_chunk, max_stripe_length(N, f, max_proposal) if max_proposal else None))
+    put_thread(_t)
     abandon = Event()
     # has_received_N_minus_f_echo = Event()
     _t = gevent.spawn(upon_receiving_first_diffusion_from_j, diffusion_recv, abandon, S)
     put_thread(_t)
 
     def upon_receiving_N_minus_f_echo(echo_queues):
-        upon_receiving_N_minus_f_echo_time = time.time()
-        echo_qc = QueueCollection(echo_queues)
-        echo_qc.wait(N - f)
+        with phase_timer.span('echo_quorum'):
+            echo_qc = QueueCollection(echo_queues, put_thread)
+            echo_qc.wait(N - f)
         # has_received_N_minus_f_echo.set()
-        upon_receiving_N_minus_f_echo_time = time.time() - upon_receiving_N_minus_f_echo_time
-        if logger: logger.debug(f'upon_receiving_N_minus_f_echo time:{upon_receiving_N_minus_f_echo_time}')
 
         def multicast_done_all():
             broadcast(
@@ -323,23 +427,20 @@ def run_hmvba(
                 )
             )
 
-        multicast_done_all_time = time.time()
         _t = gevent.spawn(multicast_done_all)
         send_threads.put_nowait(_t)
         _t.join() # do not kill sending thread
-        multicast_done_all_time = time.time() - multicast_done_all_time
-        if logger: logger.debug(f'multicast_done_all time:{multicast_done_all_time}')
 
     # upon_receiving_N_minus_f_echo(echo_recvs)
     _t = gevent.spawn(upon_receiving_N_minus_f_echo, echo_recvs)
     put_thread(_t)
 
     def upon_receiving_N_minus_f_done(done_queues: List[Queue]):
-        done_qc = QueueCollection(done_queues)
+        done_qc = QueueCollection(done_queues, put_thread)
         done_qc.wait(N - f)
 
     def upon_receiving_f_plus_1_finish(finish_queues: List[Queue]):
-        finish_qc = QueueCollection(finish_queues)
+        finish_qc = QueueCollection(finish_queues, put_thread)
         finish_qc.wait(f + 1)
 
     def multicast_finish_with_prerequisites(done_pre: Callable, done_queues: List[Queue],
@@ -354,10 +455,8 @@ def run_hmvba(
         multicast_finish_prerequisites.append(upon_receiving_N_minus_f_done_thread)
         multicast_finish_prerequisites.append(upon_receiving_f_plus_1_finish_thread)
 
-        multicast_finish_prerequisites_time = time.time()
-        gevent.joinall(multicast_finish_prerequisites, count=1)
-        multicast_finish_prerequisites_time = time.time() - multicast_finish_prerequisites_time
-        if logger: logger.debug(f'multicast_finish_prerequisites time:{multicast_finish_prerequisites_time}')
+        with phase_timer.span('done_quorum'):
+            gevent.joinall(multicast_finish_prerequisites, count=1)
 
         def multicast_finish_all():
             broadcast(
@@ -368,12 +467,9 @@ def run_hmvba(
                 )
             )
 
-        multicast_finish_all_time = time.time()
         _t = gevent.spawn(multicast_finish_all)
         send_threads.put_nowait(_t)
         _t.join() # do not kill sending thread
-        multicast_finish_all_time = time.time() - multicast_finish_all_time
-        if logger: logger.debug(f'multicast_finish_all time:{multicast_finish_all_time}')
 
     # multicast_finish_with_prerequisites(
     #     upon_receiving_N_minus_f_done, done_recvs,
@@ -405,7 +501,8 @@ def run_hmvba(
             mba_output_queue,
             put_thread,
             send_threads.put,
-            logger
+            logger,
+            phase_timer
         )
         put_thread(_t)
         mba_input_queue.put_nowait(v)
@@ -416,13 +513,11 @@ def run_hmvba(
             finish_queues: Queue,
             value_queues: List[Queue],
             output: Callable,
-            _store_dict: Dict[bytes, List[Tuple[int, bytes]]]
+            _stripe_store: StripeStore
     ):
-        upon_receiving_N_minus_f_finish_time = time.time()
-        finish_qc = QueueCollection(finish_queues)
-        finish_qc.wait(N - f)  # blocking
-        upon_receiving_N_minus_f_finish_time = time.time() - upon_receiving_N_minus_f_finish_time
-        if logger: logger.debug(f'upon_receiving_N_minus_f_finish time:{upon_receiving_N_minus_f_finish_time}')
+        with phase_timer.span('finish_quorum'):
+            finish_qc = QueueCollection(finish_queues, put_thread)
+            finish_qc.wait(N - f)  # blocking
         abandon.set()
         _time = time.time_ns()
         if logger: logger.debug(f'abandon now at {_time}')
@@ -436,15 +531,22 @@ def run_hmvba(
         # elect = leader_election(pmvba_prefix, pid, N, N - f - 1, sPK_N_minus_f, sSK_N_minus_f, broadcast,
         #                         election_recv.get)
 
-        # cheap election
-        def elect(election_round: int):
-            seed = int.from_bytes(_hash(pmvba_prefix + str(election_round)), byteorder='big') % (2 ** 10 - 1)
-            return seed % N
+        if election is None:
+            # cheap election
+            elect = hash_election(pmvba_prefix, N)
+        else:
+            def election_broadcast(o):
+                broadcast((BroadcastTag.ELECTION.value, pid, o))
+            elect = election.instance(pmvba_prefix, election_broadcast, election_recv.get, put_thread)
 
         def multicast_value_all(k, l, s_leader):
             (_leader, commitment_leader, erase_code_leader_i, pi_leader_i) = s_leader
             assert _leader == l
             i = pid
+            if scheme.shared_proof:
+                # the receivers have the leader's list from its DIFFUSION,
+                # those that lack it ask with a bot VALUE, see send_shared_proof
+                pi_leader_i = None
             broadcast(
                 (
                     BroadcastTag.VALUE.value,
@@ -463,21 +565,81 @@ def run_hmvba(
                 curr_round: int,
                 _echo_queues: List[Queue],
                 _value_queue: Queue,
-                _store_dict: Dict[bytes, List[Tuple[int, bytes]]],
+                _stripe_store: StripeStore,
                 flag_event: Event,
-                _M_i_queue: Queue,
                 _vc_i_queue: Queue
         ):
-            upon_receiving_first_value_from_i_time = time.time()
             received_sender = set()
+            # N - 3f stripes as before, but no decode is tried below f + 1
+            threshold = max(N - 3 * f, f + 1)
+            voted = False
+            # commitments that reached the threshold and failed, each is tried once
+            tried = set()
+            # sender -> (commitment, stripe) waiting for the shared proof of the commitment
+            unverified = dict()
+
+            def send_shared_proof(j: int):
+                # j sent bot, it has no DIFFUSION of the leader and so no list
+                if my_leader in S:
+                    _, commitment, _, leaves = S[my_leader]
+                    send(j, (BroadcastTag.VALUE.value, curr_round, (curr_round, my_leader, pid, commitment, None, leaves)))
+
+            def wait_shared_proof(commitment: bytes):
+                shared_proof_known[commitment].wait()
+                _value_queue.put_nowait((_SHARED_PROOF, commitment))
+
+            def take(i: int, commitment_leader: bytes, erase_code_leader_i):
+                nonlocal voted
+                count = _stripe_store.add(commitment_leader, i, erase_code_leader_i)
+                new_store_ready.set()
+
+                if logger: logger.debug(
+                    f'leader {my_leader} commit {commitment_leader[:10]} has length {count}')
+
+                # TODO: upon?
+                if count >= threshold and not voted and commitment_leader not in tried:
+                    tried.add(commitment_leader)
+                    if not _stripe_store.decoded(commitment_leader):
+                        with phase_timer.span('decode', round=curr_round):
+                            _stripe_store.value(commitment_leader)
+                    if _stripe_store.valid(commitment_leader):
+                        _vc_i_queue.put(commitment_leader)
+                        voted = True
+                        flag_event.set()
+                    elif _stripe_store.value(commitment_leader) is None:
+                        if logger: logger.warning("failed to decode 2")
+                    else:
+                        if logger: logger.warning("predicate failed")
+
+            def take_unverified(commitment: bytes):
+                for i, (_commitment, erase_code) in list(unverified.items()):
+                    if _commitment != commitment:
+                        continue
+                    del unverified[i]
+                    if vc_cache.verify(erase_code, commitment, None, i):
+                        take(i, commitment, erase_code)
 
             while True:
-                sender, (
+                sender, msg = _value_queue.get()
+                if sender is _SHARED_PROOF:
+                    take_unverified(msg)
+                    if len(received_sender) == N and not unverified:
+                        break
+                    continue
+                (
                     k, l, i,
                     commitment_leader,
                     erase_code_leader_i,
                     pi_leader_i
-                ) = _value_queue.get()
+                ) = msg
+
+                if scheme.shared_proof and erase_code_leader_i is None and commitment_leader is not None:
+                    # not a VALUE, the list asked for with a bot VALUE
+                    if k == curr_round and vc_cache.learn(commitment_leader, pi_leader_i):
+                        if commitment_leader in shared_proof_known:
+                            shared_proof_known[commitment_leader].set()
+                        take_unverified(commitment_leader)
+                    continue
 
                 first_time_seeing_sender = sender not in received_sender
                 received_sender.add(sender)
@@ -499,7 +661,9 @@ def run_hmvba(
                     continue
 
                 if commitment_leader is None:
-                    if leader == pid:
+                    if scheme.shared_proof:
+                        send_shared_proof(sender)
+                    if my_leader == pid:
                         # this may only happen if the leader has not yet received (N-f) ECHO messages
                         # check if sender has ECHOed
                         if not _echo_queues[sender].empty():
@@ -512,49 +676,32 @@ def run_hmvba(
                 assert sender == i
                 assert my_leader == l
 
-                if not verify_merkle_branch(N, erase_code_leader_i, commitment_leader, pi_leader_i, i):
-                    if logger: logger.warning(f"verification failed! value sender{sender} round{curr_round}")
+                if pi_leader_i is None and scheme.shared_proof and not vc_cache.knows(commitment_leader):
+                    # the list comes with the leader's DIFFUSION or on request
+                    unverified[i] = (commitment_leader, erase_code_leader_i)
+                    if commitment_leader not in shared_proof_known:
+                        shared_proof_known[commitment_leader] = Event()
+                        _t = gevent.spawn(wait_shared_proof, commitment_leader)
+                        put_thread(_t)
                     continue
 
-                _store_dict[commitment_leader].append((i, erase_code_leader_i))
-                new_store_ready.set()
-
-                if logger: logger.debug(
-                    f'leader {l} commit {commitment_leader[:10]} has length {len(_store_dict[commitment_leader])}')
+                if not vc_cache.verify(erase_code_leader_i, commitment_leader, pi_leader_i, i):
+                    if logger: logger.warning(f"verification failed! value sender{sender} round{curr_round}")
+                    continue
 
-                # TODO: upon?
-                if len(_store_dict[commitment_leader]) >= N - 3 * f:
-                    stripes = [None] * N
-                    for idx, commitment_idx in _store_dict[commitment_leader]:
-                        stripes[idx] = commitment_idx
-                    # decode
-                    decoded_msg = None
-                    try:
-                        decoded_msg = decode(f + 1, N, stripes)
-                        _M_i_queue.put(decoded_msg)
-                    except ValueError as e:
-                        if logger: logger.warning("failed to decode 2")
-                        if logger: logger.warning(str(e))
-                    if predicate(decoded_msg):
-                        _vc_i_queue.put(commitment_leader)
-                        flag_event.set()
-                    else:
-                        if logger: logger.warning("predicate failed")
+                take(i, commitment_leader, erase_code_leader_i)
 
-                if len(received_sender) == N:
+                if len(received_sender) == N and not unverified:
                     if logger: logger.warning("force exit since received N VALUE msgs")
                     break # TODO: check this
 
-            upon_receiving_first_value_from_i_time = time.time() - upon_receiving_first_value_from_i_time
-            if logger: logger.debug(
-                f'upon_receiving_first_value_from_i_time time:{upon_receiving_first_value_from_i_time}')
-
         def upon_flag(_round_k: int, flag_event: Event,
-                      _M_i_queue: Queue,
                       _vc_i_queue: Queue,
                       output_func: Callable,
-                      _store_dict: Dict[bytes, List[Tuple[int, bytes]]]):
+                      _stripe_store: StripeStore,
+                      value_collection: int):
             flag_event.wait()  # blocking
+            phase_timer.stop(value_collection)
             if logger: logger.info('flag is up')
             try:
                 # v is VC^{(i)}
@@ -564,55 +711,40 @@ def run_hmvba(
                 _vc_i = NULL
             if _vc_i is None: _vc_i = NULL
 
-            mba_time = time.time()
-            vc_prime = mba(_round_k, _vc_i)  # blocking
-            mba_time = time.time() - mba_time
-            if logger: logger.info(f'mba time:{mba_time}')
-            # print(f'{pmvba_prefix}:{round_k} mba time:{mba_time}', flush=True)
+            with phase_timer.span('mba', round=_round_k):
+                vc_prime = mba(_round_k, _vc_i)  # blocking
 
             if vc_prime != NULL:
-                if vc_prime == _vc_i:
-                    M_i = _M_i_queue.get()
-                    output_func(M_i)                
-                    if logger: logger.info(f'output {M_i[:40]}')
-                    return True
-                else:
+                if vc_prime != _vc_i:
                     # TODO
                     if logger: logger.warning(f'VC\' is NULL')
-                    while True:
-                        new_store_ready.wait()
-                        new_store_ready.clear()
-                        if len(_store_dict[vc_prime]) >= f + 1:
-                            break
-                        
-                    stripes = [None] * N
-                    for idx, commitment_idx in _store_dict[vc_prime]:
-                        stripes[idx] = commitment_idx
-                    # decode
-                    decoded_msg = None
-                    try:
-                        decoded_msg = decode(f + 1, N, stripes)
-                        output_func(decoded_msg)
-                        return True
-                    except ValueError as e:
-                        if logger: logger.warning("failed to decode 3")
-                        if logger: logger.warning(str(e))
+                while not _stripe_store.decodable(vc_prime):
+                    new_store_ready.wait()
+                    new_store_ready.clear()
+
+                # decode, unless the VALUE handler already did
+                if not _stripe_store.decoded(vc_prime):
+                    with phase_timer.span('decode', round=_round_k):
+                        _stripe_store.value(vc_prime)
+                M_i = _stripe_store.value(vc_prime)
+                if M_i is None:
+                    if logger: logger.warning("failed to decode 3")
+                else:
+                    output_func(M_i)
+                    if logger: logger.info(f'output {M_i[:40]}')
+                    return True
             else:
                 if logger: logger.warning(f'no output, try again')
                 return False
 
-        for round_k in range(N):  # TODO
-            if round_k > 0:
-                if logger: logger.warning(f'oh no, this is round {round_k}')
-            # leader election
-            elect_time = time.time()
-            leader = elect(round_k)
-            # if logger: logger.info(f'leader is {leader}')
-            elect_time = time.time() - elect_time
-            if logger: logger.debug(f'elect time:{elect_time}')
+        # round -> (leader, flag, VC^{(i)} queue, value collection span), one per round
+        value_rounds = dict()
+        value_collectors = []
 
-            M_i_queue = Queue()
-            vc_i_queue = Queue()
+        def start_value_round(k: int, prefetched: bool = False):
+            # leader election
+            with phase_timer.span('election', round=k):
+                leader = elect(k)
 
             S_leader = (leader, None, None, None)
             _time = time.time_ns()
@@ -622,32 +754,57 @@ def run_hmvba(
                 _time = (_time + time.time_ns()) // 2
                 if logger: logger.warning(f'leader {leader} is None! {S.keys()} (at {_time})')
 
-            _t = gevent.spawn(multicast_value_all, round_k, leader, S_leader)
+            flag = Event()
+            vc_i_queue = Queue()
+            value_collection = phase_timer.start('value_collection', round=k, prefetched=prefetched)
+            _t = gevent.spawn(multicast_value_all, k, leader, S_leader)
             send_threads.put_nowait(_t)
             _t.join() # do not kill sending thread
 
             _t = gevent.spawn(upon_receiving_first_value_from_i,
-                              leader, round_k,
+                              leader, k,
                               echo_recvs,
-                              value_queues[round_k], _store_dict, flag, M_i_queue,
+                              value_queues[k], _stripe_store, flag,
                               vc_i_queue
                               )
             put_thread(_t)
+            value_collectors.append(_t)
+            value_rounds[k] = (leader, flag, vc_i_queue, value_collection)
 
-            if upon_flag(round_k, flag, M_i_queue, vc_i_queue, output, _store_dict):
+        for round_k in range(N):  # TODO
+            if round_k > 0:
+                if logger: logger.warning(f'oh no, this is round {round_k}')
+            if round_k not in value_rounds:
+                start_value_round(round_k)
+            # S is fixed after abandon, so the VALUE of a later round may go out
+            # now. With the hash election its leader is known in advance, and a
+            # round that follows a failed one can start its MBA right away; it
+            # costs up to prefetch extra VALUE broadcasts if this round outputs
+            for k in range(round_k + 1, min(round_k + 1 + prefetch, N)):
+                if k not in value_rounds:
+                    start_value_round(k, prefetched=True)
+            leader, flag, vc_i_queue, value_collection = value_rounds.pop(round_k)
+            # if logger: logger.info(f'leader is {leader}')
+            if upon_flag(round_k, flag, vc_i_queue, output, _stripe_store, value_collection):
                 if logger: logger.info(f"end of protocol {pmvba_prefix} at round {round_k}")
+                if logger: logger.info(f'phases: {phase_timer.durations()}')
+                # the VALUE messages of this and earlier rounds are sent, the
+                # stripes are of no more use
+                gevent.killall(value_collectors, block=False)
+                S.clear()
+                buffer_meter.release_all('diffusion')
+                _stripe_store.clear()
+                if election is not None:
+                    election.discard(pmvba_prefix)
+                if logger: logger.info(f'buffers: {buffer_meter.snapshot()}')
                 return  # TODO
 
-            # no need to clear M_i_queue and vc_i_queue
-            # because they are local variables
-            flag.clear()
-            _store_dict.clear()
-            # gevent.spawn(upon_flag, k, flag, M_i_queue, output, store_dict)
+            # stripe_store keeps decoded values in case the leader is elected again
 
         if logger: logger.warning('no output?!')
 
     # upon_receiving_N_minus_f_finish(finish_recvs, value_recvs, output_queue.put_nowait, store)
-    _t = gevent.spawn(upon_receiving_N_minus_f_finish, finish_recvs, value_recvs, output_queue.put_nowait, store_dict)
+    _t = gevent.spawn(upon_receiving_N_minus_f_finish, finish_recvs, value_recvs, output_queue.put_nowait, stripe_store)
     put_thread(_t)
 
     spawn_time = time.time() - spawn_time
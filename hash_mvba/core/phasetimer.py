@@ -0,0 +1,80 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, IO, List
+
+
+class PhaseTimer:
+    """Named spans over the phases of one protocol instance.
+
+    Timestamps come from a monotonic clock and are stored relative to the
+    creation of the timer, so spans of the same instance can be compared
+    with each other, and the spans of different nodes line up up to the
+    skew of their start. A phase may be recorded several times (e.g. once
+    per election round); extra attributes such as ``round`` tell the
+    records apart.
+
+    Usage::
+
+        timer = PhaseTimer('sid:0')
+        with timer.span('dispersal'):
+            ...
+        token = timer.start('value_collection', round=0)
+        ...
+        timer.stop(token)
+        timer.dump(fp, node=pid)
+    """
+
+    def __init__(self, instance: str = '', clock: Callable[[], float] = time.monotonic):
+        self.instance = instance
+        self._clock = clock
+        self.origin = clock()
+        self.spans: List[dict] = []
+
+    def start(self, phase: str, **attrs) -> int:
+        """Opens a span and returns the token to ``stop`` it with."""
+        self.spans.append({'phase': phase, 'start': self._clock() - self.origin, 'end': None, **attrs})
+        return len(self.spans) - 1
+
+    def stop(self, token: int) -> float:
+        """Closes the span of ``token`` and returns its duration.
+
+        Closing a span twice keeps the first end.
+        """
+        span = self.spans[token]
+        if span['end'] is None:
+            span['end'] = self._clock() - self.origin
+        return span['end'] - span['start']
+
+    def annotate(self, token: int, **attrs):
+        """Adds attributes to the span of ``token``, e.g. an outcome only known at its end."""
+        self.spans[token].update(attrs)
+
+    @contextmanager
+    def span(self, phase: str, **attrs):
+        token = self.start(phase, **attrs)
+        try:
+            yield
+        finally:
+            self.stop(token)
+
+    def durations(self) -> Dict[str, float]:
+        """:return: the total time of every phase over its closed spans"""
+        total = dict()
+        for span in self.spans:
+            if span['end'] is None: continue
+            total[span['phase']] = total.get(span['phase'], 0.0) + span['end'] - span['start']
+        return total
+
+    def records(self, **extra) -> List[dict]:
+        """:return: one record per closed span, tagged with the instance and ``extra``"""
+        return [
+            {'instance': self.instance, **extra, **span, 'duration': span['end'] - span['start']}
+            for span in self.spans if span['end'] is not None
+        ]
+
+    def dump(self, fp: IO[str], **extra):
+        """Writes the closed spans to ``fp`` as JSON lines."""
+        for record in self.records(**extra):
+            fp.write(json.dumps(record) + '\n')
+        fp.flush()
@@ -0,0 +1,94 @@
+from typing import Any, Iterator, List, Tuple
+
+import gevent
+
+# set to True to make every SenderTable assert single-hub access
+check_owner = False
+
+_UNSET = object()
+
+
+class SenderTable:
+    """Per-sender state of one protocol instance, one slot per node.
+
+    Reads like a dict keyed by sender id, backed by a list of ``N`` slots.
+    A slot that was never assigned is not ``in`` the table; reading it
+    raises ``KeyError``, or returns ``default`` when the table has one, so
+    ``SenderTable(N, default=None)`` also stands in for ``[None] * N``.
+
+    Concurrency contract: a table is only used by greenlets of the hub it
+    was created on. Greenlets switch only when they block and no method
+    blocks, so every operation is atomic without a lock. With ``debug``
+    (or the module-level ``check_owner``) every access asserts that it runs
+    on the creating hub.
+
+    Usage::
+
+        S = SenderTable(N)
+        S[j] = (j, commitment_j, stripe_j, branch_j)
+        if leader in S:
+            ...
+    """
+
+    __slots__ = ('_slots', '_len', '_default', '_owner')
+
+    def __init__(self, N: int, default: Any = _UNSET, debug: bool = None):
+        self._slots: List[Any] = [_UNSET] * N
+        self._len = 0
+        self._default = default
+        if debug is None:
+            debug = check_owner
+        self._owner = gevent.get_hub() if debug else None
+
+    def _check(self):
+        assert gevent.get_hub() is self._owner, 'SenderTable used outside the hub that created it'
+
+    def __getitem__(self, j: int):
+        if self._owner is not None: self._check()
+        value = self._slots[j]
+        if value is _UNSET:
+            if self._default is _UNSET:
+                raise KeyError(j)
+            return self._default
+        return value
+
+    def __setitem__(self, j: int, value):
+        if self._owner is not None: self._check()
+        if self._slots[j] is _UNSET:
+            self._len += 1
+        self._slots[j] = value
+
+    def __delitem__(self, j: int):
+        if self._owner is not None: self._check()
+        if self._slots[j] is _UNSET:
+            raise KeyError(j)
+        self._slots[j] = _UNSET
+        self._len -= 1
+
+    def __contains__(self, j) -> bool:
+        if self._owner is not None: self._check()
+        return isinstance(j, int) and 0 <= j < len(self._slots) and self._slots[j] is not _UNSET
+
+    def __len__(self) -> int:
+        return self._len
+
+    def clear(self):
+        if self._owner is not None: self._check()
+        self._slots = [_UNSET] * len(self._slots)
+        self._len = 0
+
+    def get(self, j: int, default=None):
+        value = self._slots[j] if j in self else _UNSET
+        return default if value is _UNSET else value
+
+    def keys(self) -> List[int]:
+        return [j for j, value in enumerate(self._slots) if value is not _UNSET]
+
+    def items(self) -> Iterator[Tuple[int, Any]]:
+        return ((j, value) for j, value in enumerate(self._slots) if value is not _UNSET)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.keys())
+
+    def __repr__(self):
+        return f'SenderTable({dict(self.items())})'
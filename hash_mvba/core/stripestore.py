@@ -0,0 +1,112 @@
+from typing import Callable, Dict, List, Optional
+
+from crypto.erasure_coding import decode as _decode
+from hash_mvba.core.buffermeter import BufferMeter
+
+
+class _Entry:
+    __slots__ = ('stripes', 'count', 'decoded', 'value', 'valid')
+
+    def __init__(self, N: int):
+        self.stripes: List[Optional[bytes]] = [None] * N
+        self.count = 0
+        self.decoded = False
+        self.value: Optional[bytes] = None
+        self.valid = False
+
+
+class StripeStore:
+    """The verified stripes of every value committed to in one instance.
+
+    Each commitment owns a fixed array of ``N`` slots, so the stripe of a
+    node is stored once however often it arrives. As soon as ``K`` slots are
+    filled the value can be decoded; ``value`` decodes it on first use and
+    ``valid`` runs the predicate on it once, later calls return the cached
+    results. Stripes must have been verified against the commitment before
+    they are added.
+
+    With a ``meter`` the bytes of the stripes and decoded values held are
+    counted as kind ``'value'``; decoding releases the stripes. Decoded
+    values stay until ``clear``, in case their leader is elected again;
+    ``run_hmvba`` clears the store once the instance outputs.
+
+    Usage::
+
+        store = StripeStore(N, f + 1, predicate)
+        store.add(commitment, i, stripe)
+        if store.decodable(commitment) and store.valid(commitment):
+            output(store.value(commitment))
+    """
+
+    def __init__(self, N: int, K: int, predicate: Callable = lambda x: True, decode: Callable = _decode,
+                 meter: BufferMeter = None):
+        self.N = N
+        self.K = K
+        self.predicate = predicate
+        self._decode = decode
+        self._meter = meter
+        self._entries: Dict[bytes, _Entry] = dict()
+
+    def add(self, commitment: bytes, index: int, stripe: bytes) -> int:
+        """Stores the stripe of node ``index``.
+
+        :return: the number of stripes held for ``commitment``
+        """
+        entry = self._entries.get(commitment)
+        if entry is None:
+            entry = self._entries[commitment] = _Entry(self.N)
+        elif entry.decoded:
+            # more stripes are of no use
+            return entry.count
+        if entry.stripes[index] is None:
+            entry.stripes[index] = stripe
+            entry.count += 1
+            if self._meter is not None:
+                self._meter.add('value', len(stripe))
+        return entry.count
+
+    def count(self, commitment: bytes) -> int:
+        entry = self._entries.get(commitment)
+        return 0 if entry is None else entry.count
+
+    def decodable(self, commitment: bytes) -> bool:
+        return self.count(commitment) >= self.K
+
+    def decoded(self, commitment: bytes) -> bool:
+        entry = self._entries.get(commitment)
+        return entry is not None and entry.decoded
+
+    def value(self, commitment: bytes) -> Optional[bytes]:
+        """The value of ``commitment``, decoded once from its first ``K`` stripes.
+
+        :return: ``None`` while fewer than ``K`` stripes are held, or if
+            they do not decode
+        """
+        entry = self._entries.get(commitment)
+        if entry is None or entry.count < self.K:
+            return None
+        if not entry.decoded:
+            entry.decoded = True
+            try:
+                entry.value = self._decode(self.K, self.N, entry.stripes)
+            except ValueError:
+                entry.value = None
+            entry.valid = entry.value is not None and bool(self.predicate(entry.value))
+            # the stripes are not needed once the value is known
+            if self._meter is not None:
+                self._meter.release('value', sum(len(s) for s in entry.stripes if s is not None))
+                if entry.value is not None:
+                    self._meter.add('value', len(entry.value))
+            entry.stripes = None
+        return entry.value
+
+    def valid(self, commitment: bytes) -> bool:
+        """Whether the value of ``commitment`` decodes and satisfies the predicate."""
+        self.value(commitment)
+        entry = self._entries.get(commitment)
+        return entry is not None and entry.valid
+
+    def clear(self):
+        self._entries.clear()
+        if self._meter is not None:
+            self._meter.release_all('value')
@@ -0,0 +1,167 @@
+"""Streaming of the DIFFUSION stripes of H-MVBA.
+
+With ``stream_chunk`` a node sends each of its stripes as a head and
+chunks of that many bytes (``stream_messages``) instead of one DIFFUSION,
+so the receiver hashes the stripe while it arrives. A ``StripeAssembler``
+puts the chunks back together and verifies the stripe against the
+commitment as soon as its last chunk is in; ``run_hmvba`` then ECHOes it
+like a whole DIFFUSION. All nodes stream with the same chunk size.
+"""
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+# sequence number of the head of a stream, chunks count from 0
+HEAD = -1
+# chunks kept per sender while its head has not arrived
+MAX_EARLY_CHUNKS = 64
+# chunks kept per stream ahead of the next one to hash
+MAX_PENDING_CHUNKS = 64
+# bytes an erasure coding backend may add to a stripe: zfec's padding,
+# pyeclib's fragment header and alignment
+STRIPE_OVERHEAD = 1024
+
+
+def max_stripe_length(N: int, f: int, max_proposal: int) -> int:
+    """The longest stripe of the (f + 1, N) code of a proposal of up to ``max_proposal`` bytes."""
+    return -(-max_proposal // (f + 1)) + STRIPE_OVERHEAD
+
+
+def stream_messages(commitment: bytes, stripe: bytes, branch, chunk_size: int) -> List[Tuple[int, object]]:
+    """Splits one DIFFUSION into a head and the chunks of its stripe.
+
+    The head ``(HEAD, (commitment, branch, length, chunks))`` goes first, so
+    the receiver can set up the stream before the first chunk arrives; the
+    chunks follow as ``(seq, bytes)``.
+    """
+    length = len(stripe)
+    chunks = max(1, -(-length // chunk_size))
+    messages = [(HEAD, (commitment, branch, length, chunks))]
+    view = memoryview(stripe)
+    for seq in range(chunks):
+        messages.append((seq, bytes(view[seq * chunk_size:(seq + 1) * chunk_size])))
+    return messages
+
+
+class _Stream:
+    __slots__ = ('commitment', 'branch', 'length', 'chunks', 'next', 'pending', 'hasher', 'parts')
+
+    def __init__(self, commitment, branch, length, chunks):
+        self.commitment = commitment
+        self.branch = branch
+        self.length = length
+        self.chunks = chunks
+        self.next = 0
+        self.pending: Dict[int, bytes] = dict()
+        self.hasher = hashlib.sha256()
+        self.parts: List[bytes] = []
+
+
+class StripeAssembler:
+    """Reassembles streamed DIFFUSION stripes and verifies them on the fly.
+
+    Chunks are hashed in order as they arrive, so once the last one is in
+    only the branch is left to check, against the digest of the stream
+    (``verifier.verify_digest``). Chunks that arrive ahead of their turn,
+    or before the head, wait in a buffer. The chunks are joined once, into
+    the stripe that is handed on.
+
+    One stream per sender is accepted; a stream whose head or chunks do not
+    add up, or whose digest does not verify, is dropped.
+
+    The buffers of a sender are bounded: the head must announce at most
+    ``max_length`` bytes (``None`` for no bound), in ``ceil(length /
+    chunk_size)`` chunks, every chunk must have the size its place in the
+    stripe gives it, and at most ``MAX_EARLY_CHUNKS`` / ``MAX_PENDING_CHUNKS``
+    chunks wait before the head / ahead of their turn. All nodes stream
+    with the same ``chunk_size``, see ``stream_messages``.
+    """
+
+    def __init__(self, index: int, verifier, chunk_size: int, max_length: Optional[int] = None):
+        self.index = index
+        self.verifier = verifier
+        self.chunk_size = chunk_size
+        self.max_length = max_length
+        self._streams: Dict[int, _Stream] = dict()
+        self._early: Dict[int, Dict[int, bytes]] = dict()
+        self._done = set()
+
+    def clear(self):
+        """Drops every stream still being assembled."""
+        self._done.update(self._streams, self._early)
+        self._streams.clear()
+        self._early.clear()
+
+    def feed(self, sender: int, seq: int, payload) -> Optional[Tuple[bytes, bytes, object]]:
+        """Takes one message of the stream of ``sender``.
+
+        :return: ``(commitment, stripe, branch)`` when this message completes
+            a stripe that verifies, otherwise ``None``
+        """
+        if sender in self._done:
+            return None
+        stream = self._streams.get(sender)
+        if seq == HEAD:
+            if stream is not None:
+                return None
+            try:
+                commitment, branch, length, chunks = payload
+            except (TypeError, ValueError):
+                commitment = length = chunks = None
+            if not self._valid_head(length, chunks):
+                self._done.add(sender)
+                self._early.pop(sender, None)
+                return None
+            stream = self._streams[sender] = _Stream(commitment, branch, length, chunks)
+            early = self._early.pop(sender, None)
+            if early:
+                stream.pending.update((s, c) for s, c in early.items()
+                                      if s < chunks and len(c) == self._chunk_length(stream, s))
+            return self._advance(sender, stream)
+        if not isinstance(seq, int) or seq < 0 or not isinstance(payload, bytes):
+            return None
+        if stream is None:
+            # the head is still on its way
+            early = self._early.setdefault(sender, dict())
+            if len(early) < MAX_EARLY_CHUNKS and len(payload) <= self.chunk_size:
+                early.setdefault(seq, payload)
+            return None
+        if seq < stream.next or seq >= stream.chunks or seq in stream.pending:
+            return None
+        if len(payload) != self._chunk_length(stream, seq):
+            # would not add up to the announced length
+            return None
+        if seq != stream.next and len(stream.pending) >= MAX_PENDING_CHUNKS:
+            return None
+        stream.pending[seq] = payload
+        return self._advance(sender, stream)
+
+    def _valid_head(self, length, chunks) -> bool:
+        if not (isinstance(length, int) and isinstance(chunks, int) and 0 <= length):
+            return False
+        if self.max_length is not None and length > self.max_length:
+            return False
+        return self.chunk_size > 0 and chunks == max(1, -(-length // self.chunk_size))
+
+    def _chunk_length(self, stream: _Stream, seq: int) -> int:
+        if seq < stream.chunks - 1:
+            return self.chunk_size
+        return stream.length - (stream.chunks - 1) * self.chunk_size
+
+    def _advance(self, sender: int, stream: _Stream):
+        pending = stream.pending
+        while stream.next in pending:
+            chunk = pending.pop(stream.next)
+            stream.hasher.update(chunk)
+            stream.parts.append(chunk)
+            stream.next += 1
+        if stream.next < stream.chunks:
+            return None
+
+        del self._streams[sender]
+        self._done.add(sender)
+        stripe = b''.join(stream.parts) if len(stream.parts) > 1 else stream.parts[0]
+        if len(stripe) != stream.length:
+            return None
+        if not self.verifier.verify_digest(stream.hasher.digest(), stream.commitment, stream.branch, self.index):
+            return None
+        return stream.commitment, stripe, stream.branch
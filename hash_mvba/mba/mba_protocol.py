@@ -27,6 +27,7 @@ import socket
 import time
 import gevent
 from gevent.queue import Queue
+from gevent.event import AsyncResult
 from gevent import monkey
 
 monkey.patch_all(thread=False)
@@ -40,12 +41,8 @@ from honeybadgerbft.exceptions import UnknownTagError
 # from honeybadgerbft.core.binaryagreement import binaryagreement # TODO: use with caution!
 from hash_mvba.adkg.binaryagreement import binaryagreement
 
-simple_qc = True
-
-if simple_qc:
-    from hash_mvba.core.QueueCollection import QueueCollection
-else:
-    from hash_mvba.core.QueueCollection import QueueCollectionThreads as QueueCollection
+from hash_mvba.core.QueueCollection import QuorumTracker
+from hash_mvba.core.phasetimer import PhaseTimer
 
 NULL = b'0'
 
@@ -58,7 +55,8 @@ def run_mba(
         output_queue: Queue,
         put_thread: Callable = lambda x: None,
         put_send_thread: Callable = lambda x: None,
-        logger: logging.Logger = None
+        logger: logging.Logger = None,
+        phase_timer: PhaseTimer = None
     ):
     """
     Run MBA protocol
@@ -76,7 +74,16 @@ def run_mba(
     round_input_queue.put_nowait(tx_to_send)
     result = round_output_queue.get() # None or a result
 
+    Fast path: the coin of the first ABA epoch is fixed to 1, and the value
+    that raised the flag is kept as the output candidate. When every honest
+    node saw N-2f matching ECHOs, all of them input 1 and ABA decides in
+    epoch 0, and the candidate is output at once without waiting for f+1
+    matching ECHOs again. With a ``phase_timer`` the ``aba`` span records the
+    decision, the epoch it was reached in and whether the fast path fired.
     """
+    if phase_timer is None:
+        phase_timer = PhaseTimer(f'{sid}:MBA:{r}')
+
     # logger = logging.getLogger("consensus-node-" + str(pid))
     if logger: logger.info(f'{pid} start mba!')
 
@@ -110,6 +117,11 @@ def run_mba(
 
         recv_queue = recv_queues._asdict()[tag_name]
 
+        if tag_value in (BroadcastTag.VALUE.value, BroadcastTag.ECHO.value):
+            # quorum trackers are updated in place, nobody polls them
+            recv_queue.add(sender, msg)
+            return
+
         if tag_value not in (BroadcastTag.ABA.value, BroadcastTag.RANDOM_NUMBER.value):
             recv_queue = recv_queue[j]
         recv_queue.put_nowait((sender, msg))
@@ -130,13 +142,13 @@ def run_mba(
 
     aba_input = Queue(1)  # noqa: E221
 
-    # prepare recv queues for multicast actions
-    value_recvs = [Queue() for _ in range(N)]
-    echo_recvs = [Queue() for _ in range(N)]
+    # prepare quorum trackers for multicast actions
+    value_tracker = QuorumTracker(N)
+    echo_tracker = QuorumTracker(N)
 
     recv_queues = broadcast_receiver_queues(
-        VALUE=value_recvs,
-        ECHO=echo_recvs,
+        VALUE=value_tracker,
+        ECHO=echo_tracker,
         RANDOM_NUMBER=random_number_recvs,
         ABA=aba_recv,
         ABA_COIN=aba_coin_recvs,
@@ -159,10 +171,9 @@ def run_mba(
     put_send_thread(_t)
     # put_thread(_t) # do not kill sending thread
 
-    def upon_receiving_value(value_queues):
+    def upon_receiving_value(value_qc: QuorumTracker):
         if verbose_log and logger: logger.debug(f'upon_receiving_value starts')
         value_waiting_time = time.time()
-        value_qc = QueueCollection(value_queues)
         v_prime = value_qc.get_value_at_least_k1_count_within_k2_count(
             N - 2 * f,
             N - f
@@ -185,13 +196,12 @@ def run_mba(
         if verbose_log and logger: logger.info(f'multicast_echo_all time:{multicast_echo_all_time}')
 
     # upon_receiving_value(commit_recvs)
-    _t = gevent.spawn(upon_receiving_value, value_recvs)
+    _t = gevent.spawn(upon_receiving_value, value_tracker)
     put_thread(_t)
 
-    def upon_receiving_N_minus_f_echo(echo_queues, flag: Queue):
+    def upon_receiving_N_minus_f_echo(echo_qc: QuorumTracker, flag: Queue):
         if verbose_log and logger: logger.debug(f'upon_receiving_N_minus_f_echo starts')
         upon_receiving_N_minus_f_echo_time = time.time()
-        echo_qc = QueueCollection(echo_queues)
         result = echo_qc.get_non_zero_value_at_least_k1_count_within_k2_count(
             N - 2 * f,
             N - f
@@ -207,12 +217,16 @@ def run_mba(
         elif result is None:
             flag.put_nowait(0)
         else:
+            # N-2f >= f+1 matching ECHOs, the value to output if ABA decides 1
+            candidate.set(result)
             flag.put_nowait(1)
 
+    candidate = AsyncResult()
+
     flag_queue = Queue()
 
     # upon_receiving_N_minus_f_echo(echo_recvs, flag_queue)
-    _t = gevent.spawn(upon_receiving_N_minus_f_echo, echo_recvs, flag_queue)
+    _t = gevent.spawn(upon_receiving_N_minus_f_echo, echo_tracker, flag_queue)
     put_thread(_t)
 
     def ABA(_flag_queue: Queue, _b_queue: Queue):
@@ -225,11 +239,24 @@ def run_mba(
         Run a Coin instance
         """
 
+        # the epoch of the latest coin; binaryagreement decides right after
+        # the coin of the deciding epoch, in the same greenlet
+        coin_epoch = 0
+
         # cheap coin
         def aba_coin(aba_round: int):
+            nonlocal coin_epoch
+            coin_epoch = aba_round
+            if aba_round == 0:
+                # a fixed but common coin keeps ABA safe, and lets a unanimous
+                # input of 1 decide in the first epoch
+                return 1
             seed = int.from_bytes(_hash(mba_prefix + str(aba_round)), byteorder='big') % (2 ** 10 - 1)
             return int(seed % 2)
 
+        def aba_decide(v):
+            _b_queue.put_nowait((v, coin_epoch))
+
         def aba_bcast(o):
             broadcast((BroadcastTag.ABA.value, -1, o))
 
@@ -240,7 +267,7 @@ def run_mba(
             pid, N, f,
             aba_coin,
             aba_input.get,
-            _b_queue.put_nowait,
+            aba_decide,
             aba_bcast,
             aba_recv.get,
             put_thread,
@@ -251,23 +278,30 @@ def run_mba(
         aba_overall_time = time.time() - aba_overall_time
         if verbose_log and logger: logger.info(f'aba time:{aba_overall_time}')
 
+    # (decision, epoch it was reached in)
     b_queue = Queue(1)
 
+    aba_span = phase_timer.start('aba', round=r)
     # ABA(flag_queue, b_queue)
     _t = gevent.spawn(ABA, flag_queue, b_queue)
     put_thread(_t)
 
-    b = b_queue.peek()  # blocking
-    if logger: logger.info('aba ends')
+    b, epoch = b_queue.peek()  # blocking
+    phase_timer.stop(aba_span)
+    fast_path = b == 1 and epoch == 0 and candidate.ready()
+    phase_timer.annotate(aba_span, decided=b, epoch=epoch, fast_path=fast_path)
+    if logger: logger.info(f'aba ends, decided {b} in epoch {epoch}, fast path {fast_path}')
 
     if b == 0:
         output_queue.put_nowait(NULL)
         if logger: logger.warning('oops')
         return
 
-    # upon_receiving_f_plus_1_vc_echo
-    echo_qc = QueueCollection(echo_recvs)
-    output_msg = echo_qc.get_k_matching_value(f + 1, allow_null=False)
+    if candidate.ready():
+        output_msg = candidate.get()
+    else:
+        # upon_receiving_f_plus_1_vc_echo
+        output_msg = echo_tracker.get_k_matching_value(f + 1, allow_null=False)
 
     if output_msg is None:
         if logger: logger.error(f'this is impossible!')
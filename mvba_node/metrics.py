@@ -0,0 +1,144 @@
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy
+
+
+class LocalBatchLatencyTracker:
+    """Tracks the latency of the local batches and wall-clock throughput.
+
+    The latency is that of the batch this node proposed in a round: each of
+    its transactions is stamped when it enters the transaction buffer, and
+    the latency runs from there to the decision of the round, whichever
+    node's proposal was decided. A node does not know when the transactions
+    of another proposer were ingested, so this is not the commit latency of
+    the decided batch and is reported as ``local_batch_latency_*``. It
+    covers buffering, the start-up sync sleep and any cross-round waiting,
+    not only the time spent inside one MVBA instance.
+
+    Throughput is computed from the committed transactions and bytes over the
+    wall-clock window that starts with the ingestion of the first measured
+    transaction and ends with the last decision.
+    """
+
+    PERCENTILES = (('p50', 50), ('p90', 90), ('p99', 99), ('p999', 99.9))
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.committed_tx = 0
+        self.committed_bytes = 0
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+
+    def commit(self, ingest_times: List[float], decide_time: float, tx_count: int, byte_count: int):
+        """Records the decision of a round.
+
+        :param ingest_times: ingestion timestamps of the transactions of the
+            batch this node proposed in the round
+        :param decide_time: timestamp at which the round output
+        :param tx_count: number of transactions in the decided value
+        :param byte_count: size of the decided value in bytes
+        :return: the latency percentiles of the local batch
+        """
+        # the decided value may be another node's batch; count at most as
+        # many local stamps as it carries transactions
+        ingest_times = ingest_times[:tx_count]
+        if ingest_times:
+            first = min(ingest_times)
+            if self.start_time is None or first < self.start_time:
+                self.start_time = first
+        batch = [decide_time - t for t in ingest_times]
+        self.latencies.extend(batch)
+        self.committed_tx += tx_count
+        self.committed_bytes += byte_count
+        self.end_time = decide_time
+        return self._percentiles(batch)
+
+    def wall_clock(self) -> float:
+        if self.start_time is None or self.end_time is None:
+            return 0.0
+        return self.end_time - self.start_time
+
+    def throughput(self):
+        """:return: committed transactions and bytes per wall-clock second"""
+        elapsed = self.wall_clock()
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return self.committed_tx / elapsed, self.committed_bytes / elapsed
+
+    def percentiles(self) -> Dict[str, float]:
+        return self._percentiles(self.latencies)
+
+    @classmethod
+    def _percentiles(cls, latencies: List[float]) -> Dict[str, float]:
+        if not latencies:
+            return {name: 0.0 for name, _ in cls.PERCENTILES}
+        values = numpy.percentile(latencies, [q for _, q in cls.PERCENTILES])
+        return {name: float(v) for (name, _), v in zip(cls.PERCENTILES, values)}
+
+
+def peak_rss() -> int:
+    """:return: the peak resident set size of the process in bytes, 0 if unknown"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+class RunMetrics:
+    """Per-round and per-run metrics of a node, written as a single JSON file.
+
+    Replaces scraping the final stdout line: every measured round contributes
+    a record with its latency, committed transactions and bytes, the CPU time
+    the process spent on it and the peak RSS so far, and the run summary holds
+    the same aggregates as the stdout line.
+    """
+
+    def __init__(self, pid: int, **config):
+        self.pid = pid
+        self.config = config
+        self.rounds: List[dict] = []
+        self._cpu_mark = time.process_time()
+        self._cpu_start = self._cpu_mark
+
+    def start_round(self):
+        self._cpu_mark = time.process_time()
+
+    def record_round(self, epoch: int, latency: float, tx_count: int, byte_count: int, **extra):
+        cpu = time.process_time()
+        self.rounds.append({
+            'epoch': epoch,
+            'latency': latency,
+            'tx': tx_count,
+            'bytes': byte_count,
+            'cpu_time': cpu - self._cpu_mark,
+            'peak_rss': peak_rss(),
+            **extra,
+        })
+        self._cpu_mark = cpu
+
+    def write(self, path: str, **summary):
+        buffer_peaks = [r['peak_buffer_bytes'] for r in self.rounds if 'peak_buffer_bytes' in r]
+        if buffer_peaks:
+            summary['peak_buffer_bytes'] = max(buffer_peaks)
+        document = {
+            'node': self.pid,
+            **self.config,
+            'summary': {
+                **summary,
+                'cpu_time': time.process_time() - self._cpu_start,
+                'peak_rss': peak_rss(),
+            },
+            'rounds': self.rounds,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(document, f)
+        # never leave a half-written file behind for the parsers
+        os.replace(tmp_path, path)
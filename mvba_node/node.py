@@ -8,6 +8,7 @@ def print(*args, **kwargs):
 
 from collections import defaultdict, namedtuple
 from ctypes import c_bool
+import inspect
 import logging
 import os
 from typing import Callable, Dict
@@ -45,6 +46,16 @@ except ImportError:
     import pickle
 
 from mvba_node.make_random_tx import random_tx_generator, pseudo_random_tx_generator
+from mvba_node.metrics import LocalBatchLatencyTracker, RunMetrics
+from mvba_node.router import FRAMES_PER_SENDER, RoundRouter
+from mvba_node.taskgroup import TaskGroup
+from hash_mvba.core.phasetimer import PhaseTimer
+from hash_mvba.core.buffermeter import BufferMeter
+from hash_mvba.core.stripestream import max_stripe_length
+from crypto import erasure_coding
+from crypto.coding_pool import CodingPool
+from hash_mvba.core.election import ElectionService, load_keys
+from network.frame import PickledFrame
 
 def set_consensus_log(id: int):
     logger = logging.getLogger("consensus-node-" + str(id))
@@ -60,6 +71,26 @@ def set_consensus_log(id: int):
     return logger
 
 
+def open_phase_log(id: int):
+    if 'log' not in os.listdir(os.getcwd()):
+        os.makedirs(os.getcwd() + '/log', exist_ok=True)
+    full_path = os.path.realpath(os.getcwd()) + '/log/' + "phases-node-" + str(id) + ".jsonl"
+    return open(full_path, 'a')
+
+
+def metrics_path(id: int):
+    if 'log' not in os.listdir(os.getcwd()):
+        os.makedirs(os.getcwd() + '/log', exist_ok=True)
+    return os.path.realpath(os.getcwd()) + '/log/' + "metrics-node-" + str(id) + ".json"
+
+
+def accepts_argument(func: Callable, name: str) -> bool:
+    try:
+        return name in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
 class MVBA():
     def __init__(
             self,
@@ -73,7 +104,15 @@ class MVBA():
             mode='debug',
             mute=False,
             debug=False,
-            mvba_func=None
+            mvba_func=None,
+            ec_backend='zfec',
+            coding_workers=None,
+            prepare_func=None,
+            commitment_scheme='merkle',
+            stream_chunk=0,
+            prefetch=0,
+            election='hash',
+            dispersal='full'
         ):
         self.bft_from_server = bft_from_server
         self.bft_to_client = bft_to_client
@@ -87,8 +126,8 @@ class MVBA():
         self.K = K
         self.countpoint = countpoint
         self.logger = set_consensus_log(pid)
-        self.round_threads: Dict[int, Queue] = defaultdict(Queue)
-        self.round_stops: Dict[int, Event] = defaultdict(Event)
+        self.round_tasks: Dict[int, TaskGroup] = defaultdict(TaskGroup)
+        self.task_stats = list()
 
         self.sid = sid
         self.pid = pid
@@ -99,8 +138,11 @@ class MVBA():
         self.round = 0  # Current block number
         self.transaction_buffer = Queue()
         # self.transaction_buffer = TransactionBuffer(batch_size=self.B)
-        self._per_round_recv = {}  # Buffer of incoming messages
-        self._per_round_recv['sys'] = Queue()
+        frames_per_sender = FRAMES_PER_SENDER
+        if stream_chunk:
+            # the head and chunks of a streamed DIFFUSION, see prepare_round
+            frames_per_sender += 1 + -(-max_stripe_length(N, f, 251 * B) // stream_chunk)
+        self.router = RoundRouter(N, frames_per_sender=frames_per_sender, logger=self.logger)  # Buffer of incoming messages
 
         self.latency_list = list()
         self.tp_list = list()
@@ -108,14 +150,48 @@ class MVBA():
         self.total_latency = 0
         self.total_tx = 0
 
+        # latency from ingestion of the local batch to the decision of its round
+        self.batch_tracker = LocalBatchLatencyTracker()
+
         self.mvba_func = mvba_func
+
+        # erasure coding backend, 'auto' lets node 0 pick and announce it
+        self.ec_backend = ec_backend
+        self.ec_timings = dict()
         self.sync_events: Dict[int, Event] = defaultdict(Event)
+        # set once the backend of node 0 is known, no proposal is encoded before
+        self.ec_settled = Event()
+
+        # worker threads for encoding the own proposal, one per core by default
+        self.coding_workers = coding_workers
+        self.coding_pool = None
+        # leader election, 'hash' or 'threshold' with the keys of run_trusted_key_gen.py
+        self.election = election
+        self.election_service = None
+
+        # prepares the proposal of round r + 1 while round r runs, see
+        # hash_mvba.core.hmvba_protocol.prepare_proposal
+        self.prepare_func = prepare_func
+        self.prepared: Dict[int, gevent.Greenlet] = dict()
+        self.commitment_scheme = commitment_scheme
+        # stream the own DIFFUSION stripes in chunks of this many bytes, 0 for off
+        self.stream_chunk = stream_chunk
+        # election rounds whose VALUE stripes are collected ahead of their MBA
+        self.prefetch = prefetch
+        # dispersal of the FIN proposals, 'full' or 'avid'
+        self.dispersal = dispersal
+
+        # per-instance phase breakdown, written as JSON lines
+        self.phase_timers: Dict[int, PhaseTimer] = dict()
+        # bytes held in the buffers of every instance, see BufferMeter
+        self.buffer_meters: Dict[int, BufferMeter] = dict()
+        self.phase_log = None
 
     def submit_tx(self, tx):
         """Appends the given transaction to the transaction buffer.
         :param tx: Transaction to append to the buffer.
         """
-        self.transaction_buffer.put_nowait(tx)
+        self.transaction_buffer.put_nowait((tx, time.time()))
 
     def buffer_size(self):
         return self.transaction_buffer.qsize()
@@ -136,16 +212,53 @@ class MVBA():
 
         self.logger.info('node id %d completed the loading of dummy TXs' % (self.pid))
 
-    def round_thread_cleanup(self):
-        for r in range(self.K + self.countpoint):
-            self.round_stops[r].wait()
-            gevent.sleep(0)
-            while True:
-                try:
-                    t = self.round_threads[r].get_nowait()
-                    t.kill()
-                except Empty:
-                    break
+    def round_cleanup(self, r):
+        """Tears down every greenlet and buffer of the decided round ``r``."""
+        gevent.sleep(0)
+        tasks = self.round_tasks.pop(r)
+        stats = tasks.close()
+        self.sync_events.pop(r, None)
+        self.router.release(r)
+        self.dump_phases(r)
+
+        self.task_stats.append(stats)
+        # the next round starts while the kills are delivered
+        gevent.spawn(self._report_teardown, r, tasks, stats)
+
+    def _report_teardown(self, r, tasks: TaskGroup, stats):
+        stats.update(tasks.reap())
+        self.logger.info(
+            'node: %d epoch: %d greenlets spawned: %d, peak live: %d, killed: %d, leaked: %d, teardown: %f' %
+            (self.pid, r, stats['spawned'], stats['peak'], stats['killed'], stats['leaked'], stats['teardown_time']))
+        if stats['leaked']:
+            self.logger.warning(f'{stats["leaked"]} greenlets of round {r} survived the teardown')
+
+    def select_ec_backend(self):
+        """Sets the erasure coding backend before the first round.
+
+        With ``'auto'``, node 0 benchmarks the available backends for the
+        (f+1, N) code of a full batch and announces the fastest one with the
+        start time of every round; the other nodes adopt it in ``_sync``
+        before they encode their first proposal. A node with a fixed backend
+        other than node 0's stops.
+        """
+        if self.ec_backend != 'auto':
+            erasure_coding.set_backend(self.ec_backend)
+        elif self.pid == 0:
+            # each dummy TX is 250 bytes, see round_bootstrap
+            name, self.ec_timings = erasure_coding.autotune(self.f + 1, self.N, max(250 * self.B, 1))
+            erasure_coding.set_backend(name)
+            self.logger.info(f'erasure coding autotune picked {name}: {self.ec_timings}')
+        self.logger.info(f'erasure coding backend: {erasure_coding.get_backend().name}')
+
+    def dump_phases(self, r):
+        timer = self.phase_timers.pop(r, None)
+        if timer is None or not timer.spans:
+            return
+        if self.phase_log is None:
+            self.phase_log = open_phase_log(self.pid)
+        timer.dump(self.phase_log, node=self.pid, epoch=r, N=self.N, f=self.f, B=self.B,
+                   protocol=getattr(self.mvba_func, '__name__', str(self.mvba_func)))
 
     def _run(self):
         """Run the HoneyBadgerBFT protocol."""
@@ -165,67 +278,86 @@ class MVBA():
                 except ValueError:
                     self.logger.warning('special message {raw_msg}')
                     continue
-                
-                for _old_r in range(self.round):
-                    _old_recv = self._per_round_recv[_old_r]
-                    if _old_recv:
-                        del _old_recv
-                        self._per_round_recv[_old_r] = None
-
-                # Maintain an *unbounded* recv queue for each epoch
-                if r != 'sys' and r not in self._per_round_recv:
-                    # Buffer this message
-                    assert r >= self.round  # pragma: no cover
-                    self._per_round_recv[r] = Queue()
-
-                _recv = self._per_round_recv[r]
-                if _recv is not None:
-                    # Queue it
-                    _recv.put((sender, msg))
+
+                self.router.dispatch(sender, r, msg)
 
         _recv_thread = gevent.spawn(_recv)
-        round_cleanup_thread = gevent.spawn(self.round_thread_cleanup)
+
+        self.run_metrics = RunMetrics(
+            self.pid, N=self.N, f=self.f, B=self.B, K=self.K, countpoint=self.countpoint,
+            protocol=getattr(self.mvba_func, '__name__', str(self.mvba_func)))
+
+        self.select_ec_backend()
+        self.coding_pool = CodingPool(self.coding_workers)
+        if self.election == 'threshold':
+            PK, SK = load_keys(self.pid, self.N, self.f)
+            self.election_service = ElectionService(self.pid, self.N, PK, SK)
 
         while True:
             r = self.round
 
             # self.logger.info('node id %d is running round %d' % (self.pid, r))
 
-            self.round_bootstrap(r)
-
-            if r not in self._per_round_recv:
-                self._per_round_recv[r] = Queue()
+            recv_r = self.router.start(r).get
 
-            assert self.B >= 0
-            tx_to_send = []
-            for _ in range(self.B):
-                tx_to_send.append(self.transaction_buffer.get_nowait())
-                tx_to_send.append('/')
+            sync_thread = gevent.spawn(self._sync)
+            self.ec_settled.wait()
+            if self.stop.value:
+                break
 
-            str_to_send = ''.join(tx_to_send)
-            del tx_to_send
+            # the proposal was prepared in the background during round r - 1
+            prepared = self.prepared.pop(r, None)
+            if prepared is None:
+                tx_to_send, ingest_times = self.prepare_round(r)
+            else:
+                tx_to_send, ingest_times = prepared.get()
+            # the instance owns its input from now on, it drops the proposal
+            # once dispersed
+            round_input_queue = Queue(1)
+            round_input_queue.put_nowait(tx_to_send)
+            del prepared, tx_to_send
 
             # TODO: Wait a bit if transaction buffer is not full
 
             def _make_send(r):
                 def _send(j, o):
                     self.logger.debug('send this' + str((j, self.pid, (r, o)))[:40])
-                    self.send(j, (r, o))
+                    if isinstance(o, PickledFrame):
+                        # prepared frames already carry the round
+                        self.send(j, o)
+                    else:
+                        self.send(j, (r, o))
 
                 return _send
 
             send_r = _make_send(r)
-            recv_r = self._per_round_recv[r].get
 
-            sync_thread = gevent.spawn(self._sync)
             self.sync_events[self.round].wait()
-            latency, recv_tx_len = self._run_round(r, str_to_send, send_r, recv_r)
+            if self.stop.value:
+                break
+            self.run_metrics.start_round()
+            if r + 1 < self.K + self.countpoint:
+                self.prepared[r + 1] = gevent.spawn(self.prepare_round, r + 1)
+            latency, recv_tx_len, recv_tx_bytes, decide_time = self._run_round(r, round_input_queue, send_r, recv_r)
+            del round_input_queue
+            buffer_meter = self.buffer_meters.pop(r, None)
 
             if r >= self.countpoint:
                 self.total_latency += latency
                 self.latency_list.append(latency)
                 self.total_tx += recv_tx_len
                 self.tp_list.append(recv_tx_len / latency)
+                batch_latency = self.batch_tracker.commit(ingest_times, decide_time, recv_tx_len, recv_tx_bytes)
+                self.logger.info(
+                    'node: %d epoch: %d local batch latency p50/p90/p99/p999: %f %f %f %f' %
+                    (self.pid, r, batch_latency['p50'], batch_latency['p90'],
+                     batch_latency['p99'], batch_latency['p999']))
+                self.run_metrics.record_round(
+                    r, latency, recv_tx_len, recv_tx_bytes,
+                    **{f'local_batch_latency_{name}': value for name, value in batch_latency.items()},
+                    greenlets_peak=self.task_stats[-1]['peak'] if self.task_stats else 0,
+                    **({'peak_buffer_bytes': buffer_meter.peak} if buffer_meter is not None else {}))
+            del ingest_times
 
             # gevent.sleep(2)
             # while True:
@@ -240,11 +372,25 @@ class MVBA():
             if self.round >= self.K + self.countpoint:
                 break
 
+        if self.stop.value:
+            # _sync failed, nothing was decided
+            _recv_thread.kill()
+            self.coding_pool.close()
+            if self.election_service is not None:
+                self.election_service.close()
+            return
+
         gevent.sleep(3)
         _recv_thread.kill()
-        if not round_cleanup_thread.dead:
-            self.logger.info(f'cleanup taking more then expected time')
-            round_cleanup_thread.kill()
+        self.logger.info(f'router dropped {self.router.dropped_old} stale, '
+                         f'{self.router.dropped_future} future and '
+                         f'{self.router.dropped_malformed} malformed messages, '
+                         f'{self.router.buffered_rounds()} rounds still buffered')
+        if self.phase_log is not None:
+            self.phase_log.close()
+        self.coding_pool.close()
+        if self.election_service is not None:
+            self.election_service.close()
 
         # Calculate the average latency (latency per round)
         self.a_latency = self.total_latency / self.K
@@ -253,6 +399,9 @@ class MVBA():
 
         import numpy
 
+        batch_latency = self.batch_tracker.percentiles()
+        wall_clock_tps, wall_clock_bps = self.batch_tracker.throughput()
+
         self.logger.info(  # Print average delay/throughput to the execution log
             "node: %d epoch: %d run: %f, "
             "total delivered Txs after warm-up: %d, "
@@ -260,6 +409,8 @@ class MVBA():
             "tps after warm-up: %f, "
             "average latency by rounds + stddev: %f %f, "
             "average tps by rounds + stddev: %f %f, "
+            "local batch latency p50/p90/p99/p999: %f %f %f %f, "
+            "wall-clock tps + Bps: %f %f, "
             %
             (self.pid, self.round, self.total_latency,
              self.total_tx,
@@ -267,7 +418,29 @@ class MVBA():
              self.a_throughput,
              numpy.average(self.latency_list), numpy.std(self.latency_list),
              numpy.average(self.tp_list), numpy.std(self.tp_list),
+             batch_latency['p50'], batch_latency['p90'], batch_latency['p99'], batch_latency['p999'],
+             wall_clock_tps, wall_clock_bps,
              ))
+        self.run_metrics.config['ec_backend'] = erasure_coding.get_backend().name
+        self.run_metrics.config['ec_autotune'] = self.ec_timings
+        self.run_metrics.config['coding_workers'] = self.coding_pool.workers
+        self.run_metrics.config['commitment_scheme'] = self.commitment_scheme
+        self.run_metrics.config['stream_chunk'] = self.stream_chunk
+        self.run_metrics.config['prefetch'] = self.prefetch
+        self.run_metrics.config['election'] = self.election
+        self.run_metrics.config['dispersal'] = self.dispersal
+        self.run_metrics.write(
+            metrics_path(self.pid),
+            epoch=self.round,
+            run_time=self.total_latency,
+            total_tx=self.total_tx,
+            latency=self.a_latency,
+            tps=self.a_throughput,
+            avg_latency=float(numpy.average(self.latency_list)), std_latency=float(numpy.std(self.latency_list)),
+            avg_tps=float(numpy.average(self.tp_list)), std_tps=float(numpy.std(self.tp_list)),
+            **{f'local_batch_latency_{name}': value for name, value in batch_latency.items()},
+            wall_tps=wall_clock_tps, wall_bps=wall_clock_bps,
+        )
         print(
             "node: %d epoch: %d run: %f, "
             "total delivered Txs after warm-up: %d, "
@@ -275,6 +448,8 @@ class MVBA():
             "tps after warm-up: %f, "
             "average latency by rounds + stddev: %f %f, "
             "average tps by rounds + stddev: %f %f, "
+            "local batch latency p50/p90/p99/p999: %f %f %f %f, "
+            "wall-clock tps + Bps: %f %f, "
             %
             (self.pid, self.round, self.total_latency,
              self.total_tx,
@@ -282,50 +457,102 @@ class MVBA():
              self.a_throughput,
              numpy.average(self.latency_list), numpy.std(self.latency_list),
              numpy.average(self.tp_list), numpy.std(self.tp_list),
+             batch_latency['p50'], batch_latency['p90'], batch_latency['p99'], batch_latency['p999'],
+             wall_clock_tps, wall_clock_bps,
              ))
 
         return
 
-    def _run_round(self, r, tx_to_send, send, recv):
-        """Run one protocol round."""
+    def prepare_round(self, r):
+        """Cuts the batch of round ``r`` from the transaction buffer.
+
+        With a ``prepare_func`` the batch is also encoded, committed and
+        serialized into the frames of its dispersal, so the instance can
+        send them as soon as it starts.
 
-        sid = self.sid
-        pid = self.pid
-        N = self.N
-        f = self.f
+        :return: the input of the instance and the ingest times of its TXs
+        """
+        self.round_bootstrap(r)
+
+        assert self.B >= 0
+        tx_to_send = []
+        ingest_times = []
+        for _ in range(self.B):
+            tx, ingest_time = self.transaction_buffer.get_nowait()
+            tx_to_send.append(tx)
+            tx_to_send.append('/')
+            ingest_times.append(ingest_time)
+
+        str_to_send = ''.join(tx_to_send)
+        del tx_to_send
+
+        if self.prepare_func is None:
+            return str_to_send, ingest_times
+        proposal = self.prepare_func(
+            self.sid, self.pid, r, self.N, self.f, str_to_send,
+            coding_pool=self.coding_pool,
+            frame=lambda o: PickledFrame.of((r, o)),
+            commitment_scheme=self.commitment_scheme,
+            stream_chunk=self.stream_chunk)
+        return proposal, ingest_times
+
+    def _run_round(self, r, round_input_queue: Queue, send, recv):
+        """Run one protocol round on the input waiting in ``round_input_queue``."""
 
-        round_input_queue = Queue(1)
         round_output_queue = Queue(1)
 
         # mvba_func should only exist when
         # it can confirms all messages to be sent are enqueued
 
-        _t = gevent.spawn(
-            self.mvba_func,
-            sid, pid, r, N, f,
-            round_input_queue,
-            recv, send,
-            round_output_queue,
-            self.round_threads[r].put_nowait,
-            lambda x: True,
-            self.logger
-        )
-        self.round_threads[r].put_nowait(_t)
+        _t = self._spawn_mvba(r, round_input_queue, round_output_queue, send, recv)
+        self.round_tasks[r].add(_t)
 
-        round_input_queue.put_nowait(tx_to_send)
         start_time = time.time()
         result = round_output_queue.get()
         end_time = time.time()
         latency = end_time - start_time
 
         _t.join()
-        self.round_stops[r].set()
+        self.round_cleanup(r)
 
         if isinstance(result, str):
-            return latency, result.count('/')
+            return latency, result.count('/'), len(result.encode()), end_time
         if isinstance(result, bytes):
-            return latency, result.count(b'/')
-    
+            return latency, result.count(b'/'), len(result), end_time
+
+    def _spawn_mvba(self, r, round_input_queue: Queue, round_output_queue: Queue, send: Callable, recv: Callable):
+        kwargs = dict()
+        if accepts_argument(self.mvba_func, 'phase_timer'):
+            kwargs['phase_timer'] = self.phase_timers[r] = PhaseTimer(f'{self.sid}:{r}')
+        if accepts_argument(self.mvba_func, 'coding_pool'):
+            kwargs['coding_pool'] = self.coding_pool
+        if accepts_argument(self.mvba_func, 'commitment_scheme'):
+            kwargs['commitment_scheme'] = self.commitment_scheme
+        if accepts_argument(self.mvba_func, 'stream_chunk'):
+            kwargs['stream_chunk'] = self.stream_chunk
+        if accepts_argument(self.mvba_func, 'max_proposal'):
+            # each dummy TX is 250 bytes and a '/', see prepare_round
+            kwargs['max_proposal'] = 251 * self.B
+        if accepts_argument(self.mvba_func, 'prefetch'):
+            kwargs['prefetch'] = self.prefetch
+        if accepts_argument(self.mvba_func, 'dispersal'):
+            kwargs['dispersal'] = self.dispersal
+        if self.election_service is not None and accepts_argument(self.mvba_func, 'election'):
+            kwargs['election'] = self.election_service
+        if accepts_argument(self.mvba_func, 'buffer_meter'):
+            kwargs['buffer_meter'] = self.buffer_meters[r] = BufferMeter()
+        return gevent.spawn(
+            self.mvba_func,
+            self.sid, self.pid, r, self.N, self.f,
+            round_input_queue,
+            recv, send,
+            round_output_queue,
+            self.round_tasks[r].add,
+            lambda x: True,
+            self.logger,
+            **kwargs
+        )
+
     def set_mvba_func(self, func: Callable):
         self.mvba_func = func
     
@@ -337,7 +564,7 @@ class MVBA():
             return _send
 
         send = _make_send(self.round)
-        recv = self._per_round_recv['sys'].get
+        recv = self.router.sys.get
         
         try:
             self.sync_events[self.round].clear()
@@ -350,18 +577,28 @@ class MVBA():
             final_start_time = -1
             if pid == 0:
                 final_start_time = time.time() + 15 + self.N / 20
-                # send timestamp
-                send(-2, final_start_time)
+                # send timestamp and the erasure coding backend
+                send(-2, (final_start_time, erasure_coding.get_backend().name))
+                self.ec_settled.set()
             else:
                 # receive timestamp
                 while True:
                     try:
-                        (_, (_r, final_start_time)) = recv()
+                        (_, (_r, (final_start_time, ec_backend))) = recv()
                         assert type(final_start_time) == float
                         break
-                    except (Empty, AssertionError):
+                    except (Empty, AssertionError, TypeError, ValueError):
                         gevent.sleep(SLEEP_INTERVAL)
                         continue
+                if ec_backend != erasure_coding.get_backend().name:
+                    if self.ec_backend == 'auto':
+                        erasure_coding.set_backend(ec_backend)
+                        self.logger.info(f'erasure coding backend announced by node 0: {ec_backend}')
+                    else:
+                        # the stripes of the two backends do not decode each other
+                        raise RuntimeError(f'node 0 uses erasure coding backend {ec_backend}, '
+                                           f'this node {erasure_coding.get_backend().name}')
+                self.ec_settled.set()
 
             sleep_duration = final_start_time - time.time()
             self.logger.info(f'sleep {sleep_duration} until protocol starting at {final_start_time}')
@@ -372,6 +609,9 @@ class MVBA():
             self.logger.error(str(e))
             self.logger.error(traceback.format_exc())
             self.stop.value = True
+            # wake _run, it stops on self.stop
+            self.ec_settled.set()
+            self.sync_events[self.round].set()
     
     def _sync_slow(self):
         def _make_send(r):
@@ -381,7 +621,7 @@ class MVBA():
             return _send
 
         send = _make_send(self.round)
-        recv = self._per_round_recv['sys'].get
+        recv = self.router.sys.get
         
         try:
             self.sync_events[self.round].clear()
@@ -0,0 +1,94 @@
+import logging
+from typing import Dict, Optional
+
+from gevent.queue import Queue
+
+# frames one sender sends a node in a round without faults: the DIFFUSION,
+# ECHO, DONE, FINISH and VALUE of H-MVBA, the election and a few MBA rounds
+FRAMES_PER_SENDER = 64
+
+
+class RoundRouter:
+    """Routes inbound messages to per-round inboxes over a sliding window of rounds.
+
+    Dispatch is O(1) per message: a message of round ``r`` goes to the inbox of
+    ``r`` if ``low <= r < low + window``, where ``low`` is the oldest round not
+    yet released. Messages of released rounds are dropped, and so are messages
+    too far in the future, so that buffering never grows beyond ``window``
+    inboxes of at most ``max_buffered`` pending messages for rounds that have
+    not started, by default a few rounds' worth of ``frames_per_sender`` frames
+    from each of the ``N`` nodes.
+
+    Synchronization messages tagged ``'sys'`` go to a dedicated inbox, and
+    messages whose round is not an int are dropped.
+    """
+
+    def __init__(self, N: int, window: int = 16, frames_per_sender: int = FRAMES_PER_SENDER,
+                 max_buffered: int = None, logger: logging.Logger = None):
+        assert window >= 1
+        self.window = window
+        if max_buffered is None:
+            max_buffered = 4 * frames_per_sender * N
+        self.max_buffered = max_buffered
+        self.logger = logger
+
+        self.low = 0  # oldest round not yet released
+        self.current = 0  # the round being executed, inboxes above it are buffers
+        self._inboxes: Dict[int, Queue] = dict()
+        self.sys = Queue()
+
+        self.dropped_old = 0
+        self.dropped_future = 0
+        self.dropped_malformed = 0
+
+    def inbox(self, r: int) -> Optional[Queue]:
+        """Returns the inbox of round ``r``, or ``None`` if it is outside the window."""
+        try:
+            return self._inboxes[r]
+        except KeyError:
+            pass
+        if not (self.low <= r < self.low + self.window):
+            return None
+        inbox = self._inboxes[r] = Queue()
+        return inbox
+
+    def start(self, r: int) -> Queue:
+        """Marks round ``r`` as running and returns its inbox."""
+        assert r >= self.low
+        if r >= self.low + self.window:
+            # the window slides along with the running round
+            self.release(r - self.window)
+        self.current = r
+        return self.inbox(r)
+
+    def dispatch(self, sender, r, msg):
+        if r == 'sys':
+            self.sys.put_nowait((sender, msg))
+            return
+        if not isinstance(r, int):
+            self.dropped_malformed += 1
+            if self.logger: self.logger.warning(f'drop message of malformed round {r!r} from {sender}')
+            return
+        if r < self.low:
+            self.dropped_old += 1
+            return
+        inbox = self.inbox(r)
+        if inbox is None:
+            self.dropped_future += 1
+            if self.logger: self.logger.warning(f'drop message of round {r} from {sender}, '
+                                                f'outside window [{self.low}, {self.low + self.window})')
+            return
+        if r > self.current and inbox.qsize() >= self.max_buffered:
+            self.dropped_future += 1
+            if self.logger: self.logger.warning(f'drop message of round {r} from {sender}, buffer is full')
+            return
+        inbox.put_nowait((sender, msg))
+
+    def release(self, r: int):
+        """Frees the inbox of the finished round ``r`` and of every older round."""
+        for _r in range(self.low, r + 1):
+            self._inboxes.pop(_r, None)
+        self.low = max(self.low, r + 1)
+
+    def buffered_rounds(self) -> int:
+        return len(self._inboxes)
@@ -0,0 +1,89 @@
+import time
+from typing import Callable, List, Set
+
+import gevent
+from gevent import Greenlet
+
+
+class TaskGroup:
+    """Greenlets spawned on behalf of one protocol instance.
+
+    Protocols hand every greenlet they spawn to ``add`` (it is the
+    ``put_thread`` callable of ``run_hmvba`` and friends). The group counts
+    the live greenlets and remembers the peak, and ``close`` cancels the rest
+    in one go when the instance has decided. Greenlets that survive the kill
+    are reported as leaked by ``reap``.
+    """
+
+    def __init__(self, name: str = ''):
+        self.name = name
+        self._live: Set[Greenlet] = set()
+        self._killed: List[Greenlet] = []
+        self.spawned = 0
+        self.peak = 0
+        self.closed = False
+        self.teardown_time = 0.0
+        self.killed = 0
+        self.leaked = 0
+
+    def add(self, g: Greenlet):
+        self.spawned += 1
+        if g.dead:
+            return
+        if self.closed:
+            # the instance is gone, late spawns must not outlive it
+            g.kill(block=False)
+            return
+        self._live.add(g)
+        if len(self._live) > self.peak:
+            self.peak = len(self._live)
+        g.rawlink(self._on_exit)
+
+    def spawn(self, func: Callable, *args, **kwargs) -> Greenlet:
+        g = gevent.spawn(func, *args, **kwargs)
+        self.add(g)
+        return g
+
+    def _on_exit(self, g: Greenlet):
+        self._live.discard(g)
+
+    @property
+    def live(self) -> int:
+        return len(self._live)
+
+    def close(self):
+        """Kills every live greenlet of the group, without waiting for them.
+
+        The kills are delivered once the caller yields to the hub; ``reap``
+        waits for them and counts the greenlets that survive.
+
+        :return: the statistics of the group, see ``stats``
+        """
+        self.closed = True
+        self._killed = list(self._live)
+        self.killed = len(self._killed)
+        gevent.killall(self._killed, block=False)
+        return self.stats()
+
+    def reap(self, timeout: float = 1.0):
+        """Waits for the greenlets killed by ``close``, off the critical path.
+
+        :param timeout: how long to wait for the greenlets to die
+        :return: the statistics of the group, with the leaked greenlets
+        """
+        start = time.perf_counter()
+        gevent.joinall(self._killed, timeout=timeout)
+        self.leaked = sum(1 for g in self._killed if not g.dead)
+        self._killed = []
+        self.teardown_time = time.perf_counter() - start
+        return self.stats()
+
+    def stats(self):
+        return {
+            'spawned': self.spawned,
+            'live': self.live,
+            'peak': self.peak,
+            'killed': self.killed,
+            'leaked': self.leaked,
+            'teardown_time': self.teardown_time,
+        }
@@ -2,6 +2,7 @@ from gevent import monkey; monkey.patch_all(thread=False)
 
 import time
 import pickle
+from network.frame import dumps
 from typing import List, Callable
 import gevent
 import os
@@ -85,7 +86,7 @@ class NetworkClient (Process):
 
                 if msg is None:
                     o = self.sock_queues[j].get()
-                    msg = pickle.dumps(o) + self.SEP
+                    msg = dumps(o) + self.SEP
 
                 if len(msg) <= cnt:
                     cnt = cnt - len(msg)
@@ -120,7 +121,7 @@ class NetworkClient (Process):
                 o = self.sock_queues[j].get()
                 try:
                     # time.sleep(int(self.id) * 0.01)
-                    msg = pickle.dumps(o)
+                    msg = dumps(o)
                     self.socks[j].sendall(msg + self.SEP)
                 except:
                     self.logger.error("fail to send msg")
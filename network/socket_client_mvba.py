@@ -4,6 +4,7 @@ monkey.patch_all(thread=False)
 
 import time
 import pickle
+from network.frame import dumps
 from typing import List, Callable
 import gevent
 import os
@@ -185,7 +186,7 @@ class NetworkClient(Process):
                 j, o_raw = self.client_from_bft()
                 # o = self.send_queue[j].get_nowait()
                 send_summary = str((j, o_raw))[:60]
-                o = pickle.dumps(o_raw)
+                o = dumps(o_raw)
                 del o_raw
                 self.logger.info(f'send {len(o)} {send_summary}')
                 if not multithread_bcast:
@@ -4,6 +4,7 @@ monkey.patch_all(thread=False)
 
 import time
 import pickle
+from network.frame import dumps
 from typing import List, Callable
 import gevent
 import os
@@ -83,7 +84,7 @@ class NetworkClient(Process):
             gevent.sleep(0.005)
             # self.sock_locks[j].acquire()
             p1, p2, o = self.sock_queues[j].get()
-            msg = pickle.dumps(o)
+            msg = dumps(o)
             while True:
                 try:
                     # time.sleep(int(self.id) * 0.01)
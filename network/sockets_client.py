@@ -4,6 +4,7 @@ monkey.patch_all(thread=False)
 
 import time
 import pickle
+from network.frame import dumps
 from typing import List, Callable
 import gevent
 import os
@@ -94,7 +95,7 @@ class NetworkClients(Process):
 
                 if msg is None:
                     o = sock_queues[j].get()
-                    msg = pickle.dumps(o) + self.SEP
+                    msg = dumps(o) + self.SEP
 
                 if len(msg) <= cnt:
                     cnt = cnt - len(msg)
@@ -129,7 +130,7 @@ class NetworkClients(Process):
                 o = sock_queues[j].get()
                 try:
                     # time.sleep(int(self.id) * 0.01)
-                    msg = pickle.dumps(o)
+                    msg = dumps(o)
                     socks[j].sendall(msg + self.SEP)
                 except:
                     self.logger.error("fail to send msg")
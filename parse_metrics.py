@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
-Parse metrics from verbose_log/*.stdout.log files.
+Parse metrics from the log/metrics-node-*.json files written by the nodes,
+falling back to the verbose_log/*.stdout.log files of older runs.
 Usage: python3 parse_metrics.py <log_directory>
 Outputs CSV with aggregated metrics.
 """
@@ -8,6 +9,40 @@ Outputs CSV with aggregated metrics.
 import os, re, sys, statistics, csv, json
 from pathlib import Path
 
+COMMIT_FIELDS = ('local_batch_latency_p50', 'local_batch_latency_p90', 'local_batch_latency_p99',
+                 'local_batch_latency_p999', 'wall_tps', 'wall_bps')
+RESOURCE_FIELDS = ('cpu_time', 'peak_rss', 'peak_buffer_bytes')
+
+def parse_metrics_file(filepath):
+    """Parse a single metrics-node-*.json file, return dict of metrics."""
+    try:
+        with open(filepath, 'r') as f:
+            document = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Failed to parse {filepath}: {e}")
+        return None
+    summary = document.get('summary')
+    if not summary:
+        return None
+    for name in ('p50', 'p90', 'p99', 'p999'):
+        # written as commit_* by older nodes
+        if f'commit_{name}' in summary:
+            summary[f'local_batch_latency_{name}'] = summary.pop(f'commit_{name}')
+    return {
+        'node': document['node'],
+        **summary,
+        'rounds': document.get('rounds', []),
+    }
+
+def find_metrics_files(log_dir):
+    """Locate the structured metrics files of the run logged in log_dir."""
+    log_dir = Path(log_dir)
+    for candidate in (log_dir, log_dir / 'log', log_dir.parent / 'log'):
+        files = sorted(candidate.glob('metrics-node-*.json'))
+        if files:
+            return files
+    return []
+
 def parse_stdout_file(filepath):
     """Parse a single stdout.log file, return dict of metrics."""
     with open(filepath, 'r') as f:
@@ -50,6 +85,19 @@ def parse_stdout_file(filepath):
     avg_tps = float(match.group(9))
     std_tps = float(match.group(10))
     
+    commit = {}
+    # local batch latency percentiles and wall-clock throughput, appended by
+    # newer nodes; older ones logged the same percentiles as commit latency
+    match = re.search(r'(?:local batch|commit) latency p50/p90/p99/p999:\s*([\d.]+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)',
+                      metric_line)
+    if match:
+        for key, value in zip(COMMIT_FIELDS, match.groups()):
+            commit[key] = float(value)
+    match = re.search(r'wall-clock tps \+ Bps:\s*([\d.]+)\s+([\d.]+)', metric_line)
+    if match:
+        commit['wall_tps'] = float(match.group(1))
+        commit['wall_bps'] = float(match.group(2))
+
     return {
         'node': node,
         'epoch': epoch,
@@ -61,10 +109,16 @@ def parse_stdout_file(filepath):
         'std_latency': std_latency,
         'avg_tps': avg_tps,
         'std_tps': std_tps,
+        **commit,
     }
 
-def aggregate_metrics(log_dir):
-    """Aggregate metrics across all nodes in log_dir."""
+def load_node_metrics(log_dir):
+    """Per-node metrics of the run in log_dir, from the structured files when present."""
+    metrics_files = find_metrics_files(log_dir)
+    if metrics_files:
+        metrics = [parse_metrics_file(f) for f in metrics_files]
+        return [m for m in metrics if m]
+
     log_dir = Path(log_dir)
     stdout_files = list(log_dir.glob('*.stdout.log'))
     if not stdout_files:
@@ -83,7 +137,11 @@ def aggregate_metrics(log_dir):
         m = parse_stdout_file(f)
         if m:
             metrics.append(m)
-    
+    return metrics
+
+def aggregate_metrics(log_dir):
+    """Aggregate metrics across all nodes in log_dir."""
+    metrics = load_node_metrics(log_dir)
     if not metrics:
         return {}
     
@@ -103,8 +161,34 @@ def aggregate_metrics(log_dir):
         'tps_std': statistics.stdev(tpses) if len(tpses) > 1 else 0.0,
         'node_metrics': metrics,
     }
+    for key in COMMIT_FIELDS + RESOURCE_FIELDS:
+        values = [m[key] for m in metrics if key in m]
+        if values:
+            agg[f'{key}_mean'] = statistics.mean(values)
+    for key in ('peak_rss', 'peak_buffer_bytes'):
+        peaks = [m[key] for m in metrics if key in m]
+        if peaks:
+            agg[f'{key}_max'] = max(peaks)
     return agg
 
+def summarize(agg):
+    """The run-level summary of an aggregate, as printed in the JSON summary."""
+    summary = {
+        'num_nodes': agg['num_nodes'],
+        'total_tx': agg['total_tx'],
+        'latency_mean': agg['latency_mean'],
+        'latency_std': agg['latency_std'],
+        'tps_mean': agg['tps_mean'],
+        'tps_std': agg['tps_std'],
+    }
+    for key in COMMIT_FIELDS + RESOURCE_FIELDS:
+        if f'{key}_mean' in agg:
+            summary[f'{key}_mean'] = agg[f'{key}_mean']
+    for key in ('peak_rss_max', 'peak_buffer_bytes_max'):
+        if key in agg:
+            summary[key] = agg[key]
+    return summary
+
 def main():
     if len(sys.argv) < 2:
         print("Usage: python3 parse_metrics.py <log_directory> [output.csv]")
@@ -127,7 +211,8 @@ def main():
         output_csv = sys.argv[2]
         with open(output_csv, 'w', newline='') as f:
             writer = csv.writer(f)
-            writer.writerow(['node', 'latency', 'tps', 'total_tx', 'avg_latency', 'std_latency', 'avg_tps', 'std_tps'])
+            writer.writerow(['node', 'latency', 'tps', 'total_tx', 'avg_latency', 'std_latency', 'avg_tps', 'std_tps',
+                             *COMMIT_FIELDS, *RESOURCE_FIELDS])
             for m in agg['node_metrics']:
                 writer.writerow([
                     m['node'],
@@ -138,18 +223,12 @@ def main():
                     m.get('std_latency', ''),
                     m.get('avg_tps', ''),
                     m.get('std_tps', ''),
+                    *(m.get(key, '') for key in COMMIT_FIELDS + RESOURCE_FIELDS),
                 ])
         print(f"CSV written to {output_csv}")
     
     # also output JSON summary
-    summary = {
-        'num_nodes': agg['num_nodes'],
-        'total_tx': agg['total_tx'],
-        'latency_mean': agg['latency_mean'],
-        'latency_std': agg['latency_std'],
-        'tps_mean': agg['tps_mean'],
-        'tps_std': agg['tps_std'],
-    }
+    summary = summarize(agg)
     print("\nJSON summary:")
     print(json.dumps(summary, indent=2))
 
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Aggregate the per-phase latency breakdown written by the nodes.
+Every node appends one JSON line per phase span to log/phases-node-{id}.jsonl.
+Usage: python3 parse_phases.py <directory> [<directory> ...] [-o phases.csv]
+Directories are searched recursively, so a whole paper_results/ tree can be
+given to compare runs of different N and B.
+Outputs, for every (protocol, N, B) and phase, the mean/p50/p99 duration
+over all instances of all nodes and runs, and the share of the instance time,
+plus how often the MBA fast path decided ABA in its first epoch.
+"""
+
+import sys, csv, json, statistics
+from collections import defaultdict
+from pathlib import Path
+
+def load_spans(directory):
+    """Yield the phase records found below directory."""
+    for path in sorted(Path(directory).rglob('phases-node-*.jsonl')):
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    print(f"Warning: skipping malformed line in {path}")
+                    continue
+                # tell runs apart when the same instance ids are reused
+                record['run'] = str(path.parent)
+                yield record
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * q / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def aggregate_phases(directories):
+    """Sum the spans of every phase per instance, then aggregate across instances."""
+    # (protocol, N, B) -> (run, node, instance) -> phase -> total duration
+    instances = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+    # (protocol, N, B) -> (run, node, instance) -> end of the last span
+    spans_end = defaultdict(lambda: defaultdict(float))
+    for directory in directories:
+        for record in load_spans(directory):
+            config = (record.get('protocol', ''), record.get('N'), record.get('B'))
+            key = (record['run'], record.get('node'), record.get('instance'))
+            instances[config][key][record['phase']] += record['duration']
+            spans_end[config][key] = max(spans_end[config][key], record['end'])
+
+    rows = []
+    for config in sorted(instances, key=lambda c: (c[0], c[1] or 0, c[2] or 0)):
+        protocol, N, B = config
+        per_phase = defaultdict(list)
+        shares = defaultdict(list)
+        for key, phases in instances[config].items():
+            total = spans_end[config][key]
+            for phase, duration in phases.items():
+                per_phase[phase].append(duration)
+                if total > 0:
+                    shares[phase].append(duration / total)
+        for phase, durations in per_phase.items():
+            rows.append({
+                'protocol': protocol,
+                'N': N,
+                'B': B,
+                'phase': phase,
+                'instances': len(durations),
+                'mean': statistics.mean(durations),
+                'p50': percentile(durations, 50),
+                'p99': percentile(durations, 99),
+                'share': statistics.mean(shares[phase]) if shares[phase] else 0.0,
+            })
+    return rows
+
+def aba_outcomes(directories):
+    """Count the ABA runs of MBA per (protocol, N, B): total, fast path, decided 1."""
+    counts = defaultdict(lambda: {'aba': 0, 'fast_path': 0, 'decided_1': 0})
+    for directory in directories:
+        for record in load_spans(directory):
+            if record['phase'] != 'aba':
+                continue
+            count = counts[(record.get('protocol', ''), record.get('N'), record.get('B'))]
+            count['aba'] += 1
+            count['fast_path'] += bool(record.get('fast_path'))
+            count['decided_1'] += record.get('decided') == 1
+    return counts
+
+def main():
+    args = sys.argv[1:]
+    output_csv = None
+    if '-o' in args:
+        i = args.index('-o')
+        output_csv = args[i + 1] if i + 1 < len(args) else ''
+        args = args[:i] + args[i + 2:]
+    if not args or output_csv == '':
+        print("Usage: python3 parse_phases.py <directory> [<directory> ...] [-o phases.csv]")
+        sys.exit(1)
+
+    rows = aggregate_phases(args)
+    if not rows:
+        print("No phase records found.")
+        sys.exit(1)
+
+    # print one table per configuration, dominant phase first
+    by_config = defaultdict(list)
+    outcomes = aba_outcomes(args)
+    for row in rows:
+        by_config[(row['protocol'], row['N'], row['B'])].append(row)
+    for (protocol, N, B), config_rows in by_config.items():
+        print(f"\n{protocol} N={N} B={B}")
+        print(f"{'phase':<20}{'n':>6}{'mean':>12}{'p50':>12}{'p99':>12}{'share':>8}")
+        for row in sorted(config_rows, key=lambda r: r['mean'], reverse=True):
+            print(f"{row['phase']:<20}{row['instances']:>6}{row['mean']:>12.6f}"
+                  f"{row['p50']:>12.6f}{row['p99']:>12.6f}{row['share']:>8.1%}")
+        outcome = outcomes.get((protocol, N, B))
+        if outcome and outcome['aba']:
+            print(f"MBA fast path: {outcome['fast_path']}/{outcome['aba']} ABA runs "
+                  f"({outcome['fast_path'] / outcome['aba']:.1%}), decided 1 in {outcome['decided_1']}")
+
+    if output_csv:
+        columns = ['protocol', 'N', 'B', 'phase', 'instances', 'mean', 'p50', 'p99', 'share']
+        with open(output_csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\nCSV written to {output_csv}")
+
+if __name__ == '__main__':
+    main()
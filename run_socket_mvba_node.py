@@ -26,11 +26,13 @@ from ctypes import c_bool
 SLEEP_INTERVAL = 0.0001
 
 def instantiate_mvba_node(sid, i, B, N, f, K, mvba_from_server: Callable, mvba_to_client: Callable, ready: mpValue,
-                         stop: mpValue, protocol="mvba", mute=False, F=100, debug=False, omitfast=False, countpoint=0):
+                         stop: mpValue, protocol="mvba", mute=False, F=100, debug=False, omitfast=False, countpoint=0,
+                         ec_backend='zfec', coding_workers=None, commitment_scheme='merkle',
+                         stream_chunk=0, prefetch=0, election='hash', dispersal='full'):
     mvba = None
     if protocol == 'hmvba':
-        from hash_mvba.core.hmvba_protocol import run_hmvba
-        mvba = MVBA(sid, i, B, N, f, mvba_from_server, mvba_to_client, ready, stop, K, countpoint, mute=mute, debug=debug, mvba_func=run_hmvba)
+        from hash_mvba.core.hmvba_protocol import run_hmvba, prepare_proposal
+        mvba = MVBA(sid, i, B, N, f, mvba_from_server, mvba_to_client, ready, stop, K, countpoint, mute=mute, debug=debug, mvba_func=run_hmvba, ec_backend=ec_backend, coding_workers=coding_workers, prepare_func=prepare_proposal, commitment_scheme=commitment_scheme, stream_chunk=stream_chunk, prefetch=prefetch, election=election)
     # elif protocol == 'smvba':
     #     from speedmvba.core.smvba_e_node import SMVBA_E
     #     mvba = SMVBA_E(sid, i, B, N, f, mvba_from_server, mvba_to_client, ready, stop, K, countpoint, mute=mute, debug=debug)
@@ -39,11 +41,11 @@ def instantiate_mvba_node(sid, i, B, N, f, K, mvba_from_server: Callable, mvba_t
     #     mvba = SMVBA_BLS(sid, i, B, N, f, mvba_from_server, mvba_to_client, ready, stop, K, countpoint, mute=mute, debug=debug)
     elif protocol == 'finmvba':
         from fin_mvba.core.fin_mvba_protocol import run_fin_mvba
-        mvba = MVBA(sid, i, B, N, f, mvba_from_server, mvba_to_client, ready, stop, K, countpoint, mute=mute, debug=debug, mvba_func=run_fin_mvba)
+        mvba = MVBA(sid, i, B, N, f, mvba_from_server, mvba_to_client, ready, stop, K, countpoint, mute=mute, debug=debug, mvba_func=run_fin_mvba, ec_backend=ec_backend, coding_workers=coding_workers, commitment_scheme=commitment_scheme, election=election, dispersal=dispersal)
     elif protocol == 'dumbomvbastar':
         from mvba_node.dumbo_node import MVBA as DUMBO_MVBA
         from dumbomvbastar.core.dumbomvba_star import smvbastar
-        mvba = DUMBO_MVBA(sid, i, B, N, f, mvba_from_server, mvba_to_client, ready, stop, K, countpoint, mute=mute, debug=debug, mvba_func=smvbastar)
+        mvba = DUMBO_MVBA(sid, i, B, N, f, mvba_from_server, mvba_to_client, ready, stop, K, countpoint, mute=mute, debug=debug, mvba_func=smvbastar, ec_backend=ec_backend, coding_workers=coding_workers)
     else:
         print("Only support mvba", flush=True)
     return mvba
@@ -94,6 +96,22 @@ def main():
                         help='whether to omit the fast path', type=bool, default=False)
     parser.add_argument('--C', metavar='C', required=False,
                         help='point to start measure tps and latency', type=int, default=0)
+    parser.add_argument('--E', metavar='E', required=False,
+                        help='erasure coding backend: zfec, pyeclib or auto', type=str, default='zfec')
+    parser.add_argument('--W', metavar='W', required=False,
+                        help='threads for encoding the own proposal, 0 for one per core', type=int, default=0)
+    parser.add_argument('--V', metavar='V', required=False,
+                        help='vector commitment of H-MVBA stripes: merkle or hashlist', type=str, default='merkle')
+    parser.add_argument('--S', metavar='S', required=False,
+                        help='stream H-MVBA stripes in chunks of S bytes, 0 to send them whole', type=int, default=0)
+    parser.add_argument('--L', metavar='L', required=False,
+                        help='collect the VALUE stripes of the next L H-MVBA leaders ahead of time', type=int, default=0)
+    parser.add_argument('--T', metavar='T', required=False,
+                        help='leader election of H-MVBA and FIN: hash or threshold (needs the trusted keys)',
+                        type=str, default='hash', choices=['hash', 'threshold'])
+    parser.add_argument('--A', metavar='A', required=False,
+                        help='dispersal of FIN proposals: full or avid (erasure coded)',
+                        type=str, default='full', choices=['full', 'avid'])
     args = parser.parse_args()
 
     # Some parameters
@@ -109,6 +127,13 @@ def main():
     D = args.D
     O = args.O
     C = args.C
+    E = args.E
+    W = args.W or None
+    V = args.V
+    S = args.S
+    L = args.L
+    T = args.T
+    A = args.A
 
     logger: logging.Logger = set_node_log(i)
 
@@ -186,7 +211,7 @@ def main():
 
         net_client = NetworkClient(my_address[1], my_address[0], i, addresses, client_from_mvba, client_ready, stop, test_termination)
         net_server = NetworkServer(my_address[1], my_address[0], i, addresses, server_to_mvba, server_ready, stop, test_termination)
-        mvba = instantiate_mvba_node(sid, i, B, N, f, K, mvba_from_server, mvba_to_client, net_ready, stop, P, M, F, D, O, C)
+        mvba = instantiate_mvba_node(sid, i, B, N, f, K, mvba_from_server, mvba_to_client, net_ready, stop, P, M, F, D, O, C, E, W, V, S, L, T, A)
 
         net_server.start()
         net_client.start()